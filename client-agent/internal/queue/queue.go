@@ -1,6 +1,11 @@
 ﻿package queue
 
-import "fmt"
+import (
+	"crypto/rand"
+	"encoding/hex"
+	"fmt"
+	"time"
+)
 
 type Event struct {
 	Type      string
@@ -12,3 +17,23 @@ type Event struct {
 func Enqueue(e Event) {
 	fmt.Printf("queued event: %s\n", e.Type)
 }
+
+// Batch is one upload to /client/events/bulk. Its ID is generated once and
+// stored with the batch, so a retried upload sends the same ID and the server
+// ignores the replay.
+type Batch struct {
+	ID     string
+	Events []Event
+}
+
+func NewBatch(events []Event) Batch {
+	return Batch{ID: newBatchID(), Events: events}
+}
+
+func newBatchID() string {
+	buf := make([]byte, 16)
+	if _, err := rand.Read(buf); err != nil {
+		return fmt.Sprintf("%x", time.Now().UnixNano())
+	}
+	return hex.EncodeToString(buf)
+}
@@ -0,0 +1,37 @@
+"""occupancy counters
+
+Revision ID: 20261017_0002
+Revises: 20260216_0001
+Create Date: 2026-10-17 09:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0002"
+down_revision: Union[str, None] = "20260216_0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "occupancy_counters",
+        sa.Column("scope", sa.String(length=10), nullable=False),
+        sa.Column("scope_id", sa.Integer(), nullable=False),
+        sa.Column("machines_total", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("machines_occupied", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("connected_users", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("active_sessions", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.PrimaryKeyConstraint("scope", "scope_id", name="pk_occupancy_counters"),
+        sa.CheckConstraint("scope IN ('global','campus','lab')", name="ck_occupancy_counters_scope"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("occupancy_counters")
@@ -0,0 +1,38 @@
+"""glpi fingerprints
+
+Revision ID: 20261017_0003
+Revises: 20261017_0002
+Create Date: 2026-10-17 10:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0003"
+down_revision: Union[str, None] = "20261017_0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "glpi_fingerprints",
+        sa.Column("item_type", sa.String(length=20), nullable=False),
+        sa.Column("external_id", sa.String(length=80), nullable=False),
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.PrimaryKeyConstraint("item_type", "external_id", name="pk_glpi_fingerprints"),
+        sa.CheckConstraint("item_type IN ('user','machine')", name="ck_glpi_fingerprints_item_type"),
+    )
+    op.create_index("idx_users_glpi_external_id", "users", ["glpi_external_id"], unique=False)
+    op.create_index("idx_machines_glpi_external_id", "machines", ["glpi_external_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_machines_glpi_external_id", table_name="machines")
+    op.drop_index("idx_users_glpi_external_id", table_name="users")
+    op.drop_table("glpi_fingerprints")
@@ -0,0 +1,25 @@
+"""sessions user/start index
+
+Revision ID: 20261017_0004
+Revises: 20261017_0003
+Create Date: 2026-10-17 11:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0004"
+down_revision: Union[str, None] = "20261017_0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_sessions_user_start", "sessions", ["user_id", "start_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_sessions_user_start", table_name="sessions")
@@ -0,0 +1,25 @@
+"""sessions start index
+
+Revision ID: 20261017_0005
+Revises: 20261017_0004
+Create Date: 2026-10-17 12:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0005"
+down_revision: Union[str, None] = "20261017_0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_sessions_start_at", "sessions", ["start_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_sessions_start_at", table_name="sessions")
@@ -0,0 +1,41 @@
+"""report exports
+
+Revision ID: 20261017_0006
+Revises: 20261017_0005
+Create Date: 2026-10-17 13:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0006"
+down_revision: Union[str, None] = "20261017_0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "report_exports",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("report", sa.String(length=20), nullable=False),
+        sa.Column("format", sa.String(length=10), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("params", postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("file_path", sa.Text(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.Column("ended_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("summary", postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.CheckConstraint("report IN ('usage','attendance')", name="ck_report_exports_report"),
+        sa.CheckConstraint("format IN ('csv','xlsx','pdf')", name="ck_report_exports_format"),
+        sa.CheckConstraint("status IN ('processing','success','failed','expired')", name="ck_report_exports_status"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("report_exports")
@@ -0,0 +1,40 @@
+"""usage hourly rollup
+
+Revision ID: 20261017_0007
+Revises: 20261017_0006
+Create Date: 2026-10-17 14:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0007"
+down_revision: Union[str, None] = "20261017_0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usage_hourly",
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("lab_id", sa.Integer(), sa.ForeignKey("labs.id"), nullable=False),
+        sa.Column("machine_id", sa.BigInteger(), sa.ForeignKey("machines.id"), nullable=False),
+        sa.Column("plan", sa.String(length=120), nullable=False, server_default=sa.text("''")),
+        sa.Column("semester", sa.String(length=20), nullable=False, server_default=sa.text("''")),
+        sa.Column("campus_id", sa.Integer(), sa.ForeignKey("campuses.id"), nullable=False),
+        sa.Column("session_minutes", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("logins", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.PrimaryKeyConstraint("bucket", "lab_id", "machine_id", "plan", "semester", name="pk_usage_hourly"),
+    )
+    op.create_index("idx_usage_hourly_lab_bucket", "usage_hourly", ["lab_id", "bucket"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_usage_hourly_lab_bucket", table_name="usage_hourly")
+    op.drop_table("usage_hourly")
@@ -0,0 +1,102 @@
+"""partition events by month
+
+Revision ID: 20261017_0008
+Revises: 20261017_0007
+Create Date: 2026-10-17 15:00:00
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0008"
+down_revision: Union[str, None] = "20261017_0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _month_start(year: int, month: int) -> datetime:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def upgrade() -> None:
+    now = datetime.now(timezone.utc)
+    boundary = _month_start(now.year, now.month + 1)
+
+    # The existing table becomes the partition for everything before next month, so no rows are copied.
+    op.execute("ALTER TABLE events RENAME TO events_legacy")
+    op.execute("ALTER INDEX idx_events_created_at RENAME TO idx_events_legacy_created_at")
+    op.execute("ALTER INDEX idx_events_event_type RENAME TO idx_events_legacy_event_type")
+    op.execute("ALTER TABLE events_legacy DROP CONSTRAINT events_pkey")
+    op.execute("ALTER TABLE events_legacy ADD CONSTRAINT events_legacy_pkey PRIMARY KEY (id, created_at)")
+    op.execute(
+        f"ALTER TABLE events_legacy ADD CONSTRAINT ck_events_legacy_range CHECK (created_at < '{boundary.isoformat()}')"
+    )
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY NONE")
+
+    op.execute(
+        """
+        CREATE TABLE events (
+            id BIGINT NOT NULL DEFAULT nextval('events_id_seq'),
+            campus_id INTEGER REFERENCES campuses (id),
+            lab_id INTEGER REFERENCES labs (id),
+            user_id BIGINT REFERENCES users (id),
+            machine_id BIGINT REFERENCES machines (id),
+            session_id BIGINT REFERENCES sessions (id),
+            event_type VARCHAR(40) NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            CONSTRAINT events_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    op.execute(f"ALTER TABLE events ATTACH PARTITION events_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')")
+    op.execute("ALTER TABLE events_legacy DROP CONSTRAINT ck_events_legacy_range")
+
+    # Creating the indexes on the parent attaches the equivalent legacy indexes instead of rebuilding them.
+    op.execute("CREATE INDEX idx_events_created_at ON events (created_at DESC)")
+    op.execute("CREATE INDEX idx_events_event_type ON events (event_type)")
+
+    for offset in range(MONTHS_AHEAD + 1):
+        start = _month_start(boundary.year, boundary.month + offset)
+        end = _month_start(boundary.year, boundary.month + offset + 1)
+        op.execute(
+            f"CREATE TABLE events_y{start:%Y}m{start:%m} PARTITION OF events "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    op.execute("CREATE TABLE events_default PARTITION OF events DEFAULT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE events RENAME TO events_partitioned")
+    op.execute("ALTER INDEX idx_events_created_at RENAME TO idx_events_partitioned_created_at")
+    op.execute("ALTER INDEX idx_events_event_type RENAME TO idx_events_partitioned_event_type")
+    op.execute("ALTER TABLE events_partitioned RENAME CONSTRAINT events_pkey TO events_partitioned_pkey")
+    op.execute(
+        """
+        CREATE TABLE events (
+            id BIGINT NOT NULL DEFAULT nextval('events_id_seq') PRIMARY KEY,
+            campus_id INTEGER REFERENCES campuses (id),
+            lab_id INTEGER REFERENCES labs (id),
+            user_id BIGINT REFERENCES users (id),
+            machine_id BIGINT REFERENCES machines (id),
+            session_id BIGINT REFERENCES sessions (id),
+            event_type VARCHAR(40) NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+    op.execute("INSERT INTO events SELECT * FROM events_partitioned")
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    op.execute("DROP TABLE events_partitioned CASCADE")
+    op.execute("CREATE INDEX idx_events_created_at ON events (created_at DESC)")
+    op.create_index("idx_events_event_type", "events", ["event_type"], unique=False)
@@ -0,0 +1,35 @@
+"""client event batches
+
+Revision ID: 20261017_0009
+Revises: 20261017_0008
+Create Date: 2026-10-17 16:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0009"
+down_revision: Union[str, None] = "20261017_0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "client_event_batches",
+        sa.Column("hostname", sa.String(length=80), nullable=False),
+        sa.Column("batch_id", sa.String(length=64), nullable=False),
+        sa.Column("event_count", sa.Integer(), nullable=False),
+        sa.Column("received_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.PrimaryKeyConstraint("hostname", "batch_id"),
+    )
+    op.create_index("idx_client_event_batches_received_at", "client_event_batches", ["received_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_client_event_batches_received_at", table_name="client_event_batches")
+    op.drop_table("client_event_batches")
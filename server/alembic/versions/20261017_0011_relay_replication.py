@@ -0,0 +1,89 @@
+"""relay replication state, outbox and session mapping
+
+Revision ID: 20261017_0011
+Revises: 20261017_0010
+Create Date: 2026-10-17 18:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0011"
+down_revision: Union[str, None] = "20261017_0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_users_updated_at_id", "users", ["updated_at", "id"], unique=False)
+    op.create_index("idx_machines_updated_at", "machines", ["updated_at"], unique=False)
+
+    op.create_table(
+        "relay_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+        sa.CheckConstraint("kind IN ('session','event')", name="ck_relay_outbox_kind"),
+    )
+    op.create_table(
+        "relay_sync_state",
+        sa.Column("name", sa.String(length=40), primary_key=True),
+        sa.Column("watermark", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("full_synced_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("summary", postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("NOW()")),
+    )
+    op.create_table(
+        "relay_sessions",
+        sa.Column("relay_id", sa.String(length=60), nullable=False),
+        sa.Column("relay_session_id", sa.BigInteger(), nullable=False),
+        sa.Column("session_id", sa.BigInteger(), sa.ForeignKey("sessions.id"), nullable=False),
+        sa.PrimaryKeyConstraint("relay_id", "relay_session_id"),
+    )
+
+    # The capture is a no-op unless the connection sets loginuv.relay_outbox, which only relay nodes do.
+    op.execute(
+        """
+        CREATE FUNCTION relay_outbox_capture() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('loginuv.relay_outbox', true) = 'on' THEN
+                INSERT INTO relay_outbox (kind, payload) VALUES (TG_ARGV[0], to_jsonb(NEW));
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_sessions_relay_outbox
+        AFTER INSERT OR UPDATE ON sessions
+        FOR EACH ROW EXECUTE FUNCTION relay_outbox_capture('session')
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_events_relay_outbox
+        AFTER INSERT ON events
+        FOR EACH ROW EXECUTE FUNCTION relay_outbox_capture('event')
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_events_relay_outbox ON events")
+    op.execute("DROP TRIGGER IF EXISTS trg_sessions_relay_outbox ON sessions")
+    op.execute("DROP FUNCTION IF EXISTS relay_outbox_capture()")
+    op.drop_table("relay_sessions")
+    op.drop_table("relay_sync_state")
+    op.drop_table("relay_outbox")
+    op.drop_index("idx_machines_updated_at", table_name="machines")
+    op.drop_index("idx_users_updated_at_id", table_name="users")
@@ -0,0 +1,35 @@
+"""users listing filter and prefix search indexes
+
+Revision ID: 20261017_0012
+Revises: 20261017_0011
+Create Date: 2026-10-17 19:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0012"
+down_revision: Union[str, None] = "20261017_0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # text_pattern_ops lets LIKE 'prefix%' use the index whatever the database collation is.
+    op.create_index("idx_users_code_prefix", "users", [sa.text("lower(code) text_pattern_ops")], unique=False)
+    op.create_index("idx_users_full_name_prefix", "users", [sa.text("lower(full_name) text_pattern_ops")], unique=False)
+    op.create_index("idx_users_role_id", "users", ["role", "id"], unique=False)
+    op.create_index("idx_users_plan_id", "users", ["academic_plan", "id"], unique=False)
+    op.create_index("idx_users_semester_id", "users", ["semester", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_users_semester_id", table_name="users")
+    op.drop_index("idx_users_plan_id", table_name="users")
+    op.drop_index("idx_users_role_id", table_name="users")
+    op.drop_index("idx_users_full_name_prefix", table_name="users")
+    op.drop_index("idx_users_code_prefix", table_name="users")
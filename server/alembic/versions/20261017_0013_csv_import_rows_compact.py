@@ -0,0 +1,41 @@
+"""csv import rows lookup index and password redaction
+
+Revision ID: 20261017_0013
+Revises: 20261017_0012
+Create Date: 2026-10-17 20:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0013"
+down_revision: Union[str, None] = "20261017_0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_csv_import_rows_import_status",
+        "csv_import_rows",
+        ["import_id", "row_status", "row_number"],
+        unique=False,
+    )
+    op.create_index("idx_csv_imports_started_at", "csv_imports", ["started_at"], unique=False)
+
+    # Rows stored before redaction kept the uploaded passwords in plaintext.
+    op.execute(
+        """
+        UPDATE csv_import_rows
+        SET raw_data = jsonb_set(raw_data, '{password}', '"***"'::jsonb)
+        WHERE raw_data ? 'password' AND raw_data->>'password' <> ''
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_csv_imports_started_at", table_name="csv_imports")
+    op.drop_index("idx_csv_import_rows_import_status", table_name="csv_import_rows")
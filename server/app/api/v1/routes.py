@@ -1,13 +1,36 @@
-from csv import DictReader
+import hmac
+import logging
+import math
+import shutil
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict
 from datetime import datetime, timezone
-
-from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
-from fastapi.responses import StreamingResponse
-from sqlalchemy import and_, distinct, func, select
+from typing import Literal, TypeVar
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy import and_, func, insert, select, true
 from sqlalchemy.orm import Session
-from io import StringIO
+from pydantic import ValidationError
 
-from app.db import get_db
+from app.core_config import settings
+from app.db import async_engine, engine, get_db, run_in_session
 from app.models.entities import (
     Campus,
     CsvImport,
@@ -16,6 +39,7 @@ from app.models.entities import (
     GlpiSyncRun,
     Lab,
     Machine,
+    ReportExport,
     Session as AuthSession,
     User,
 )
@@ -34,13 +58,55 @@ from app.schemas.dto import (
     LoginRequest,
     LoginResponse,
     LogoutRequest,
+    RelayReplayRequest,
+    RelayReplayResponse,
+    ReportExportResponse,
     SessionInfo,
     UserCreateRequest,
     UserPatchRequest,
     UserResponse,
 )
-from app.services.auth import create_access_token, hash_password, verify_password
-from app.services.glpi import GlpiSyncError, sync_from_glpi
+from app.services.auth import (
+    PasswordHashingBusyError,
+    PasswordHashingTimeoutError,
+    check_password_async,
+    create_access_token,
+    hash_password_pooled,
+    hash_pool,
+)
+from app.services.csv_import import CsvImportError, stream_error_report, validate_csv_header
+from app.services.dashboard import compute_summary
+from app.services.events import EventBatchError, EventBatchResult, ingest_event_batch
+from app.services.exports import EXPORT_FORMATS, count_export_rows, serialize_params, stream_export
+from app.services.jobs import JobError, job_queue, spool_path
+from app.services.live import live_hub
+from app.services.login import (
+    LoginGrant,
+    LoginUser,
+    MachineRef,
+    active_session_locations,
+    find_login_user,
+    lock_user_sessions,
+    machine_cache,
+    occupy_machine,
+    rehash_password,
+    resolve_machine,
+    resolve_machine_by_hostname,
+    save_password_hash,
+)
+from app.services.metrics import METRICS_CONTENT_TYPE, record_login_stages, render_metrics
+from app.services.occupancy import record_session_ended, record_session_started
+from app.services.presence import record_heartbeat
+from app.services.ratelimit import event_batch_limiter
+from app.services.relay import apply_replay, load_snapshot, relay_status
+from app.services.reports import UsageFilters, attendance_report, usage_report, usage_report_from_rollup
+from app.services.rollup import record_sessions_closed
+from app.services.timing import StageTimer
+from app.services.users import UserFilters, list_users
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 router = APIRouter(prefix="/api/v1")
 
@@ -50,6 +116,18 @@ def health() -> dict:
     return {"status": "ok"}
 
 
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="METRICS_DISABLED")
+    body = render_metrics(
+        {"sync": engine.pool, "async": async_engine.pool},
+        job_queue.depth,
+        hash_pool.in_flight,
+    )
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
+
 def _to_user_response(user: User) -> UserResponse:
     return UserResponse(
         id=user.id,
@@ -68,103 +146,173 @@ def _to_user_response(user: User) -> UserResponse:
     )
 
 
-def _parse_bool(value: str | None, *, default: bool = False) -> bool:
-    if value is None:
-        return default
-    return value.strip().lower() in {"1", "true", "yes", "y", "si", "on"}
-
+def _machine_status_message(machine: Machine | MachineRef, status: str) -> dict:
+    return {
+        "type": "machine_status_changed",
+        "machine_id": machine.id,
+        "hostname": machine.hostname,
+        "campus_id": machine.campus_id,
+        "lab_id": machine.lab_id,
+        "status": status,
+    }
 
-@router.post("/auth/login", response_model=LoginResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)) -> LoginResponse:
-    user = db.scalar(select(User).where(and_(User.code == payload.user_code, User.is_active.is_(True))))
-    if user is None or not verify_password(payload.password, user.password_hash):
-        raise HTTPException(status_code=401, detail="INVALID_CREDENTIALS")
 
-    machine = db.scalar(
-        select(Machine)
-        .join(Lab, Lab.id == Machine.lab_id)
-        .join(Campus, Campus.id == Machine.campus_id)
-        .where(
-            and_(
-                Machine.hostname == payload.hostname,
-                Machine.is_active.is_(True),
-                Lab.code == payload.lab_code,
-                Campus.code == payload.campus_code,
-            )
-        )
-    )
+@contextmanager
+def _hashing_errors() -> Iterator[None]:
+    try:
+        yield
+    except PasswordHashingBusyError as exc:
+        raise HTTPException(status_code=503, detail="AUTH_BUSY", headers={"Retry-After": "1"}) from exc
+    except PasswordHashingTimeoutError as exc:
+        raise HTTPException(status_code=504, detail="AUTH_TIMEOUT") from exc
+
+
+def _run_hashing(func: Callable[..., T], *args: object) -> T:
+    with _hashing_errors():
+        return func(*args)
+
+
+async def _offload(func: Callable[..., T], *args: object) -> T:
+    # Redis-backed stores do network I/O; the in-memory ones are cheap enough to call on the event loop.
+    if settings.redis_url:
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+
+def _grant_login(
+    db: Session,
+    user: LoginUser,
+    payload: LoginRequest,
+    now: datetime,
+    password_hash: str | None,
+    timer: StageTimer,
+) -> LoginGrant:
+    with timer.stage("machine"):
+        machine = resolve_machine(db, payload.campus_code, payload.lab_code, payload.hostname)
     if machine is None:
         raise HTTPException(status_code=404, detail="MACHINE_NOT_REGISTERED")
 
-    active_sessions_count = db.scalar(
-        select(func.count(AuthSession.id)).where(
-            and_(AuthSession.user_id == user.id, AuthSession.status == "active")
+    with timer.stage("grant"):
+        lock_user_sessions(db, user.id)
+        active_locations = active_session_locations(db, user.id)
+        session_limit = max(1, user.max_sessions) if user.allow_multi_session else 1
+        if len(active_locations) >= session_limit:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="SESSION_LIMIT_REACHED")
+
+        previous_status = occupy_machine(db, machine, now)
+        if previous_status is None:
+            # The cached entry is stale (the machine moved, was disabled or re-created); resolve it once more.
+            machine_cache.invalidate((payload.campus_code, payload.lab_code, payload.hostname))
+            machine = resolve_machine(db, payload.campus_code, payload.lab_code, payload.hostname)
+            if machine is not None:
+                previous_status = occupy_machine(db, machine, now)
+        if previous_status is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="MACHINE_NOT_REGISTERED")
+
+        session_id = db.scalar(
+            insert(AuthSession)
+            .values(user_id=user.id, machine_id=machine.id, auth_mode=settings.node_role, status="active", start_at=now)
+            .returning(AuthSession.id)
         )
-    )
-    active_sessions_count = int(active_sessions_count or 0)
+        db.execute(
+            insert(Event).values(
+                campus_id=machine.campus_id,
+                lab_id=machine.lab_id,
+                user_id=user.id,
+                machine_id=machine.id,
+                session_id=session_id,
+                event_type="LOGIN_OK",
+                payload={"hostname": machine.hostname},
+                created_at=now,
+            )
+        )
+        record_session_started(
+            db,
+            campus_id=machine.campus_id,
+            lab_id=machine.lab_id,
+            machine_was_free=previous_status != "occupied",
+            other_user_locations=active_locations,
+        )
+        if password_hash is not None:
+            save_password_hash(db, user.id, password_hash, now)
+    with timer.stage("commit"):
+        db.commit()
+    return LoginGrant(session_id=session_id, machine=machine, previous_status=previous_status)
 
-    session_limit = max(1, user.max_sessions) if user.allow_multi_session else 1
-    if active_sessions_count >= session_limit:
-        raise HTTPException(status_code=409, detail="SESSION_LIMIT_REACHED")
 
-    now = datetime.now(timezone.utc)
-    session = AuthSession(
-        user_id=user.id,
-        machine_id=machine.id,
-        auth_mode="central",
-        status="active",
-        start_at=now,
-    )
-    db.add(session)
+@router.post("/auth/login", response_model=LoginResponse)
+async def login(payload: LoginRequest, response: Response) -> LoginResponse:
+    timer = StageTimer()
+    with timer.stage("user"):
+        user = await run_in_session(find_login_user, payload.user_code)
+    with timer.stage("verify"), _hashing_errors():
+        check = await check_password_async(payload.password, user.password_hash) if user is not None else None
+    if check is None or not check.valid:
+        raise HTTPException(status_code=401, detail="INVALID_CREDENTIALS")
 
-    machine.status = "occupied"
-    machine.last_seen_at = now
+    password_hash = None
+    if check.needs_rehash:
+        with timer.stage("rehash"):
+            password_hash = await rehash_password(user.id, payload.password)
 
-    db.flush()
-    db.add(
-        Event(
-            campus_id=machine.campus_id,
-            lab_id=machine.lab_id,
-            user_id=user.id,
-            machine_id=machine.id,
-            session_id=session.id,
-            event_type="LOGIN_OK",
-            payload={"hostname": machine.hostname},
-            created_at=now,
-        )
+    now = datetime.now(timezone.utc)
+    grant = await run_in_session(_grant_login, user, payload, now, password_hash, timer)
+    machine = grant.machine
+
+    token = create_access_token(user_code=user.code, session_id=grant.session_id)
+    await _offload(
+        live_hub.publish,
+        {
+            "type": "session_started",
+            "session_id": grant.session_id,
+            "user_code": user.code,
+            "machine_id": machine.id,
+            "hostname": machine.hostname,
+            "campus_id": machine.campus_id,
+            "lab_id": machine.lab_id,
+            "start_at": now,
+        },
     )
+    if grant.previous_status != "occupied":
+        await _offload(live_hub.publish, _machine_status_message(machine, "occupied"))
 
-    token = create_access_token(user_code=user.code, session_id=session.id)
-    db.commit()
+    response.headers["Server-Timing"] = timer.server_timing()
+    record_login_stages(timer.stages)
+    if timer.total_ms() > settings.login_slow_ms:
+        logger.warning("Slow login for %s: %s", payload.user_code, timer.server_timing())
 
     return LoginResponse(
         access_token=token,
         session=SessionInfo(
-            id=session.id,
+            id=grant.session_id,
             user_code=user.code,
             full_name=user.full_name,
             role=user.role,
             machine=machine.hostname,
-            auth_mode="central",
+            auth_mode=settings.node_role,
         ),
     )
 
 
-@router.post("/auth/logout", status_code=204)
-def logout(payload: LogoutRequest, db: Session = Depends(get_db)) -> Response:
+def _close_session(db: Session, payload: LogoutRequest, now: datetime) -> list[dict]:
     session = db.scalar(
         select(AuthSession).where(and_(AuthSession.id == payload.session_id, AuthSession.status == "active"))
     )
     if session is None:
-        return Response(status_code=204)
+        return []
 
-    now = datetime.now(timezone.utc)
     session.status = "closed"
     session.end_at = now
     session.close_reason = payload.reason
+    db.flush()
+    record_sessions_closed(db, [session.id])
 
     machine = db.get(Machine, session.machine_id)
+    previous_status = None
     if machine is not None:
+        previous_status = machine.status
         machine.last_seen_at = now
         active_machine_sessions = db.scalar(
             select(func.count(AuthSession.id)).where(
@@ -174,6 +322,16 @@ def logout(payload: LogoutRequest, db: Session = Depends(get_db)) -> Response:
         if int(active_machine_sessions or 0) == 0:
             machine.status = "free"
 
+        if machine.is_active:
+            remaining_locations = active_session_locations(db, session.user_id, exclude_session_id=session.id)
+            record_session_ended(
+                db,
+                campus_id=machine.campus_id,
+                lab_id=machine.lab_id,
+                machine_freed=previous_status == "occupied" and machine.status == "free",
+                other_user_locations=remaining_locations,
+            )
+
         db.add(
             Event(
                 campus_id=machine.campus_id,
@@ -187,119 +345,218 @@ def logout(payload: LogoutRequest, db: Session = Depends(get_db)) -> Response:
             )
         )
 
+    # Built before commit so publishing does not reload the expired rows.
+    messages = [
+        {
+            "type": "session_ended",
+            "session_id": session.id,
+            "machine_id": session.machine_id,
+            "hostname": machine.hostname if machine else None,
+            "campus_id": machine.campus_id if machine else None,
+            "lab_id": machine.lab_id if machine else None,
+            "reason": payload.reason,
+            "end_at": now,
+        }
+    ]
+    if machine is not None and previous_status != machine.status:
+        messages.append(_machine_status_message(machine, machine.status))
     db.commit()
+    return messages
+
+
+@router.post("/auth/logout", status_code=204)
+async def logout(payload: LogoutRequest) -> Response:
+    for message in await run_in_session(_close_session, payload, datetime.now(timezone.utc)):
+        await _offload(live_hub.publish, message)
     return Response(status_code=204)
 
 
-@router.post("/client/heartbeat", status_code=202)
-def heartbeat(payload: HeartbeatRequest, db: Session = Depends(get_db)) -> Response:
-    machine = db.scalar(select(Machine).where(Machine.hostname == payload.hostname))
-    if machine is not None:
-        machine.last_seen_at = payload.timestamp
-        db.add(
-            Event(
-                campus_id=machine.campus_id,
-                lab_id=machine.lab_id,
-                machine_id=machine.id,
-                session_id=payload.session_id,
-                event_type="HEARTBEAT",
-                payload={"os_type": payload.os_type, "uptime_seconds": payload.uptime_seconds},
-                created_at=payload.timestamp,
-            )
+def _record_heartbeat_event(db: Session, payload: HeartbeatRequest, machine: MachineRef) -> None:
+    event_payload = {"os_type": payload.os_type, "uptime_seconds": payload.uptime_seconds}
+    session_id = payload.session_id
+    if session_id is not None and db.scalar(select(AuthSession.id).where(AuthSession.id == session_id)) is None:
+        event_payload["unknown_session_id"] = session_id
+        session_id = None
+    db.add(
+        Event(
+            campus_id=machine.campus_id,
+            lab_id=machine.lab_id,
+            machine_id=machine.id,
+            session_id=session_id,
+            event_type="HEARTBEAT",
+            payload=event_payload,
+            created_at=payload.timestamp,
         )
-        db.commit()
+    )
+    db.commit()
+
+
+@router.post("/client/heartbeat", status_code=202)
+async def heartbeat(payload: HeartbeatRequest) -> Response:
+    machine = await run_in_session(resolve_machine_by_hostname, payload.hostname)
+    if machine is not None and await _offload(record_heartbeat, machine.id, payload.session_id, payload.timestamp):
+        await run_in_session(_record_heartbeat_event, payload, machine)
     return Response(status_code=202)
 
 
-@router.post("/client/events/bulk", status_code=202)
-def events_bulk(payload: BulkEventsRequest, db: Session = Depends(get_db)) -> Response:
-    machine = db.scalar(select(Machine).where(Machine.hostname == payload.hostname))
-    for item in payload.events:
-        db.add(
-            Event(
-                campus_id=machine.campus_id if machine else None,
-                lab_id=machine.lab_id if machine else None,
-                machine_id=machine.id if machine else None,
-                session_id=item.session_id,
-                event_type=item.type,
-                payload=item.payload,
-                created_at=item.timestamp,
-            )
-        )
+def _ingest_event_batch(db: Session, payload: BulkEventsRequest) -> EventBatchResult:
+    try:
+        result = ingest_event_batch(db, payload.hostname, payload.events, payload.batch_id)
+    except EventBatchError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
     db.commit()
+    return result
+
+
+@router.post("/client/events/bulk", status_code=202)
+async def events_bulk(request: Request) -> Response:
+    # The body is read by hand so oversized batches are refused before they are buffered and parsed.
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.events_bulk_max_bytes:
+        raise HTTPException(status_code=413, detail="EVENT_BATCH_TOO_LARGE")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.events_bulk_max_bytes:
+            raise HTTPException(status_code=413, detail="EVENT_BATCH_TOO_LARGE")
+    try:
+        payload = BulkEventsRequest.model_validate_json(body)
+    except ValidationError as exc:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+        raise RequestValidationError(errors) from exc
+    if len(payload.events) > settings.events_bulk_max_events:
+        raise HTTPException(status_code=413, detail="EVENT_BATCH_TOO_LARGE")
+
+    wait = await _offload(event_batch_limiter.take, payload.hostname)
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="RATE_LIMITED", headers={"Retry-After": str(math.ceil(wait))})
+    result = await run_in_session(_ingest_event_batch, payload)
+    if result.duplicate:
+        return Response(status_code=202, headers={"Idempotent-Replayed": "true"})
     return Response(status_code=202)
 
 
 @router.get("/dashboard/summary", response_model=DashboardSummary)
-def dashboard_summary(campus: str | None = Query(default=None), db: Session = Depends(get_db)) -> DashboardSummary:
-    machine_filter = [Machine.is_active.is_(True)]
-    if campus:
-        machine_filter.append(Campus.code == campus)
-
-    active_sessions_stmt = (
-        select(AuthSession.machine_id, AuthSession.user_id)
-        .join(Machine, Machine.id == AuthSession.machine_id)
-        .join(Campus, Campus.id == Machine.campus_id)
-        .where(and_(AuthSession.status == "active", *machine_filter))
-    )
-    active_sessions_subquery = active_sessions_stmt.subquery()
-
-    occupied = int(db.scalar(select(func.count(distinct(active_sessions_subquery.c.machine_id)))) or 0)
-    connected_users = int(db.scalar(select(func.count(distinct(active_sessions_subquery.c.user_id)))) or 0)
-    machines_total = int(
-        db.scalar(
-            select(func.count(Machine.id))
-            .join(Campus, Campus.id == Machine.campus_id)
-            .where(and_(*machine_filter))
-        )
-        or 0
-    )
+async def dashboard_summary(campus: str | None = Query(default=None)) -> DashboardSummary:
+    return await run_in_session(compute_summary, campus)
 
-    return DashboardSummary(
-        connected_users=connected_users,
-        machines_occupied=occupied,
-        machines_free=max(machines_total - occupied, 0),
-        alerts=0,
-        generated_at=datetime.now(tz=timezone.utc),
-    )
+
+@router.websocket("/dashboard/ws")
+async def dashboard_ws(websocket: WebSocket) -> None:
+    await websocket.accept()
+    queue = live_hub.subscribe()
+    try:
+        snapshot = await run_in_threadpool(live_hub.snapshot)
+        await websocket.send_json({"type": "snapshot", "summary": snapshot})
+        while True:
+            await websocket.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_hub.unsubscribe(queue)
 
 
-@router.get("/dashboard/labs/{campus_code}/{lab_code}")
-def dashboard_lab_status(campus_code: str, lab_code: str, db: Session = Depends(get_db)) -> dict:
-    lab = db.scalar(
-        select(Lab)
+def _lab_status(db: Session, campus_code: str, lab_code: str) -> dict:
+    active_session = (
+        select(AuthSession.user_id, AuthSession.start_at)
+        .where(and_(AuthSession.machine_id == Machine.id, AuthSession.status == "active"))
+        .order_by(AuthSession.start_at.asc())
+        .limit(1)
+        .lateral("active_session")
+    )
+    rows = db.execute(
+        select(Machine.hostname, Machine.status, User.code.label("user_code"), active_session.c.start_at)
+        .select_from(Lab)
         .join(Campus, Campus.id == Lab.campus_id)
+        .outerjoin(Machine, Machine.lab_id == Lab.id)
+        .outerjoin(active_session, true())
+        .outerjoin(User, User.id == active_session.c.user_id)
         .where(and_(Campus.code == campus_code, Lab.code == lab_code))
-    )
-    if lab is None:
+        .order_by(Machine.hostname.asc())
+    ).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="LAB_NOT_FOUND")
 
-    machines = db.scalars(select(Machine).where(Machine.lab_id == lab.id).order_by(Machine.hostname.asc())).all()
-    payload_machines: list[dict] = []
-    for machine in machines:
-        active_session = db.scalar(
-            select(AuthSession).where(and_(AuthSession.machine_id == machine.id, AuthSession.status == "active"))
-        )
-        active_user = db.get(User, active_session.user_id) if active_session else None
-        payload_machines.append(
-            {
-                "hostname": machine.hostname,
-                "status": machine.status,
-                "user_code": active_user.code if active_user else None,
-                "session_start": active_session.start_at if active_session else None,
-            }
-        )
-
+    payload_machines = [
+        {
+            "hostname": row.hostname,
+            "status": row.status,
+            "user_code": row.user_code,
+            "session_start": row.start_at,
+        }
+        for row in rows
+        if row.hostname is not None
+    ]
     return {"campus_code": campus_code, "lab_code": lab_code, "machines": payload_machines}
 
 
+@router.get("/dashboard/labs/{campus_code}/{lab_code}")
+async def dashboard_lab_status(campus_code: str, lab_code: str) -> dict:
+    return await run_in_session(_lab_status, campus_code, lab_code)
+
+
+def _require_relay_token(x_relay_token: str | None = Header(default=None)) -> None:
+    if settings.node_role != "central":
+        raise HTTPException(status_code=409, detail="NOT_CENTRAL_NODE")
+    if (
+        not settings.relay_sync_token
+        or x_relay_token is None
+        or not hmac.compare_digest(x_relay_token.encode(), settings.relay_sync_token.encode())
+    ):
+        raise HTTPException(status_code=401, detail="RELAY_UNAUTHORIZED")
+
+
+@router.get("/relay/snapshot", dependencies=[Depends(_require_relay_token)])
+def relay_snapshot(
+    since: datetime | None = Query(default=None),
+    after_id: int = Query(default=0, ge=0),
+    limit: int = Query(default=2000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+) -> dict:
+    return load_snapshot(db, since, after_id, limit)
+
+
+@router.post("/relay/replay", response_model=RelayReplayResponse, dependencies=[Depends(_require_relay_token)])
+def relay_replay(payload: RelayReplayRequest, db: Session = Depends(get_db)) -> RelayReplayResponse:
+    result = apply_replay(db, payload)
+    db.commit()
+    return RelayReplayResponse(**asdict(result))
+
+
+@router.get("/relay/status")
+def relay_status_view(db: Session = Depends(get_db)) -> dict:
+    return relay_status(db)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides.
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
 @router.get("/users", response_model=list[UserResponse])
-def users_list(active: bool | None = Query(default=None), db: Session = Depends(get_db)) -> list[UserResponse]:
-    stmt = select(User).order_by(User.id.asc())
-    if active is not None:
-        stmt = stmt.where(User.is_active.is_(active))
-    users = db.scalars(stmt).all()
-    return [_to_user_response(user) for user in users]
+def users_list(
+    active: bool | None = Query(default=None),
+    role: Literal["student", "teacher", "admin"] | None = Query(default=None),
+    plan: str | None = Query(default=None),
+    semester: str | None = Query(default=None),
+    source: Literal["local", "csv", "glpi"] | None = Query(default=None),
+    q: str | None = Query(default=None, min_length=1, max_length=160),
+    after: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+) -> Response:
+    filters = UserFilters(active=active, role=role, plan=plan, semester=semester, source=source, q=q)
+    page = list_users(db, filters, after, limit)
+    headers = {"ETag": page.etag, "Cache-Control": "private, no-cache"}
+    if page.next_cursor is not None:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if _etag_matches(if_none_match, page.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(page.rows), headers=headers)
 
 
 @router.post("/users", status_code=201, response_model=UserResponse)
@@ -318,7 +575,7 @@ def users_create(payload: UserCreateRequest, db: Session = Depends(get_db)) -> U
         role=payload.role,
         academic_plan=payload.academic_plan,
         semester=payload.semester,
-        password_hash=hash_password(payload.password),
+        password_hash=_run_hashing(hash_password_pooled, payload.password),
         allow_multi_session=payload.allow_multi_session,
         max_sessions=payload.max_sessions if payload.allow_multi_session else 1,
         is_active=payload.is_active,
@@ -351,7 +608,7 @@ def users_patch(id: int, payload: UserPatchRequest, db: Session = Depends(get_db
             setattr(user, field, body[field])
 
     if "password" in body and body["password"]:
-        user.password_hash = hash_password(body["password"])
+        user.password_hash = _run_hashing(hash_password_pooled, body["password"])
     if "allow_multi_session" in body:
         user.allow_multi_session = bool(body["allow_multi_session"])
     if "max_sessions" in body and body["max_sessions"] is not None:
@@ -370,108 +627,30 @@ def users_import_csv(file: UploadFile = File(...), db: Session = Depends(get_db)
     if not file.filename:
         raise HTTPException(status_code=400, detail="FILENAME_REQUIRED")
 
+    try:
+        validate_csv_header(file.file)
+    except CsvImportError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
     csv_import = CsvImport(filename=file.filename, status="processing", summary={})
     db.add(csv_import)
     db.flush()
 
-    created = 0
-    updated = 0
-    errors = 0
-    processed = 0
+    path = spool_path(f"csv_import_{csv_import.id}.csv")
+    with path.open("wb") as spool:
+        shutil.copyfileobj(file.file, spool)
+    db.commit()
 
-    content = file.file.read()
     try:
-        text = content.decode("utf-8-sig")
-    except UnicodeDecodeError as exc:
-        raise HTTPException(status_code=400, detail="INVALID_CSV_ENCODING") from exc
-
-    reader = DictReader(text.splitlines())
-    required_fields = {"code", "full_name", "role", "password"}
-    if reader.fieldnames is None or not required_fields.issubset(set(reader.fieldnames)):
-        raise HTTPException(status_code=400, detail="INVALID_CSV_HEADERS")
-
-    now = datetime.now(timezone.utc)
-    for row_number, row in enumerate(reader, start=2):
-        processed += 1
-        try:
-            code = (row.get("code") or "").strip()
-            full_name = (row.get("full_name") or "").strip()
-            role = (row.get("role") or "").strip()
-            password = row.get("password") or ""
-
-            if not code or not full_name or role not in {"student", "teacher", "admin"} or not password:
-                raise ValueError("Required fields missing or invalid role")
-
-            allow_multi = _parse_bool(row.get("allow_multi_session"), default=False)
-            max_sessions = int(row.get("max_sessions") or 1)
-            if max_sessions < 1:
-                raise ValueError("max_sessions must be >= 1")
-
-            existing = db.scalar(select(User).where(User.code == code))
-            if existing is None:
-                db.add(
-                    User(
-                        code=code,
-                        full_name=full_name,
-                        email=(row.get("email") or None) or None,
-                        role=role,
-                        academic_plan=(row.get("academic_plan") or None) or None,
-                        semester=(row.get("semester") or None) or None,
-                        password_hash=hash_password(password),
-                        allow_multi_session=allow_multi,
-                        max_sessions=max_sessions if allow_multi else 1,
-                        is_active=_parse_bool(row.get("is_active"), default=True),
-                        source="csv",
-                        updated_at=now,
-                    )
-                )
-                created += 1
-            else:
-                existing.full_name = full_name
-                existing.email = (row.get("email") or None) or None
-                existing.role = role
-                existing.academic_plan = (row.get("academic_plan") or None) or None
-                existing.semester = (row.get("semester") or None) or None
-                existing.password_hash = hash_password(password)
-                existing.allow_multi_session = allow_multi
-                existing.max_sessions = max_sessions if allow_multi else 1
-                existing.is_active = _parse_bool(row.get("is_active"), default=True)
-                existing.source = "csv"
-                existing.updated_at = now
-                updated += 1
-
-            db.add(
-                CsvImportRow(
-                    import_id=csv_import.id,
-                    row_number=row_number,
-                    row_status="ok",
-                    raw_data={k: (v or "") for k, v in row.items()},
-                )
-            )
-        except Exception as exc:
-            errors += 1
-            db.add(
-                CsvImportRow(
-                    import_id=csv_import.id,
-                    row_number=row_number,
-                    row_status="error",
-                    error_message=str(exc),
-                    raw_data={k: (v or "") for k, v in row.items()},
-                )
-            )
-
-    summary = {"processed": processed, "created": created, "updated": updated, "errors": errors}
-    csv_import.summary = summary
-    csv_import.ended_at = datetime.now(timezone.utc)
-    if errors == 0:
-        csv_import.status = "success"
-    elif created > 0 or updated > 0:
-        csv_import.status = "partial"
-    else:
+        job_queue.enqueue("csv_import", {"import_id": csv_import.id, "path": str(path)})
+    except JobError as exc:
         csv_import.status = "failed"
-
-    db.commit()
-    return CsvImportResponse(import_id=csv_import.id, status=csv_import.status, summary=summary)
+        csv_import.summary = {"error": str(exc)}
+        csv_import.ended_at = datetime.now(timezone.utc)
+        db.commit()
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=503, detail="JOB_QUEUE_UNAVAILABLE") from exc
+    return CsvImportResponse(import_id=csv_import.id, status=csv_import.status, summary={})
 
 
 @router.get("/users/import-csv", response_model=list[CsvImportListItem])
@@ -521,50 +700,40 @@ def users_import_csv_detail(import_id: int, db: Session = Depends(get_db)) -> Cs
 
 
 @router.get("/users/import-csv/{import_id}/errors.csv")
-def users_import_csv_errors_download(import_id: int, db: Session = Depends(get_db)) -> StreamingResponse:
-    csv_import = db.get(CsvImport, import_id)
-    if csv_import is None:
+def users_import_csv_errors_download(
+    import_id: int,
+    compress: bool = Query(default=False),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    if db.get(CsvImport, import_id) is None:
         raise HTTPException(status_code=404, detail="CSV_IMPORT_NOT_FOUND")
 
-    error_rows = db.scalars(
-        select(CsvImportRow)
-        .where(and_(CsvImportRow.import_id == import_id, CsvImportRow.row_status == "error"))
-        .order_by(CsvImportRow.row_number.asc())
-    ).all()
-
-    output = StringIO()
-    output.write("row_number,error_message,raw_data\n")
-    for row in error_rows:
-        message = (row.error_message or "Unknown error").replace('"', '""')
-        raw_data = str(row.raw_data or {}).replace('"', '""')
-        output.write(f'{row.row_number},"{message}","{raw_data}"\n')
-    output.seek(0)
-
-    filename = f"import_{import_id}_errors.csv"
+    filename = f"import_{import_id}_errors.csv.gz" if compress else f"import_{import_id}_errors.csv"
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-    return StreamingResponse(output, media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(
+        stream_error_report(import_id, compress),
+        media_type="application/gzip" if compress else "text/csv; charset=utf-8",
+        headers=headers,
+    )
 
 
 @router.post("/integrations/glpi/sync", status_code=202, response_model=GlpiSyncStartResponse)
 def glpi_sync(payload: GlpiSyncStartRequest, db: Session = Depends(get_db)) -> GlpiSyncStartResponse:
+    if db.scalar(select(GlpiSyncRun.id).where(GlpiSyncRun.status == "processing").limit(1)) is not None:
+        raise HTTPException(status_code=409, detail="GLPI_SYNC_IN_PROGRESS")
+
     run = GlpiSyncRun(run_type=payload.mode, status="processing", summary={})
     db.add(run)
-    db.flush()
+    db.commit()
 
     try:
-        result = sync_from_glpi(db)
-        run.status = result.status
-        run.summary = result.summary
-    except GlpiSyncError as exc:
+        job_queue.enqueue("glpi_sync", {"run_id": run.id, "full": payload.full})
+    except JobError as exc:
         run.status = "failed"
         run.summary = {"error": str(exc)}
-    except Exception as exc:
-        run.status = "failed"
-        run.summary = {"error": f"Unexpected sync error: {exc}"}
-    finally:
         run.ended_at = datetime.now(timezone.utc)
-
-    db.commit()
+        db.commit()
+        raise HTTPException(status_code=503, detail="JOB_QUEUE_UNAVAILABLE") from exc
     return GlpiSyncStartResponse(run_id=run.id, status=run.status)
 
 
@@ -599,7 +768,56 @@ def glpi_sync_status(run_id: int, db: Session = Depends(get_db)) -> GlpiSyncStat
     )
 
 
-@router.get("/reports/usage")
+def _report_export(
+    report: str,
+    export_format: str,
+    params: dict,
+    background: bool,
+    db: Session,
+) -> Response:
+    rows = count_export_rows(db, report, params)
+    if background or rows > settings.report_export_inline_rows:
+        export = ReportExport(
+            report=report,
+            format=export_format,
+            status="processing",
+            params=serialize_params(params),
+            summary={"rows_estimate": rows},
+        )
+        db.add(export)
+        db.commit()
+        try:
+            job_queue.enqueue("report_export", {"export_id": export.id})
+        except JobError as exc:
+            export.status = "failed"
+            export.summary = {**export.summary, "error": str(exc)}
+            export.ended_at = datetime.now(timezone.utc)
+            db.commit()
+            raise HTTPException(status_code=503, detail="JOB_QUEUE_UNAVAILABLE") from exc
+        return JSONResponse(status_code=202, content=jsonable_encoder(_to_report_export_response(export)))
+
+    filename = f"{report}_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(
+        stream_export(report, export_format, params),
+        media_type=EXPORT_FORMATS[export_format],
+        headers=headers,
+    )
+
+
+def _to_report_export_response(export: ReportExport) -> ReportExportResponse:
+    return ReportExportResponse(
+        export_id=export.id,
+        report=export.report,
+        format=export.format,
+        status=export.status,
+        started_at=export.started_at,
+        ended_at=export.ended_at,
+        summary=export.summary or {},
+    )
+
+
+@router.get("/reports/usage", response_model=None)
 def report_usage(
     from_: datetime | None = Query(default=None, alias="from"),
     to: datetime | None = Query(default=None),
@@ -608,72 +826,74 @@ def report_usage(
     user_code: str | None = Query(default=None),
     plan: str | None = Query(default=None),
     semester: str | None = Query(default=None),
-    format: str = Query(default="json"),
+    format: Literal["json", "csv", "xlsx", "pdf"] = Query(default="json"),
+    background: bool = Query(default=False),
+    source: Literal["raw", "rollup"] = Query(default="raw"),
     db: Session = Depends(get_db),
-) -> dict:
-    if format != "json":
-        return {"status": "not_implemented", "format": format}
-
-    stmt = (
-        select(AuthSession)
-        .join(User, User.id == AuthSession.user_id)
-        .join(Machine, Machine.id == AuthSession.machine_id)
-        .join(Lab, Lab.id == Machine.lab_id)
-        .join(Campus, Campus.id == Machine.campus_id)
+) -> dict | Response:
+    filters = UsageFilters(
+        from_=from_,
+        to=to,
+        campus=campus,
+        lab=lab,
+        user_code=user_code,
+        plan=plan,
+        semester=semester,
     )
-    if from_:
-        stmt = stmt.where(AuthSession.start_at >= from_)
-    if to:
-        stmt = stmt.where(AuthSession.start_at <= to)
-    if campus:
-        stmt = stmt.where(Campus.code == campus)
-    if lab:
-        stmt = stmt.where(Lab.code == lab)
-    if user_code:
-        stmt = stmt.where(User.code == user_code)
-    if plan:
-        stmt = stmt.where(User.academic_plan == plan)
-    if semester:
-        stmt = stmt.where(User.semester == semester)
-
-    sessions = db.scalars(stmt).all()
-    return {
-        "total_sessions": len(sessions),
-        "active_sessions": sum(1 for session in sessions if session.status == "active"),
-        "generated_at": datetime.now(timezone.utc),
-    }
+    if format != "json":
+        return _report_export("usage", format, asdict(filters), background, db)
+
+    if source == "rollup" and user_code:
+        raise HTTPException(status_code=400, detail="ROLLUP_UNSUPPORTED_FILTER")
+    report = usage_report_from_rollup(db, filters) if source == "rollup" else usage_report(db, filters)
+    return {**report, "generated_at": datetime.now(timezone.utc)}
 
 
-@router.get("/reports/attendance")
+@router.get("/reports/attendance", response_model=None)
 def report_attendance(
     from_: datetime | None = Query(default=None, alias="from"),
     to: datetime | None = Query(default=None),
     plan: str | None = Query(default=None),
     semester: str | None = Query(default=None),
     user_code: str | None = Query(default=None),
-    format: str = Query(default="json"),
+    after: str | None = Query(default=None),
+    limit: int = Query(default=500, ge=1, le=5000),
+    format: Literal["json", "csv", "xlsx", "pdf"] = Query(default="json"),
+    background: bool = Query(default=False),
     db: Session = Depends(get_db),
-) -> dict:
+) -> dict | Response:
     if format != "json":
-        return {"status": "not_implemented", "format": format}
-
-    stmt = select(User).where(User.is_active.is_(True))
-    if plan:
-        stmt = stmt.where(User.academic_plan == plan)
-    if semester:
-        stmt = stmt.where(User.semester == semester)
-    if user_code:
-        stmt = stmt.where(User.code == user_code)
-
-    users = db.scalars(stmt).all()
-    attendance_rows: list[dict] = []
-    for user in users:
-        sessions_stmt = select(AuthSession).where(AuthSession.user_id == user.id)
-        if from_:
-            sessions_stmt = sessions_stmt.where(AuthSession.start_at >= from_)
-        if to:
-            sessions_stmt = sessions_stmt.where(AuthSession.start_at <= to)
-        user_sessions = db.scalars(sessions_stmt).all()
-        attendance_rows.append({"user_code": user.code, "full_name": user.full_name, "sessions": len(user_sessions)})
-
-    return {"rows": attendance_rows, "generated_at": datetime.now(timezone.utc)}
+        params = {"from_": from_, "to": to, "plan": plan, "semester": semester, "user_code": user_code}
+        return _report_export("attendance", format, params, background, db)
+
+    page = attendance_report(
+        db,
+        from_=from_,
+        to=to,
+        plan=plan,
+        semester=semester,
+        user_code=user_code,
+        after=after,
+        limit=limit,
+    )
+    return {"rows": page.rows, "next_cursor": page.next_cursor, "generated_at": datetime.now(timezone.utc)}
+
+
+@router.get("/reports/exports/{export_id}", response_model=ReportExportResponse)
+def report_export_detail(export_id: int, db: Session = Depends(get_db)) -> ReportExportResponse:
+    export = db.get(ReportExport, export_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="REPORT_EXPORT_NOT_FOUND")
+    return _to_report_export_response(export)
+
+
+@router.get("/reports/exports/{export_id}/download")
+def report_export_download(export_id: int, db: Session = Depends(get_db)) -> FileResponse:
+    export = db.get(ReportExport, export_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="REPORT_EXPORT_NOT_FOUND")
+    if export.status != "success" or not export.file_path:
+        raise HTTPException(status_code=409, detail="REPORT_EXPORT_NOT_READY")
+
+    filename = f"{export.report}_{export.id}.{export.format}"
+    return FileResponse(export.file_path, media_type=EXPORT_FORMATS[export.format], filename=filename)
@@ -1,12 +1,38 @@
-﻿from collections.abc import Generator
+﻿from collections.abc import Callable, Generator
+from typing import TypeVar
 
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core_config import settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+T = TypeVar("T")
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> dict:
+    options = {
+        "pool_pre_ping": True,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+    }
+    if settings.node_role == "relay":
+        # Turns on the relay_outbox triggers for every write made through this node's connections.
+        options["connect_args"] = {"options": "-c loginuv.relay_outbox=on"}
+    return options
+
+
+engine = create_engine(settings.database_url, **_pool_options(settings.db_pool_size, settings.db_max_overflow))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, class_=Session)
+# Connections are only opened on first use, so the async pool costs nothing while DB_ASYNC_ENABLED is off.
+# It has its own size: with async on, a process can hold both pools' connections at once.
+async_engine = create_async_engine(
+    settings.database_url, **_pool_options(settings.db_async_pool_size, settings.db_async_max_overflow)
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, class_=AsyncSession)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -15,3 +41,16 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+def _run_with_session(func: Callable[..., T], *args: object) -> T:
+    with SessionLocal() as db:
+        return func(db, *args)
+
+
+async def run_in_session(func: Callable[..., T], *args: object) -> T:
+    # Under the async engine func runs on the event loop with non-blocking I/O, so it must only block on the database.
+    if settings.db_async_enabled:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(func, *args)
+    return await run_in_threadpool(_run_with_session, func, *args)
@@ -1,7 +1,76 @@
-﻿from fastapi import FastAPI
+﻿import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
 
 from app.api.v1.routes import router
 from app.core_config import settings
+from app.db import async_engine, engine
+from app.services.auth import hash_pool
+from app.services.csv_import import run_csv_import_purge
+from app.services.events import run_event_batch_purge
+from app.services.exports import run_export_purge
+from app.services.jobs import job_queue, run_stale_job_sweep
+from app.services.live import live_hub
+from app.services.metrics import MetricsMiddleware, instrument_engine
+from app.services.occupancy import run_occupancy_reconcile
+from app.services.partitions import run_event_partition_maintenance
+from app.services.presence import run_presence_flush, run_presence_watch
+from app.services.reaper import run_session_reaper
+from app.services.relay import run_relay_replay, run_relay_sync
+from app.services.rollup import run_usage_rollup_check
+from app.services.scheduler import PeriodicTask
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    live_hub.start(asyncio.get_running_loop())
+    hash_pool.start()
+    tasks = [
+        PeriodicTask("presence-flush", settings.presence_flush_interval_seconds, run_presence_flush, run_on_stop=True),
+        PeriodicTask("presence-watch", settings.presence_flush_interval_seconds, run_presence_watch),
+        PeriodicTask("session-reaper", settings.session_reaper_interval_seconds, run_session_reaper),
+        PeriodicTask("live-summary", settings.live_summary_interval_seconds, live_hub.refresh_summary),
+        PeriodicTask(
+            "occupancy-reconcile",
+            settings.occupancy_reconcile_interval_seconds,
+            run_occupancy_reconcile,
+            run_on_start=True,
+        ),
+        PeriodicTask("export-purge", 3600, run_export_purge),
+        PeriodicTask("csv-import-purge", 3600, run_csv_import_purge),
+        PeriodicTask("stale-job-sweep", 900, run_stale_job_sweep),
+        PeriodicTask("event-batch-purge", 3600, run_event_batch_purge),
+        PeriodicTask("usage-rollup-check", settings.usage_rollup_check_interval_seconds, run_usage_rollup_check),
+        PeriodicTask(
+            "event-partitions",
+            settings.events_partition_interval_seconds,
+            run_event_partition_maintenance,
+            run_on_start=True,
+        ),
+    ]
+    if settings.node_role == "relay":
+        tasks += [
+            PeriodicTask("relay-sync", settings.relay_sync_interval_seconds, run_relay_sync, run_on_start=True),
+            PeriodicTask("relay-replay", settings.relay_replay_interval_seconds, run_relay_replay, run_on_stop=True),
+        ]
+    for task in tasks:
+        task.start()
+    if settings.job_workers_enabled:
+        job_queue.start()
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.stop()
+        job_queue.stop()
+        live_hub.stop()
+        hash_pool.shutdown()
+
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 app.include_router(router)
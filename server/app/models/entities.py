@@ -6,6 +6,7 @@ from sqlalchemy import (
     Boolean,
     CheckConstraint,
     DateTime,
+    Float,
     ForeignKey,
     Integer,
     SmallInteger,
@@ -110,7 +111,10 @@ class Event(Base):
     session_id: Mapped[int | None] = mapped_column(ForeignKey("sessions.id"), nullable=True)
     event_type: Mapped[str] = mapped_column(String(40), nullable=False)
     payload: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Partitioned by month on created_at, which therefore has to be part of the primary key.
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now()
+    )
 
 
 class CsvImport(Base):
@@ -151,3 +155,98 @@ class GlpiSyncRun(Base):
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
     ended_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     summary: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+
+class UsageHourly(Base):
+    __tablename__ = "usage_hourly"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    lab_id: Mapped[int] = mapped_column(ForeignKey("labs.id"), primary_key=True)
+    machine_id: Mapped[int] = mapped_column(ForeignKey("machines.id"), primary_key=True)
+    plan: Mapped[str] = mapped_column(String(120), primary_key=True, default="")
+    semester: Mapped[str] = mapped_column(String(20), primary_key=True, default="")
+    campus_id: Mapped[int] = mapped_column(ForeignKey("campuses.id"), nullable=False)
+    session_minutes: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    logins: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class ReportExport(Base):
+    __tablename__ = "report_exports"
+    __table_args__ = (
+        CheckConstraint("report IN ('usage','attendance')", name="ck_report_exports_report"),
+        CheckConstraint("format IN ('csv','xlsx','pdf')", name="ck_report_exports_format"),
+        CheckConstraint("status IN ('processing','success','failed','expired')", name="ck_report_exports_status"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    report: Mapped[str] = mapped_column(String(20), nullable=False)
+    format: Mapped[str] = mapped_column(String(10), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="processing")
+    params: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    file_path: Mapped[str | None] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    ended_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    summary: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+
+class GlpiFingerprint(Base):
+    __tablename__ = "glpi_fingerprints"
+    __table_args__ = (CheckConstraint("item_type IN ('user','machine')", name="ck_glpi_fingerprints_item_type"),)
+
+    item_type: Mapped[str] = mapped_column(String(20), primary_key=True)
+    external_id: Mapped[str] = mapped_column(String(80), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    synced_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class OccupancyCounter(Base):
+    __tablename__ = "occupancy_counters"
+    __table_args__ = (CheckConstraint("scope IN ('global','campus','lab')", name="ck_occupancy_counters_scope"),)
+
+    scope: Mapped[str] = mapped_column(String(10), primary_key=True)
+    scope_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    machines_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    machines_occupied: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    connected_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    active_sessions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class ClientEventBatch(Base):
+    __tablename__ = "client_event_batches"
+
+    hostname: Mapped[str] = mapped_column(String(80), primary_key=True)
+    batch_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class RelayOutbox(Base):
+    __tablename__ = "relay_outbox"
+    __table_args__ = (CheckConstraint("kind IN ('session','event')", name="ck_relay_outbox_kind"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class RelaySyncState(Base):
+    __tablename__ = "relay_sync_state"
+
+    name: Mapped[str] = mapped_column(String(40), primary_key=True)
+    watermark: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    synced_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    full_synced_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    summary: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class RelaySession(Base):
+    __tablename__ = "relay_sessions"
+
+    relay_id: Mapped[str] = mapped_column(String(60), primary_key=True)
+    relay_session_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("sessions.id"), nullable=False)
@@ -42,17 +42,53 @@ class HeartbeatRequest(BaseModel):
 
 
 class EventItem(BaseModel):
-    type: str
+    type: str = Field(min_length=1, max_length=40)
     session_id: Optional[int] = None
     timestamp: datetime
     payload: dict = Field(default_factory=dict)
 
 
 class BulkEventsRequest(BaseModel):
-    hostname: str
+    hostname: str = Field(min_length=1, max_length=80)
+    batch_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
     events: list[EventItem]
 
 
+class RelaySessionItem(BaseModel):
+    id: int
+    user_id: int
+    machine_id: int
+    status: Literal["active", "closed", "forced"]
+    start_at: datetime
+    end_at: Optional[datetime] = None
+    close_reason: Optional[str] = Field(default=None, max_length=30)
+
+
+class RelayEventItem(BaseModel):
+    campus_id: Optional[int] = None
+    lab_id: Optional[int] = None
+    user_id: Optional[int] = None
+    machine_id: Optional[int] = None
+    session_id: Optional[int] = None
+    event_type: str = Field(min_length=1, max_length=40)
+    payload: dict = Field(default_factory=dict)
+    created_at: datetime
+
+
+class RelayReplayRequest(BaseModel):
+    relay_id: str = Field(min_length=1, max_length=60)
+    batch_id: str = Field(min_length=1, max_length=64)
+    sessions: list[RelaySessionItem] = Field(default_factory=list)
+    events: list[RelayEventItem] = Field(default_factory=list)
+
+
+class RelayReplayResponse(BaseModel):
+    sessions: int
+    events: int
+    skipped: int
+    duplicate: bool
+
+
 class DashboardSummary(BaseModel):
     connected_users: int
     machines_occupied: int
@@ -130,6 +166,7 @@ class CsvImportDetailResponse(BaseModel):
 
 class GlpiSyncStartRequest(BaseModel):
     mode: Literal["manual", "scheduled"]
+    full: bool = False
 
 
 class GlpiSyncStartResponse(BaseModel):
@@ -153,3 +190,13 @@ class GlpiSyncRunListItem(BaseModel):
     started_at: datetime
     ended_at: Optional[datetime] = None
     summary: dict = Field(default_factory=dict)
+
+
+class ReportExportResponse(BaseModel):
+    export_id: int
+    report: Literal["usage", "attendance"]
+    format: Literal["csv", "xlsx", "pdf"]
+    status: Literal["processing", "success", "failed", "expired"]
+    started_at: datetime
+    ended_at: Optional[datetime] = None
+    summary: dict = Field(default_factory=dict)
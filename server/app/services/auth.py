@@ -1,4 +1,12 @@
-﻿from datetime import datetime, timedelta, timezone
+﻿import asyncio
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 
 import jwt
 from argon2 import PasswordHasher
@@ -6,7 +14,27 @@ from argon2.exceptions import VerifyMismatchError
 
 from app.core_config import settings
 
-password_hasher = PasswordHasher()
+password_hasher = PasswordHasher(
+    time_cost=settings.argon2_time_cost,
+    memory_cost=settings.argon2_memory_cost,
+    parallelism=settings.argon2_parallelism,
+)
+
+BULK_HASH_BATCH_SIZE = 8
+
+
+class PasswordHashingBusyError(Exception):
+    pass
+
+
+class PasswordHashingTimeoutError(Exception):
+    pass
+
+
+@dataclass
+class PasswordCheck:
+    valid: bool
+    needs_rehash: bool
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -22,6 +50,119 @@ def hash_password(plain_password: str) -> str:
     return password_hasher.hash(plain_password)
 
 
+def _check_password(plain_password: str, hashed_password: str) -> PasswordCheck:
+    valid = verify_password(plain_password, hashed_password)
+    return PasswordCheck(valid=valid, needs_rehash=valid and password_hasher.check_needs_rehash(hashed_password))
+
+
+def _hash_batch(plain_passwords: list[str]) -> list[str]:
+    return [hash_password(password) for password in plain_passwords]
+
+
+class HashingPool:
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + max(0, queue_size)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Bulk jobs never hold more than one batch per worker, so interactive requests queue behind at most one batch.
+        self._bulk_slots = threading.BoundedSemaphore(self.workers)
+
+    def start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, func: Callable, *args: object, bounded: bool) -> Future:
+        executor = self.start()
+        with self._lock:
+            if bounded and self._in_flight >= self.capacity:
+                raise PasswordHashingBusyError("Password hashing queue is full")
+            self._in_flight += 1
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, func: Callable, *args: object, timeout: float) -> object:
+        future = self._submit(func, *args, bounded=True)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError as exc:
+            future.cancel()
+            raise PasswordHashingTimeoutError("Password hashing timed out") from exc
+
+    async def run_async(self, func: Callable, *args: object, timeout: float) -> object:
+        future = self._submit(func, *args, bounded=True)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError as exc:
+            future.cancel()
+            raise PasswordHashingTimeoutError("Password hashing timed out") from exc
+
+    def map_bulk(self, func: Callable[[list], list], items: list, batch_size: int) -> list:
+        futures: list[Future] = []
+        for start in range(0, len(items), batch_size):
+            self._bulk_slots.acquire()
+            try:
+                future = self._submit(func, items[start : start + batch_size], bounded=False)
+            except Exception:
+                self._bulk_slots.release()
+                raise
+            future.add_done_callback(lambda _: self._bulk_slots.release())
+            futures.append(future)
+        return [result for future in futures for result in future.result()]
+
+
+hash_pool = HashingPool(workers=settings.password_hash_workers, queue_size=settings.password_hash_queue_size)
+
+
+def check_password(plain_password: str, hashed_password: str) -> PasswordCheck:
+    return hash_pool.run(_check_password, plain_password, hashed_password, timeout=settings.auth_timeout_seconds)
+
+
+def hash_password_pooled(plain_password: str) -> str:
+    return hash_pool.run(hash_password, plain_password, timeout=settings.auth_timeout_seconds)
+
+
+async def check_password_async(plain_password: str, hashed_password: str) -> PasswordCheck:
+    return await hash_pool.run_async(
+        _check_password, plain_password, hashed_password, timeout=settings.auth_timeout_seconds
+    )
+
+
+async def hash_password_async(plain_password: str) -> str:
+    return await hash_pool.run_async(hash_password, plain_password, timeout=settings.auth_timeout_seconds)
+
+
+def hash_passwords(plain_passwords: list[str]) -> list[str]:
+    if len(plain_passwords) < 2:
+        return [hash_password(password) for password in plain_passwords]
+    return hash_pool.map_bulk(_hash_batch, plain_passwords, BULK_HASH_BATCH_SIZE)
+
+
 def create_access_token(user_code: str, session_id: int) -> str:
     now = datetime.now(timezone.utc)
     payload = {
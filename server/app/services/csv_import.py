@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import shutil
+import time
+import zlib
+from collections.abc import Callable, Iterator
+from csv import DictReader
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from io import TextIOWrapper
+from pathlib import Path
+from itertools import chain, islice
+from typing import BinaryIO
+
+from sqlalchemy import and_, delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import CsvImport, CsvImportRow, User
+from app.services.auth import hash_passwords
+from app.services.exports import iter_csv
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = {"code", "full_name", "role", "password"}
+VALID_ROLES = {"student", "teacher", "admin"}
+UPSERT_FIELDS = (
+    "full_name",
+    "email",
+    "role",
+    "academic_plan",
+    "semester",
+    "password_hash",
+    "allow_multi_session",
+    "max_sessions",
+    "is_active",
+    "source",
+    "updated_at",
+)
+# Template order for the error report; JSONB does not keep the uploaded header order.
+IMPORT_COLUMNS = (
+    "code",
+    "full_name",
+    "email",
+    "role",
+    "password",
+    "academic_plan",
+    "semester",
+    "allow_multi_session",
+    "max_sessions",
+    "is_active",
+)
+ERROR_REPORT_COLUMNS = ("row_number", "error_message")
+REDACTED = "***"
+
+
+class CsvImportError(Exception):
+    pass
+
+
+@dataclass
+class CsvImportResult:
+    summary: dict
+    status: str
+
+
+@dataclass
+class _Counters:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: int = 0
+
+
+def _parse_bool(value: str | None, *, default: bool = False) -> bool:
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "y", "si", "on"}
+
+
+def _redacted_fields() -> frozenset[str]:
+    return frozenset(field.strip().lower() for field in settings.csv_import_redacted_fields.split(",") if field.strip())
+
+
+def _raw_data(row: dict, redacted: frozenset[str]) -> dict:
+    return {k: (REDACTED if v and k and k.lower() in redacted else (v or "")) for k, v in row.items()}
+
+
+def _parse_row(row: dict, now: datetime) -> dict:
+    code = (row.get("code") or "").strip()
+    full_name = (row.get("full_name") or "").strip()
+    role = (row.get("role") or "").strip()
+    password = row.get("password") or ""
+
+    if not code or not full_name or role not in VALID_ROLES or not password:
+        raise ValueError("Required fields missing or invalid role")
+
+    allow_multi = _parse_bool(row.get("allow_multi_session"), default=False)
+    max_sessions = int(row.get("max_sessions") or 1)
+    if max_sessions < 1:
+        raise ValueError("max_sessions must be >= 1")
+
+    return {
+        "code": code,
+        "full_name": full_name,
+        "email": (row.get("email") or None) or None,
+        "role": role,
+        "academic_plan": (row.get("academic_plan") or None) or None,
+        "semester": (row.get("semester") or None) or None,
+        "password": password,
+        "allow_multi_session": allow_multi,
+        "max_sessions": max_sessions if allow_multi else 1,
+        "is_active": _parse_bool(row.get("is_active"), default=True),
+        "source": "csv",
+        "updated_at": now,
+    }
+
+
+def _process_chunk(
+    db: Session,
+    import_id: int,
+    chunk: list[tuple[int, dict]],
+    now: datetime,
+    counters: _Counters,
+) -> None:
+    import_rows: list[dict] = []
+    users_by_code: dict[str, dict] = {}
+    redacted = _redacted_fields()
+    for row_number, row in chunk:
+        counters.processed += 1
+        try:
+            values = _parse_row(row, now)
+        except Exception as exc:
+            counters.errors += 1
+            import_rows.append(
+                {
+                    "import_id": import_id,
+                    "row_number": row_number,
+                    "row_status": "error",
+                    "error_message": str(exc),
+                    "raw_data": _raw_data(row, redacted),
+                }
+            )
+            continue
+
+        if values["code"] in users_by_code:
+            # A later row for the same code overwrites the earlier one, as a second pass would.
+            counters.updated += 1
+        users_by_code[values["code"]] = values
+        if settings.csv_import_store_ok_rows:
+            import_rows.append(
+                {
+                    "import_id": import_id,
+                    "row_number": row_number,
+                    "row_status": "ok",
+                    "error_message": None,
+                    "raw_data": _raw_data(row, redacted),
+                }
+            )
+
+    if users_by_code:
+        existing_codes = set(db.scalars(select(User.code).where(User.code.in_(list(users_by_code)))).all())
+        users = list(users_by_code.values())
+        for user, password_hash in zip(users, hash_passwords([user.pop("password") for user in users])):
+            user["password_hash"] = password_hash
+
+        stmt = pg_insert(User).values(users)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[User.code],
+                set_={name: getattr(stmt.excluded, name) for name in UPSERT_FIELDS},
+            )
+        )
+        created = len(users_by_code.keys() - existing_codes)
+        counters.created += created
+        counters.updated += len(users_by_code) - created
+
+    if import_rows:
+        db.execute(insert(CsvImportRow), import_rows)
+
+
+def _check_header(reader: DictReader) -> None:
+    try:
+        fieldnames = reader.fieldnames
+    except UnicodeDecodeError as exc:
+        raise CsvImportError("INVALID_CSV_ENCODING") from exc
+    if fieldnames is None or not REQUIRED_FIELDS.issubset(set(fieldnames)):
+        raise CsvImportError("INVALID_CSV_HEADERS")
+
+
+def validate_csv_header(stream: BinaryIO) -> None:
+    text = TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        _check_header(DictReader(text))
+    finally:
+        text.detach()
+        stream.seek(0)
+
+
+def _summary(counters: _Counters, elapsed: float) -> dict:
+    return {
+        "processed": counters.processed,
+        "created": counters.created,
+        "updated": counters.updated,
+        "errors": counters.errors,
+        "duration_seconds": round(elapsed, 3),
+        "rows_per_second": round(counters.processed / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def import_users_csv(
+    db: Session,
+    csv_import: CsvImport,
+    stream: BinaryIO,
+    chunk_size: int | None = None,
+    on_progress: Callable[[dict], None] | None = None,
+) -> CsvImportResult:
+    chunk_size = chunk_size or settings.csv_import_chunk_size
+    started = time.perf_counter()
+    reader = DictReader(TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    _check_header(reader)
+
+    now = datetime.now(timezone.utc)
+    counters = _Counters()
+    rows = enumerate(reader, start=2)
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            _process_chunk(db, csv_import.id, chunk, now, counters)
+            if on_progress is not None:
+                on_progress(_summary(counters, time.perf_counter() - started))
+    except UnicodeDecodeError as exc:
+        raise CsvImportError("INVALID_CSV_ENCODING") from exc
+
+    summary = _summary(counters, time.perf_counter() - started)
+    if counters.errors == 0:
+        status = "success"
+    elif counters.created > 0 or counters.updated > 0:
+        status = "partial"
+    else:
+        status = "failed"
+    return CsvImportResult(summary=summary, status=status)
+
+
+def archive_original(import_id: int, path: str | Path, archive_dir: str | Path) -> Path:
+    directory = Path(archive_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f"csv_import_{import_id}.csv.gz"
+    partial = target.with_suffix(".gz.partial")
+    with open(path, "rb") as source, gzip.open(partial, "wb") as output:
+        shutil.copyfileobj(source, output)
+    os.replace(partial, target)
+    return target
+
+
+def run_csv_import_job(payload: dict) -> None:
+    path = payload["path"]
+    db = SessionLocal()
+    try:
+        csv_import = db.get(CsvImport, payload["import_id"])
+        # Jobs are delivered at least once, so a redelivery of a finished import must not touch it.
+        if csv_import is None or csv_import.status != "processing":
+            return
+        if (csv_import.summary or {}).get("progress"):
+            # Resuming after a crash: the committed chunks are imported again, so their rows would be duplicated.
+            db.execute(delete(CsvImportRow).where(CsvImportRow.import_id == csv_import.id))
+            csv_import.summary = {}
+            db.commit()
+
+        def _progress(summary: dict) -> None:
+            csv_import.summary = {**summary, "progress": "running"}
+            db.commit()
+
+        try:
+            with open(path, "rb") as stream:
+                result = import_users_csv(db, csv_import, stream, on_progress=_progress)
+            csv_import.summary = result.summary
+            csv_import.status = result.status
+        except CsvImportError as exc:
+            db.rollback()
+            csv_import.status = "failed"
+            csv_import.summary = {**(csv_import.summary or {}), "error": str(exc)}
+        except Exception as exc:
+            db.rollback()
+            csv_import.status = "failed"
+            csv_import.summary = {**(csv_import.summary or {}), "error": f"Unexpected import error: {exc}"}
+        if settings.csv_import_archive_dir:
+            try:
+                archived = archive_original(csv_import.id, path, settings.csv_import_archive_dir)
+                csv_import.summary = {**(csv_import.summary or {}), "original_file": str(archived)}
+            except OSError:
+                logger.exception("Could not archive the original file of CSV import %s", csv_import.id)
+        csv_import.ended_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _error_columns(raw_data: dict) -> tuple[str, ...]:
+    known = tuple(column for column in IMPORT_COLUMNS if column in raw_data)
+    return known + tuple(sorted(key for key in raw_data if key not in IMPORT_COLUMNS))
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+def _iter_error_rows(db: Session, import_id: int) -> Iterator[bytes]:
+    stmt = (
+        select(CsvImportRow.row_number, CsvImportRow.error_message, CsvImportRow.raw_data)
+        .where(and_(CsvImportRow.import_id == import_id, CsvImportRow.row_status == "error"))
+        .order_by(CsvImportRow.row_number.asc())
+        .execution_options(yield_per=settings.report_export_batch_size)
+    )
+    rows = iter(db.execute(stmt))
+    first = next(rows, None)
+    # Every row of one import shares the uploaded header, so the first error fixes the columns.
+    fields = _error_columns(first.raw_data or {}) if first is not None else IMPORT_COLUMNS
+
+    def _cells() -> Iterator[tuple]:
+        if first is None:
+            return
+        for row in chain((first,), rows):
+            raw_data = row.raw_data or {}
+            yield (row.row_number, row.error_message or "Unknown error", *(raw_data.get(field, "") for field in fields))
+
+    yield from iter_csv(ERROR_REPORT_COLUMNS + fields, _cells())
+
+
+def stream_error_report(import_id: int, compress: bool = False) -> Iterator[bytes]:
+    # Runs after the request dependency has closed its session, so it opens its own.
+    db = SessionLocal()
+    try:
+        chunks = _iter_error_rows(db, import_id)
+        yield from _gzip(chunks) if compress else chunks
+    finally:
+        db.close()
+
+
+def purge_old_imports(db: Session, retention_days: int | None = None, now: datetime | None = None) -> int:
+    retention_days = settings.csv_import_retention_days if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    expired = db.execute(
+        select(CsvImport.id, CsvImport.summary).where(
+            and_(CsvImport.started_at < cutoff, CsvImport.status != "processing")
+        )
+    ).all()
+    if not expired:
+        return 0
+
+    ids = [row.id for row in expired]
+    # Set-based deletes on the import_id index; one statement per table instead of a cascade per import.
+    db.execute(delete(CsvImportRow).where(CsvImportRow.import_id.in_(ids)))
+    db.execute(delete(CsvImport).where(CsvImport.id.in_(ids)))
+    db.commit()
+    for row in expired:
+        original = (row.summary or {}).get("original_file")
+        if original and os.path.exists(original):
+            os.remove(original)
+    return len(ids)
+
+
+def run_csv_import_purge() -> None:
+    db = SessionLocal()
+    try:
+        purged = purge_old_imports(db)
+        if purged:
+            logger.info("Purged %s old CSV imports", purged)
+    finally:
+        db.close()
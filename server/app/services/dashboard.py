@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, distinct, func, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import Campus, Machine, Session as AuthSession
+from app.schemas.dto import DashboardSummary
+from app.services.occupancy import read_counter
+
+
+def aggregate_summary(db: Session, campus: str | None = None) -> DashboardSummary:
+    machine_filter = [Machine.is_active.is_(True)]
+    if campus:
+        machine_filter.append(Campus.code == campus)
+
+    active_sessions_stmt = (
+        select(AuthSession.machine_id, AuthSession.user_id)
+        .join(Machine, Machine.id == AuthSession.machine_id)
+        .join(Campus, Campus.id == Machine.campus_id)
+        .where(and_(AuthSession.status == "active", *machine_filter))
+    )
+    active_sessions_subquery = active_sessions_stmt.subquery()
+
+    occupied = int(db.scalar(select(func.count(distinct(active_sessions_subquery.c.machine_id)))) or 0)
+    connected_users = int(db.scalar(select(func.count(distinct(active_sessions_subquery.c.user_id)))) or 0)
+    machines_total = int(
+        db.scalar(
+            select(func.count(Machine.id))
+            .join(Campus, Campus.id == Machine.campus_id)
+            .where(and_(*machine_filter))
+        )
+        or 0
+    )
+
+    return DashboardSummary(
+        connected_users=connected_users,
+        machines_occupied=occupied,
+        machines_free=max(machines_total - occupied, 0),
+        alerts=0,
+        generated_at=datetime.now(tz=timezone.utc),
+    )
+
+
+def compute_summary(db: Session, campus: str | None = None) -> DashboardSummary:
+    counter = read_counter(db, campus)
+    if counter is None:
+        return aggregate_summary(db, campus)
+
+    return DashboardSummary(
+        connected_users=max(counter.connected_users, 0),
+        machines_occupied=max(counter.machines_occupied, 0),
+        machines_free=max(counter.machines_total - counter.machines_occupied, 0),
+        alerts=0,
+        generated_at=datetime.now(tz=timezone.utc),
+    )
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from psycopg import AsyncConnection
+from psycopg.types.json import Jsonb
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import ClientEventBatch, Machine, Session as AuthSession
+from app.schemas.dto import EventItem
+
+logger = logging.getLogger(__name__)
+
+EVENT_COPY_COLUMNS = ("campus_id", "lab_id", "machine_id", "session_id", "event_type", "payload", "created_at")
+
+
+class EventBatchError(Exception):
+    pass
+
+
+@dataclass
+class EventBatchResult:
+    accepted: int
+    duplicate: bool
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def claim_event_batch(db: Session, hostname: str, batch_id: str, event_count: int) -> bool:
+    # A concurrent replay blocks on the primary key until the first request commits, then conflicts.
+    claimed = db.scalar(
+        insert(ClientEventBatch)
+        .values(hostname=hostname, batch_id=batch_id, event_count=event_count)
+        .on_conflict_do_nothing(index_elements=["hostname", "batch_id"])
+        .returning(ClientEventBatch.batch_id)
+    )
+    return claimed is not None
+
+
+async def _copy_events_async(raw: AsyncConnection, statement: str, rows: list[tuple]) -> None:
+    async with raw.cursor() as cursor:
+        async with cursor.copy(statement) as copy:
+            for row in rows:
+                await copy.write_row(row)
+
+
+def copy_events(db: Session, rows: list[tuple]) -> None:
+    statement = f"COPY events ({', '.join(EVENT_COPY_COLUMNS)}) FROM STDIN"
+    raw = db.connection().connection.driver_connection
+    if isinstance(raw, AsyncConnection):
+        # Under the async engine this runs inside run_sync's greenlet, which may await the driver directly.
+        await_only(_copy_events_async(raw, statement, rows))
+        return
+    with raw.cursor() as cursor:
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def ingest_event_batch(db: Session, hostname: str, events: list[EventItem], batch_id: str | None = None) -> EventBatchResult:
+    latest = datetime.now(timezone.utc) + timedelta(seconds=settings.events_bulk_max_future_seconds)
+    if any(_aware(item.timestamp) > latest for item in events):
+        raise EventBatchError("EVENT_TIMESTAMP_IN_FUTURE")
+
+    if batch_id is not None and not claim_event_batch(db, hostname, batch_id, len(events)):
+        return EventBatchResult(accepted=0, duplicate=True)
+    if not events:
+        return EventBatchResult(accepted=0, duplicate=False)
+
+    machine = db.execute(
+        select(Machine.id, Machine.campus_id, Machine.lab_id).where(Machine.hostname == hostname)
+    ).first()
+    session_ids = {item.session_id for item in events if item.session_id is not None}
+    known_sessions = (
+        set(db.scalars(select(AuthSession.id).where(AuthSession.id.in_(session_ids))).all()) if session_ids else set()
+    )
+
+    rows = []
+    for item in events:
+        payload = item.payload
+        session_id = item.session_id
+        if session_id is not None and session_id not in known_sessions:
+            # Sessions opened in relay mode may not exist centrally; keep the event without breaking the FK.
+            payload = {**payload, "unknown_session_id": session_id}
+            session_id = None
+        rows.append(
+            (
+                machine.campus_id if machine else None,
+                machine.lab_id if machine else None,
+                machine.id if machine else None,
+                session_id,
+                item.type,
+                Jsonb(payload),
+                _aware(item.timestamp),
+            )
+        )
+    copy_events(db, rows)
+    return EventBatchResult(accepted=len(rows), duplicate=False)
+
+
+def purge_event_batches(db: Session) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.events_batch_ttl_days)
+    result = db.execute(delete(ClientEventBatch).where(ClientEventBatch.received_at < cutoff))
+    db.commit()
+    return int(result.rowcount or 0)
+
+
+def run_event_batch_purge() -> None:
+    db = SessionLocal()
+    try:
+        purged = purge_event_batches(db)
+        if purged:
+            logger.info("Purged %s expired client event batch keys", purged)
+    finally:
+        db.close()
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import tempfile
+from collections.abc import Callable, Iterator
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+import xlsxwriter
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, ReportExport, Session as AuthSession, User
+from app.services.jobs import spool_path
+from app.services.reports import UsageFilters, attendance_report, attendance_users_select, usage_sessions_select
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+USAGE_COLUMNS = (
+    "session_id",
+    "user_code",
+    "full_name",
+    "plan",
+    "semester",
+    "campus",
+    "lab",
+    "hostname",
+    "status",
+    "start_at",
+    "end_at",
+    "minutes",
+)
+ATTENDANCE_COLUMNS = (
+    "user_code",
+    "full_name",
+    "sessions",
+    "total_minutes",
+    "distinct_days",
+    "first_seen",
+    "last_seen",
+)
+REPORT_TITLES = {"usage": "Reporte de uso", "attendance": "Reporte de asistencia"}
+XLSX_MAX_ROWS = 1048575
+CSV_FLUSH_ROWS = 500
+
+
+def serialize_params(params: dict) -> dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in params.items() if value is not None}
+
+
+def _load_params(params: dict) -> dict:
+    return {key: datetime.fromisoformat(value) if key in {"from_", "to"} else value for key, value in params.items()}
+
+
+def _iter_usage_rows(db: Session, params: dict) -> Iterator[tuple]:
+    minutes = func.round(
+        func.extract("epoch", func.coalesce(AuthSession.end_at, func.now()) - AuthSession.start_at) / 60, 1
+    )
+    stmt = usage_sessions_select(
+        UsageFilters(**params),
+        AuthSession.id,
+        User.code,
+        User.full_name,
+        User.academic_plan,
+        User.semester,
+        Campus.code,
+        Lab.code,
+        Machine.hostname,
+        AuthSession.status,
+        AuthSession.start_at,
+        AuthSession.end_at,
+        minutes,
+    ).order_by(AuthSession.start_at, AuthSession.id)
+    # yield_per streams from a server-side cursor instead of buffering the whole result.
+    for row in db.execute(stmt.execution_options(yield_per=settings.report_export_batch_size)):
+        yield tuple(row)
+
+
+def _iter_attendance_rows(db: Session, params: dict) -> Iterator[tuple]:
+    cursor = None
+    while True:
+        page = attendance_report(db, **params, after=cursor, limit=settings.report_export_batch_size)
+        for row in page.rows:
+            yield tuple(row[column] for column in ATTENDANCE_COLUMNS)
+        cursor = page.next_cursor
+        if cursor is None:
+            return
+
+
+REPORT_SOURCES: dict[str, tuple[tuple[str, ...], Callable[[Session, dict], Iterator[tuple]]]] = {
+    "usage": (USAGE_COLUMNS, _iter_usage_rows),
+    "attendance": (ATTENDANCE_COLUMNS, _iter_attendance_rows),
+}
+
+
+def count_export_rows(db: Session, report: str, params: dict) -> int:
+    if report == "usage":
+        stmt = usage_sessions_select(UsageFilters(**params), func.count(AuthSession.id))
+    else:
+        users = attendance_users_select(params.get("plan"), params.get("semester"), params.get("user_code")).subquery()
+        stmt = select(func.count()).select_from(users)
+    return int(db.scalar(stmt) or 0)
+
+
+def _cell(value: object) -> object:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(columns: tuple[str, ...], rows: Iterator[tuple]) -> Iterator[bytes]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_csv(path: str, title: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> int:
+    count = 0
+
+    def _counted() -> Iterator[tuple]:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, "wb") as output:
+        for chunk in iter_csv(columns, _counted()):
+            output.write(chunk)
+    return count
+
+
+def write_xlsx(path: str, title: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> int:
+    # constant_memory flushes each row to disk as soon as the next one starts.
+    workbook = xlsxwriter.Workbook(
+        path,
+        {"constant_memory": True, "remove_timezone": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"},
+    )
+    bold = workbook.add_format({"bold": True})
+    sheet = None
+    sheet_row = XLSX_MAX_ROWS
+    count = 0
+    try:
+        for row in rows:
+            if sheet_row >= XLSX_MAX_ROWS:
+                sheet = workbook.add_worksheet(f"{title[:24]} {len(workbook.worksheets()) + 1}")
+                sheet.write_row(0, 0, columns, bold)
+                sheet_row = 0
+            sheet_row += 1
+            sheet.write_row(sheet_row, 0, row)
+            count += 1
+        if sheet is None:
+            workbook.add_worksheet(title[:31]).write_row(0, 0, columns, bold)
+    finally:
+        workbook.close()
+    return count
+
+
+def write_pdf(path: str, title: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> int:
+    page_width, page_height = landscape(A4)
+    margin = 28
+    font_size = 7
+    line_height = font_size + 3
+    column_width = (page_width - 2 * margin) / len(columns)
+    canvas = Canvas(path, pagesize=(page_width, page_height), pageCompression=1)
+    generated_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    page = 0
+
+    def _fit(text: str) -> str:
+        while text and stringWidth(text, "Helvetica", font_size) > column_width - 4:
+            text = text[:-1]
+        return text
+
+    def _new_page() -> float:
+        nonlocal page
+        if page:
+            canvas.showPage()
+        page += 1
+        canvas.setFont("Helvetica-Bold", 11)
+        canvas.drawString(margin, page_height - margin, title)
+        canvas.setFont("Helvetica", 7)
+        canvas.drawRightString(page_width - margin, page_height - margin, f"{generated_at} - página {page}")
+        canvas.setFont("Helvetica-Bold", font_size)
+        top = page_height - margin - 20
+        for index, column in enumerate(columns):
+            canvas.drawString(margin + index * column_width, top, _fit(column))
+        canvas.line(margin, top - 3, page_width - margin, top - 3)
+        canvas.setFont("Helvetica", font_size)
+        return top - line_height
+
+    count = 0
+    y = _new_page()
+    for row in rows:
+        if count >= settings.report_pdf_max_rows:
+            canvas.setFont("Helvetica-Oblique", font_size)
+            canvas.drawString(margin, max(y, margin), f"Reporte truncado a {count} filas; use CSV o XLSX para el detalle completo.")
+            break
+        if y < margin:
+            y = _new_page()
+        for index, value in enumerate(row):
+            text = value.strftime("%Y-%m-%d %H:%M") if isinstance(value, datetime) else str(_cell(value))
+            canvas.drawString(margin + index * column_width, y, _fit(text))
+        y -= line_height
+        count += 1
+    canvas.showPage()
+    canvas.save()
+    return count
+
+
+WRITERS: dict[str, Callable[[str, str, tuple[str, ...], Iterator[tuple]], int]] = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+    "pdf": write_pdf,
+}
+
+
+def write_export(db: Session, report: str, export_format: str, params: dict, path: str) -> int:
+    columns, source = REPORT_SOURCES[report]
+    return WRITERS[export_format](path, REPORT_TITLES[report], columns, source(db, params))
+
+
+def stream_export(report: str, export_format: str, params: dict, chunk_size: int = 65536) -> Iterator[bytes]:
+    # Runs after the request dependency has closed its session, so it opens its own.
+    db = SessionLocal()
+    try:
+        columns, source = REPORT_SOURCES[report]
+        if export_format == "csv":
+            yield from iter_csv(columns, source(db, params))
+            return
+
+        handle, path = tempfile.mkstemp(suffix=f".{export_format}")
+        os.close(handle)
+        try:
+            write_export(db, report, export_format, params, path)
+            with open(path, "rb") as output:
+                while chunk := output.read(chunk_size):
+                    yield chunk
+        finally:
+            os.remove(path)
+    finally:
+        db.close()
+
+
+def export_path(export: ReportExport) -> str:
+    return str(spool_path(f"report-export-{export.id}.{export.format}"))
+
+
+def run_report_export_job(payload: dict) -> None:
+    db = SessionLocal()
+    try:
+        export = db.get(ReportExport, payload["export_id"])
+        if export is None or export.status != "processing":
+            return
+
+        path = export_path(export)
+        try:
+            rows = write_export(db, export.report, export.format, _load_params(export.params or {}), path)
+            db.rollback()
+            export.status = "success"
+            export.file_path = path
+            export.summary = {**(export.summary or {}), "rows": rows, "file_size": os.path.getsize(path)}
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Report export %s failed", export.id)
+            if os.path.exists(path):
+                os.remove(path)
+            export.status = "failed"
+            export.summary = {**(export.summary or {}), "error": f"Unexpected export error: {exc}"}
+        export.ended_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_expired_exports(db: Session) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.report_export_ttl_hours)
+    exports = db.scalars(
+        select(ReportExport).where(and_(ReportExport.status == "success", ReportExport.ended_at < cutoff))
+    ).all()
+    for export in exports:
+        if export.file_path and os.path.exists(export.file_path):
+            os.remove(export.file_path)
+        export.status = "expired"
+        export.file_path = None
+    db.commit()
+    return len(exports)
+
+
+def run_export_purge() -> None:
+    db = SessionLocal()
+    try:
+        purged = purge_expired_exports(db)
+        if purged:
+            logger.info("Purged %s expired report exports", purged)
+    finally:
+        db.close()
@@ -1,42 +1,118 @@
 from __future__ import annotations
 
+import hashlib
+import http.client
 import json
+import logging
+import queue
+import re
 import secrets
 import ssl
 import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from urllib import error, parse, request
+from itertools import islice
+from urllib import parse
 
-from sqlalchemy import and_, not_, select
+from sqlalchemy import Row, String, all_, and_, bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.core_config import settings
-from app.models.entities import Campus, Lab, Machine, User
-from app.services.auth import hash_password
+from app.db import SessionLocal, engine
+from app.models.entities import Campus, GlpiFingerprint, GlpiSyncRun, Lab, Machine, User
+from app.services.auth import hash_passwords
+from app.services.login import hostname_cache, machine_cache
+from app.services.occupancy import reconcile_occupancy
+
+logger = logging.getLogger(__name__)
 
 
 class GlpiSyncError(Exception):
     pass
 
 
+class GlpiHttpError(Exception):
+    pass
+
+
 @dataclass
 class GlpiSyncResult:
     summary: dict
     status: str
 
 
+_CONTENT_RANGE_RE = re.compile(r"^\s*(\d+)-(\d+)/(\d+)\s*$")
+# Same two-key space as partitions.MAINTENANCE_LOCK.
+GLPI_SYNC_LOCK = (7301, 2)
+
+
+class _ConnectionPool:
+    def __init__(self, base_url: str, timeout: int, ssl_context: ssl.SSLContext | None) -> None:
+        parts = parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or ""
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @contextmanager
+    def connection(self) -> Iterator[http.client.HTTPConnection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
 class GlpiClient:
-    def __init__(self) -> None:
-        if not settings.glpi_base_url or not settings.glpi_app_token or not settings.glpi_user_token:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        app_token: str | None = None,
+        user_token: str | None = None,
+    ) -> None:
+        base_url = base_url or settings.glpi_base_url
+        app_token = app_token or settings.glpi_app_token
+        user_token = user_token or settings.glpi_user_token
+        if not base_url or not app_token or not user_token:
             raise GlpiSyncError("GLPI credentials are not configured")
-        self.base_url = settings.glpi_base_url.rstrip("/")
-        self.app_token = settings.glpi_app_token
-        self.user_token = settings.glpi_user_token
+        self.base_url = base_url.rstrip("/")
+        self.app_token = app_token
+        self.user_token = user_token
         self.timeout = settings.glpi_timeout_seconds
+        self.page_size = max(1, settings.glpi_page_size)
+        self.concurrency = max(1, settings.glpi_page_concurrency)
         self._ssl_context = None
         if not settings.glpi_verify_ssl:
             self._ssl_context = ssl._create_unverified_context()  # noqa: SLF001
+        self._pool = _ConnectionPool(self.base_url, self.timeout, self._ssl_context)
+
+    def close(self) -> None:
+        self._pool.close()
 
     def _send_json_request(
         self,
@@ -44,21 +120,29 @@ class GlpiClient:
         endpoint: str,
         headers: dict[str, str] | None = None,
         params: dict[str, str] | None = None,
-    ) -> dict | list:
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+    ) -> tuple[dict | list, http.client.HTTPMessage]:
+        path = f"{self._pool.base_path}/{endpoint.lstrip('/')}"
         if params:
-            url = f"{url}?{parse.urlencode(params)}"
+            path = f"{path}?{parse.urlencode(params)}"
 
-        req = request.Request(url=url, method=method)
-        if headers:
-            for key, value in headers.items():
-                req.add_header(key, value)
-
-        with request.urlopen(req, timeout=self.timeout, context=self._ssl_context) as response:
-            content = response.read().decode("utf-8")
-            if not content:
-                return {}
-            return json.loads(content)
+        for attempt in range(2):
+            try:
+                with self._pool.connection() as conn:
+                    conn.request(method, path, headers=headers or {})
+                    response = conn.getresponse()
+                    content = response.read()
+                    if response.will_close:
+                        conn.close()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled keep-alive connection may have been dropped by the server; retry once on a fresh one.
+                if attempt == 1:
+                    raise
+        if response.status >= 400:
+            raise GlpiHttpError(f"HTTP {response.status} {response.reason} for {endpoint}")
+        if not content:
+            return {}, response.headers
+        return json.loads(content), response.headers
 
     def _request_with_retries(
         self,
@@ -66,7 +150,7 @@ class GlpiClient:
         endpoint: str,
         headers: dict[str, str] | None = None,
         params: dict[str, str] | None = None,
-    ) -> dict | list:
+    ) -> tuple[dict | list, http.client.HTTPMessage]:
         delays = [0, 5, 15, 30]
         last_error: Exception | None = None
         for attempt, delay in enumerate(delays):
@@ -74,14 +158,14 @@ class GlpiClient:
                 time.sleep(delay)
             try:
                 return self._send_json_request(method=method, endpoint=endpoint, headers=headers, params=params)
-            except (TimeoutError, error.URLError, error.HTTPError, json.JSONDecodeError) as exc:
+            except (OSError, http.client.HTTPException, GlpiHttpError, json.JSONDecodeError) as exc:
                 last_error = exc
                 if attempt == len(delays) - 1:
                     break
         raise GlpiSyncError(f"GLPI request failed after retries: {last_error}") from last_error
 
     def init_session(self) -> str:
-        response = self._request_with_retries(
+        response, _ = self._request_with_retries(
             method="GET",
             endpoint="/apirest.php/initSession",
             headers={"App-Token": self.app_token, "Authorization": f"user_token {self.user_token}"},
@@ -101,23 +185,48 @@ class GlpiClient:
         except GlpiSyncError:
             return
 
-    def list_users(self, session_token: str, limit: int = 1000) -> list[dict]:
-        response = self._request_with_retries(
+    def _fetch_page(
+        self,
+        session_token: str,
+        itemtype: str,
+        start: int,
+        params: dict[str, str] | None = None,
+    ) -> tuple[list[dict], int | None]:
+        response, headers = self._request_with_retries(
             method="GET",
-            endpoint="/apirest.php/User",
+            endpoint=f"/apirest.php/{itemtype}",
             headers={"App-Token": self.app_token, "Session-Token": session_token},
-            params={"range": f"0-{max(0, limit - 1)}"},
+            params={**(params or {}), "range": f"{start}-{start + self.page_size - 1}"},
         )
-        return response if isinstance(response, list) else []
+        items = response if isinstance(response, list) else []
+        match = _CONTENT_RANGE_RE.match(headers.get("Content-Range") or "")
+        return items, int(match.group(3)) if match else None
+
+    def iter_items(self, session_token: str, itemtype: str, params: dict[str, str] | None = None) -> Iterator[dict]:
+        items, total = self._fetch_page(session_token, itemtype, 0, params)
+        yield from items
+        if total is None or total <= self.page_size or not items:
+            return
 
-    def list_computers(self, session_token: str, limit: int = 2000) -> list[dict]:
-        response = self._request_with_retries(
-            method="GET",
-            endpoint="/apirest.php/Computer",
-            headers={"App-Token": self.app_token, "Session-Token": session_token},
-            params={"range": f"0-{max(0, limit - 1)}"},
-        )
-        return response if isinstance(response, list) else []
+        # Keep at most `concurrency` pages in flight so memory stays bounded on large inventories.
+        starts = iter(range(self.page_size, total, self.page_size))
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="loginuv-glpi") as executor:
+            pending: deque[Future] = deque(
+                executor.submit(self._fetch_page, session_token, itemtype, start, params)
+                for start in islice(starts, self.concurrency)
+            )
+            while pending:
+                page, _ = pending.popleft().result()
+                next_start = next(starts, None)
+                if next_start is not None:
+                    pending.append(executor.submit(self._fetch_page, session_token, itemtype, next_start, params))
+                yield from page
+
+    def iter_users(self, session_token: str) -> Iterator[dict]:
+        return self.iter_items(session_token, "User")
+
+    def iter_computers(self, session_token: str) -> Iterator[dict]:
+        return self.iter_items(session_token, "Computer")
 
 
 def _normalize_role(raw_role: str | None) -> str:
@@ -152,149 +261,415 @@ def _resolve_default_lab(db: Session) -> tuple[Campus, Lab]:
     return campus, lab
 
 
-def sync_from_glpi(db: Session) -> GlpiSyncResult:
+USER_SYNC_FIELDS = ("full_name", "email", "role", "academic_plan", "semester", "is_active")
+MACHINE_SYNC_FIELDS = ("asset_tag", "os_type")
+
+
+@dataclass
+class _SyncStats:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    disabled: int = 0
+    skipped: int = 0
+    watermark: str | None = None
+
+
+def _fingerprint(values: dict) -> str:
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _user_record(item: dict) -> dict | None:
+    external_id = str(item.get("id") or "").strip()
+    code = (item.get("name") or "").strip()
+    if not external_id or not code:
+        return None
+
+    first_name = (item.get("firstname") or "").strip()
+    last_name = (item.get("realname") or "").strip()
+    values = {
+        "code": code,
+        "full_name": f"{first_name} {last_name}".strip() or code,
+        "email": (item.get("email") or "").strip() or None,
+        "role": _normalize_role(item.get("role") or item.get("profile")),
+        "academic_plan": (item.get("academic_plan") or "").strip() or None,
+        "semester": (item.get("semester") or "").strip() or None,
+        "is_active": str(item.get("is_active", "1")).strip() not in {"0", "false", "False"},
+    }
+    return {"external_id": external_id, "values": values, "fingerprint": _fingerprint(values)}
+
+
+def _machine_record(item: dict) -> dict | None:
+    external_id = str(item.get("id") or "").strip()
+    hostname = (item.get("name") or "").strip()
+    if not external_id or not hostname:
+        return None
+
+    values = {
+        "hostname": hostname,
+        "asset_tag": (item.get("serial") or "").strip() or None,
+        "os_type": _infer_os_type(hostname, item),
+    }
+    return {"external_id": external_id, "values": values, "fingerprint": _fingerprint(values)}
+
+
+def _iter_records(
+    items: Iterator[dict],
+    to_record: Callable[[dict], dict | None],
+    stats: _SyncStats,
+    since: str | None,
+    seen_ids: set[str],
+) -> Iterator[dict]:
+    for item in items:
+        date_mod = str(item.get("date_mod") or "")
+        if since is not None and date_mod and date_mod < since:
+            # Items arrive newest first in incremental mode, so everything after this is already synced.
+            return
+        if date_mod and (stats.watermark is None or date_mod > stats.watermark):
+            stats.watermark = date_mod
+        record = to_record(item)
+        if record is None:
+            stats.skipped += 1
+            continue
+        seen_ids.add(record["external_id"])
+        yield record
+
+
+def _batches(records: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+def _changed_records(db: Session, item_type: str, batch: list[dict], stats: _SyncStats, full: bool) -> list[dict]:
+    if full:
+        # Fingerprints only say GLPI is unchanged; a full sync also repairs local edits, so every record is compared.
+        return batch
+    known = dict(
+        db.execute(
+            select(GlpiFingerprint.external_id, GlpiFingerprint.fingerprint).where(
+                and_(
+                    GlpiFingerprint.item_type == item_type,
+                    GlpiFingerprint.external_id.in_([record["external_id"] for record in batch]),
+                )
+            )
+        ).all()
+    )
+    changed = [record for record in batch if known.get(record["external_id"]) != record["fingerprint"]]
+    stats.unchanged += len(batch) - len(changed)
+    return changed
+
+
+def _save_fingerprints(db: Session, item_type: str, records: list[dict], now: datetime) -> None:
+    if not records:
+        return
+    stmt = pg_insert(GlpiFingerprint).values(
+        [
+            {
+                "item_type": item_type,
+                "external_id": record["external_id"],
+                "fingerprint": record["fingerprint"],
+                "synced_at": now,
+            }
+            for record in records
+        ]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["item_type", "external_id"],
+            set_={"fingerprint": stmt.excluded.fingerprint, "synced_at": stmt.excluded.synced_at},
+        )
+    )
+
+
+def _unique_records(records: list[dict], field: str, item_type: str, stats: _SyncStats) -> list[dict]:
+    unique: dict[str, dict] = {}
+    for record in records:
+        key = record["values"][field]
+        if key in unique:
+            stats.skipped += 1
+            logger.warning(
+                "GLPI %s %s and %s share %s %s; keeping %s",
+                item_type,
+                unique[key]["external_id"],
+                record["external_id"],
+                field,
+                key,
+                record["external_id"],
+            )
+        unique[key] = record
+    return list(unique.values())
+
+
+def _in_sync(local: Row, record: dict, fields: tuple[str, ...], expected: dict) -> bool:
+    return all(getattr(local, field) == record["values"][field] for field in fields) and all(
+        getattr(local, name) == value for name, value in expected.items()
+    )
+
+
+def _apply_user_batch(db: Session, batch: list[dict], now: datetime, stats: _SyncStats, full: bool) -> None:
+    changed = _changed_records(db, "user", batch, stats, full)
+    if not changed:
+        return
+    records = _unique_records(changed, "code", "user", stats)
+
+    local = {
+        row.code: row
+        for row in db.execute(
+            select(User.code, User.id, User.source, User.glpi_external_id, *(getattr(User, field) for field in USER_SYNC_FIELDS))
+            .where(User.code.in_([record["values"]["code"] for record in records]))
+        ).all()
+    }
+    existing = {code: row.id for code, row in local.items()}
+    inserts = [record for record in records if record["values"]["code"] not in local]
+    updates = []
+    for record in records:
+        row = local.get(record["values"]["code"])
+        if row is None:
+            continue
+        if _in_sync(row, record, USER_SYNC_FIELDS, {"source": "glpi", "glpi_external_id": record["external_id"]}):
+            stats.unchanged += 1
+        else:
+            updates.append(record)
+
+    if inserts:
+        password_hashes = hash_passwords([secrets.token_urlsafe(18) for _ in inserts])
+        db.execute(
+            insert(User),
+            [
+                {
+                    **record["values"],
+                    "password_hash": password_hash,
+                    "allow_multi_session": False,
+                    "max_sessions": 1,
+                    "source": "glpi",
+                    "glpi_external_id": record["external_id"],
+                    "updated_at": now,
+                }
+                for record, password_hash in zip(inserts, password_hashes)
+            ],
+        )
+    if updates:
+        db.execute(
+            update(User),
+            [
+                {
+                    "id": existing[record["values"]["code"]],
+                    **{field: record["values"][field] for field in USER_SYNC_FIELDS},
+                    "source": "glpi",
+                    "glpi_external_id": record["external_id"],
+                    "updated_at": now,
+                }
+                for record in updates
+            ],
+        )
+    _save_fingerprints(db, "user", changed, now)
+    stats.created += len(inserts)
+    stats.updated += len(updates)
+
+
+def _apply_machine_batch(
+    db: Session, batch: list[dict], default_lab: Lab, now: datetime, stats: _SyncStats, full: bool
+) -> None:
+    changed = _changed_records(db, "machine", batch, stats, full)
+    if not changed:
+        return
+    records = _unique_records(changed, "hostname", "machine", stats)
+
+    local = {
+        row.hostname: row
+        for row in db.execute(
+            select(
+                Machine.hostname,
+                Machine.id,
+                Machine.is_active,
+                Machine.glpi_external_id,
+                *(getattr(Machine, field) for field in MACHINE_SYNC_FIELDS),
+            ).where(Machine.hostname.in_([record["values"]["hostname"] for record in records]))
+        ).all()
+    }
+    existing = {hostname: row.id for hostname, row in local.items()}
+    inserts = [record for record in records if record["values"]["hostname"] not in local]
+    updates = []
+    for record in records:
+        row = local.get(record["values"]["hostname"])
+        if row is None:
+            continue
+        if _in_sync(row, record, MACHINE_SYNC_FIELDS, {"is_active": True, "glpi_external_id": record["external_id"]}):
+            stats.unchanged += 1
+        else:
+            updates.append(record)
+
+    if inserts:
+        db.execute(
+            insert(Machine),
+            [
+                {
+                    **record["values"],
+                    "campus_id": default_lab.campus_id,
+                    "lab_id": default_lab.id,
+                    "status": "free",
+                    "is_active": True,
+                    "glpi_external_id": record["external_id"],
+                    "updated_at": now,
+                }
+                for record in inserts
+            ],
+        )
+    if updates:
+        db.execute(
+            update(Machine),
+            [
+                {
+                    "id": existing[record["values"]["hostname"]],
+                    **{field: record["values"][field] for field in MACHINE_SYNC_FIELDS},
+                    "glpi_external_id": record["external_id"],
+                    "is_active": True,
+                    "updated_at": now,
+                }
+                for record in updates
+            ],
+        )
+    _save_fingerprints(db, "machine", changed, now)
+    stats.created += len(inserts)
+    stats.updated += len(updates)
+
+
+def _forget_missing(db: Session, item_type: str, seen_ids: set[str]) -> None:
+    # Disabled records lose their fingerprint so a later reactivation in GLPI is written again.
+    db.execute(
+        delete(GlpiFingerprint).where(
+            and_(
+                GlpiFingerprint.item_type == item_type,
+                GlpiFingerprint.external_id != all_(bindparam("seen_ids", list(seen_ids), type_=ARRAY(String))),
+            )
+        )
+    )
+
+
+def _disable_missing_users(db: Session, seen_ids: set[str], now: datetime) -> int:
+    result = db.execute(
+        update(User)
+        .where(
+            and_(
+                User.glpi_external_id.is_not(None),
+                User.source == "glpi",
+                User.glpi_external_id != all_(bindparam("seen_ids", list(seen_ids), type_=ARRAY(String))),
+                User.is_active.is_(True),
+            )
+        )
+        .values(is_active=False, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    _forget_missing(db, "user", seen_ids)
+    return int(result.rowcount or 0)
+
+
+def _disable_missing_machines(db: Session, seen_ids: set[str], now: datetime) -> int:
+    result = db.execute(
+        update(Machine)
+        .where(
+            and_(
+                Machine.glpi_external_id.is_not(None),
+                Machine.glpi_external_id != all_(bindparam("seen_ids", list(seen_ids), type_=ARRAY(String))),
+                Machine.is_active.is_(True),
+            )
+        )
+        .values(is_active=False, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    _forget_missing(db, "machine", seen_ids)
+    return int(result.rowcount or 0)
+
+
+def _last_watermarks(db: Session) -> dict | None:
+    last_run = db.scalar(
+        select(GlpiSyncRun)
+        .where(and_(GlpiSyncRun.status.in_(("success", "partial")), GlpiSyncRun.ended_at.is_not(None)))
+        .order_by(GlpiSyncRun.started_at.desc())
+        .limit(1)
+    )
+    if last_run is None:
+        return None
+    watermarks = (last_run.summary or {}).get("watermarks")
+    return watermarks if isinstance(watermarks, dict) else None
+
+
+def sync_from_glpi(
+    db: Session,
+    full: bool = False,
+    on_progress: Callable[[dict], None] | None = None,
+) -> GlpiSyncResult:
     now = datetime.now(timezone.utc)
+    watermarks = None if full else _last_watermarks(db)
+    incremental = watermarks is not None
     client = GlpiClient()
     session_token = client.init_session()
 
-    users_created = 0
-    users_updated = 0
-    users_disabled = 0
-    machines_created = 0
-    machines_updated = 0
-    machines_disabled = 0
-    skipped = 0
+    users = _SyncStats()
+    machines = _SyncStats()
+    batch_size = settings.glpi_page_size
 
     try:
-        remote_users = client.list_users(session_token=session_token)
-        remote_computers = client.list_computers(session_token=session_token)
-
+        params = {"sort": "date_mod", "order": "DESC"} if incremental else None
         glpi_user_ids: set[str] = set()
-        for item in remote_users:
-            external_id = str(item.get("id") or "").strip()
-            code = (item.get("name") or "").strip()
-            if not external_id or not code:
-                skipped += 1
-                continue
-
-            glpi_user_ids.add(external_id)
-            first_name = (item.get("firstname") or "").strip()
-            last_name = (item.get("realname") or "").strip()
-            full_name = f"{first_name} {last_name}".strip() or code
-            email = (item.get("email") or "").strip() or None
-            role = _normalize_role(item.get("role") or item.get("profile"))
-            is_active = str(item.get("is_active", "1")).strip() not in {"0", "false", "False"}
-            plan = (item.get("academic_plan") or "").strip() or None
-            semester = (item.get("semester") or "").strip() or None
-
-            user = db.scalar(select(User).where(User.code == code))
-            if user is None:
-                db.add(
-                    User(
-                        code=code,
-                        full_name=full_name,
-                        email=email,
-                        role=role,
-                        academic_plan=plan,
-                        semester=semester,
-                        password_hash=hash_password(secrets.token_urlsafe(18)),
-                        allow_multi_session=False,
-                        max_sessions=1,
-                        is_active=is_active,
-                        source="glpi",
-                        glpi_external_id=external_id,
-                        updated_at=now,
-                    )
-                )
-                users_created += 1
-            else:
-                user.full_name = full_name
-                user.email = email
-                user.role = role
-                user.academic_plan = plan
-                user.semester = semester
-                user.is_active = is_active
-                user.source = "glpi"
-                user.glpi_external_id = external_id
-                user.updated_at = now
-                users_updated += 1
-
-        if glpi_user_ids:
-            to_disable = db.scalars(
-                select(User).where(
-                    and_(
-                        User.glpi_external_id.is_not(None),
-                        User.source == "glpi",
-                        not_(User.glpi_external_id.in_(glpi_user_ids)),
-                        User.is_active.is_(True),
-                    )
-                )
-            ).all()
-            for user in to_disable:
-                user.is_active = False
-                user.updated_at = now
-                users_disabled += 1
+        user_records = _iter_records(
+            client.iter_items(session_token, "User", params),
+            _user_record,
+            users,
+            watermarks.get("User") if incremental else None,
+            glpi_user_ids,
+        )
+        for batch in _batches(user_records, batch_size):
+            _apply_user_batch(db, batch, now, users, full=not incremental)
+        if not incremental and glpi_user_ids:
+            users.disabled = _disable_missing_users(db, glpi_user_ids, now)
+
+        if on_progress is not None:
+            on_progress(
+                {
+                    "phase": "machines",
+                    "mode": "incremental" if incremental else "full",
+                    "users_created": users.created,
+                    "users_updated": users.updated,
+                    "users_unchanged": users.unchanged,
+                    "users_disabled": users.disabled,
+                    "skipped": users.skipped,
+                }
+            )
 
         _, default_lab = _resolve_default_lab(db)
         glpi_machine_ids: set[str] = set()
-        for item in remote_computers:
-            external_id = str(item.get("id") or "").strip()
-            hostname = (item.get("name") or "").strip()
-            if not external_id or not hostname:
-                skipped += 1
-                continue
-
-            glpi_machine_ids.add(external_id)
-            machine = db.scalar(select(Machine).where(Machine.hostname == hostname))
-            asset_tag = (item.get("serial") or "").strip() or None
-            os_type = _infer_os_type(hostname, item)
-
-            if machine is None:
-                db.add(
-                    Machine(
-                        campus_id=default_lab.campus_id,
-                        lab_id=default_lab.id,
-                        hostname=hostname,
-                        asset_tag=asset_tag,
-                        os_type=os_type,
-                        status="free",
-                        is_active=True,
-                        glpi_external_id=external_id,
-                        updated_at=now,
-                    )
-                )
-                machines_created += 1
-            else:
-                machine.asset_tag = asset_tag
-                machine.os_type = os_type
-                machine.glpi_external_id = external_id
-                machine.is_active = True
-                machine.updated_at = now
-                machines_updated += 1
-
-        if glpi_machine_ids:
-            to_disable_machines = db.scalars(
-                select(Machine).where(
-                    and_(
-                        Machine.glpi_external_id.is_not(None),
-                        not_(Machine.glpi_external_id.in_(glpi_machine_ids)),
-                        Machine.is_active.is_(True),
-                    )
-                )
-            ).all()
-            for machine in to_disable_machines:
-                machine.is_active = False
-                machine.updated_at = now
-                machines_disabled += 1
+        machine_records = _iter_records(
+            client.iter_items(session_token, "Computer", params),
+            _machine_record,
+            machines,
+            watermarks.get("Computer") if incremental else None,
+            glpi_machine_ids,
+        )
+        for batch in _batches(machine_records, batch_size):
+            _apply_machine_batch(db, batch, default_lab, now, machines, full=not incremental)
+        if not incremental and glpi_machine_ids:
+            machines.disabled = _disable_missing_machines(db, glpi_machine_ids, now)
+
+        if machines.created or machines.updated or machines.disabled:
+            reconcile_occupancy(db)
 
+        skipped = users.skipped + machines.skipped
         summary = {
-            "users_created": users_created,
-            "users_updated": users_updated,
-            "users_disabled": users_disabled,
-            "machines_created": machines_created,
-            "machines_updated": machines_updated,
-            "machines_disabled": machines_disabled,
+            "mode": "incremental" if incremental else "full",
+            "users_created": users.created,
+            "users_updated": users.updated,
+            "users_unchanged": users.unchanged,
+            "users_disabled": users.disabled,
+            "machines_created": machines.created,
+            "machines_updated": machines.updated,
+            "machines_unchanged": machines.unchanged,
+            "machines_disabled": machines.disabled,
             "skipped": skipped,
+            "watermarks": {
+                "User": users.watermark or (watermarks or {}).get("User"),
+                "Computer": machines.watermark or (watermarks or {}).get("Computer"),
+            },
         }
         status = "success"
         if skipped > 0:
@@ -302,3 +677,60 @@ def sync_from_glpi(db: Session) -> GlpiSyncResult:
         return GlpiSyncResult(summary=summary, status=status)
     finally:
         client.kill_session(session_token)
+        client.close()
+
+
+@contextmanager
+def _sync_lock() -> Iterator[bool]:
+    # Session-level lock on its own connection: the sync commits progress, so a transaction lock would not last.
+    with engine.connect() as connection:
+        acquired = bool(connection.scalar(select(func.pg_try_advisory_lock(*GLPI_SYNC_LOCK))))
+        connection.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.scalar(select(func.pg_advisory_unlock(*GLPI_SYNC_LOCK)))
+                connection.commit()
+
+
+def run_glpi_sync_job(payload: dict) -> None:
+    with _sync_lock() as acquired:
+        _run_glpi_sync(payload, acquired)
+
+
+def _run_glpi_sync(payload: dict, acquired: bool) -> None:
+    db = SessionLocal()
+    try:
+        run = db.get(GlpiSyncRun, payload["run_id"])
+        if run is None or run.status != "processing":
+            return
+        if not acquired:
+            run.status = "failed"
+            run.summary = {"error": "Another GLPI sync is already running"}
+            run.ended_at = datetime.now(timezone.utc)
+            db.commit()
+            return
+
+        def _progress(summary: dict) -> None:
+            run.summary = summary
+            db.commit()
+
+        try:
+            result = sync_from_glpi(db, full=bool(payload.get("full")), on_progress=_progress)
+            run.status = result.status
+            run.summary = result.summary
+        except GlpiSyncError as exc:
+            db.rollback()
+            run.status = "failed"
+            run.summary = {"error": str(exc)}
+        except Exception as exc:
+            db.rollback()
+            run.status = "failed"
+            run.summary = {"error": f"Unexpected sync error: {exc}"}
+        run.ended_at = datetime.now(timezone.utc)
+        db.commit()
+        machine_cache.clear()
+        hostname_cache.clear()
+    finally:
+        db.close()
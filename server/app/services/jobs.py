@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import redis
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import CsvImport, GlpiSyncRun, ReportExport
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {
+    "csv_import": "app.services.csv_import:run_csv_import_job",
+    "glpi_sync": "app.services.glpi:run_glpi_sync_job",
+    "report_export": "app.services.exports:run_report_export_job",
+}
+
+
+JOB_WORKER_TTL_SECONDS = 60
+
+
+class JobError(Exception):
+    pass
+
+
+def spool_path(filename: str) -> Path:
+    directory = Path(settings.job_spool_dir) if settings.job_spool_dir else Path(tempfile.gettempdir()) / "loginuv-jobs"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / filename
+
+
+def _resolve_handler(name: str) -> Callable[[dict], None] | None:
+    target = JOB_HANDLERS.get(name)
+    if target is None:
+        return None
+    module_name, func_name = target.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_job(name: str, payload: dict) -> None:
+    handler = _resolve_handler(name)
+    if handler is None:
+        logger.error("No handler registered for job %s", name)
+        return
+    try:
+        handler(payload)
+    except Exception:
+        logger.exception("Job %s failed with payload %s", name, payload)
+
+
+class InProcessJobBackend:
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = max(1, concurrency)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="loginuv-job")
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self, name: str, payload: dict) -> None:
+        try:
+            run_job(name, payload)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def enqueue(self, name: str, payload: dict) -> None:
+        self.start()
+        with self._lock:
+            self._pending += 1
+            self._executor.submit(self._run, name, payload)
+
+    def depth(self) -> int:
+        return self._pending
+
+
+class RedisJobBackend:
+    def __init__(self, url: str, concurrency: int, queue_key: str = "loginuv:jobs") -> None:
+        self.concurrency = max(1, concurrency)
+        self.queue_key = queue_key
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._client = redis.Redis.from_url(url)
+        self._stop = threading.Event()
+        self._workers: list[threading.Thread] = []
+
+    def processing_key(self, index: int) -> str:
+        return f"{self.queue_key}:processing:{self.worker_id}:{index}"
+
+    def _alive_key(self, worker_id: str) -> str:
+        return f"{self.queue_key}:alive:{worker_id}"
+
+    def recover_orphans(self) -> int:
+        # A processing list whose owner stopped refreshing its alive key belongs to a crashed or restarted process.
+        prefix = f"{self.queue_key}:processing:"
+        requeued = 0
+        for key in self._client.scan_iter(match=f"{prefix}*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            worker_id = key[len(prefix):].rsplit(":", 1)[0]
+            if self._client.exists(self._alive_key(worker_id)):
+                continue
+            while (item := self._client.lmove(key, self.queue_key, "RIGHT", "LEFT")) is not None:
+                logger.warning("Requeued job abandoned by %s: %r", worker_id, item)
+                requeued += 1
+        return requeued
+
+    def _monitor(self) -> None:
+        while True:
+            try:
+                self._client.set(self._alive_key(self.worker_id), "1", ex=JOB_WORKER_TTL_SECONDS)
+                self.recover_orphans()
+            except redis.RedisError:
+                logger.exception("Job worker heartbeat failed")
+            if self._stop.wait(JOB_WORKER_TTL_SECONDS / 4):
+                return
+
+    def _work(self, index: int) -> None:
+        processing_key = self.processing_key(index)
+        while not self._stop.is_set():
+            try:
+                # BLMOVE keeps the job in Redis until it has run, so a dead worker does not lose it.
+                item = self._client.blmove(self.queue_key, processing_key, 1, "LEFT", "RIGHT")
+            except redis.RedisError:
+                logger.exception("Job queue poll failed")
+                self._stop.wait(5)
+                continue
+            if item is None:
+                continue
+            try:
+                job = json.loads(item)
+            except ValueError:
+                logger.error("Discarding malformed job %r", item)
+            else:
+                run_job(job["name"], job.get("payload") or {})
+            try:
+                self._client.lrem(processing_key, 1, item)
+            except redis.RedisError:
+                logger.exception("Could not acknowledge job %r", item)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._stop.clear()
+        try:
+            # Alive before the first BLMOVE, so no other process mistakes this one's jobs for orphans.
+            self._client.set(self._alive_key(self.worker_id), "1", ex=JOB_WORKER_TTL_SECONDS)
+        except redis.RedisError:
+            logger.exception("Job worker heartbeat failed")
+        monitor = threading.Thread(target=self._monitor, name="loginuv-job-monitor", daemon=True)
+        monitor.start()
+        self._workers.append(monitor)
+        for index in range(self.concurrency):
+            worker = threading.Thread(target=self._work, args=(index,), name=f"loginuv-job-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._workers = []
+
+    def enqueue(self, name: str, payload: dict) -> None:
+        try:
+            self._client.rpush(self.queue_key, json.dumps({"name": name, "payload": payload}))
+        except redis.RedisError as exc:
+            raise JobError(f"Could not enqueue job {name}: {exc}") from exc
+
+    def depth(self) -> int:
+        return int(self._client.llen(self.queue_key))
+
+
+JobBackend = InProcessJobBackend | RedisJobBackend
+
+
+def build_job_queue() -> JobBackend:
+    if settings.redis_url:
+        return RedisJobBackend(settings.redis_url, concurrency=settings.job_concurrency)
+    return InProcessJobBackend(concurrency=settings.job_concurrency)
+
+
+job_queue = build_job_queue()
+
+
+def fail_stale_jobs(db: Session, now: datetime | None = None) -> int:
+    # Safety net for jobs lost with their process (always possible with the in-process backend).
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=settings.job_stale_hours)
+    failed = 0
+    for model in (CsvImport, GlpiSyncRun, ReportExport):
+        for row in db.scalars(select(model).where(and_(model.status == "processing", model.started_at < cutoff))).all():
+            row.status = "failed"
+            row.ended_at = now
+            row.summary = {**(row.summary or {}), "error": f"Job did not finish within {settings.job_stale_hours} hours"}
+            if isinstance(row, CsvImport):
+                spool_path(f"csv_import_{row.id}.csv").unlink(missing_ok=True)
+            failed += 1
+    db.commit()
+    return failed
+
+
+def run_stale_job_sweep() -> None:
+    db = SessionLocal()
+    try:
+        failed = fail_stale_jobs(db)
+        if failed:
+            logger.warning("Marked %s stale jobs as failed", failed)
+    finally:
+        db.close()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import redis
+from fastapi.encoders import jsonable_encoder
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.services.dashboard import compute_summary
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MIN_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class LiveHub:
+    def __init__(self, redis_url: str = "", channel: str = "loginuv:live") -> None:
+        self.channel = channel
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._listener: threading.Thread | None = None
+        self._pubsub = None
+        self._stopping = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot: dict | None = None
+        self._snapshot_at = 0.0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        if self._redis is not None and self._listener is None:
+            self._stopping.clear()
+            self._listener = threading.Thread(target=self._listen, name="loginuv-live-listener", daemon=True)
+            self._listener.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+        self._listener = None
+        self._loop = None
+
+    def _listen(self) -> None:
+        delay = RECONNECT_MIN_SECONDS
+        reconnecting = False
+        while not self._stopping.is_set():
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub = pubsub
+            try:
+                pubsub.subscribe(self.channel)
+                if self._stopping.is_set():
+                    break
+                if reconnecting:
+                    logger.info("Live pub/sub listener resubscribed to %s", self.channel)
+                    # Deltas published while disconnected are lost, so subscribers start over from a snapshot.
+                    self._resync()
+                    delay = RECONNECT_MIN_SECONDS
+                for item in pubsub.listen():
+                    try:
+                        self._dispatch_threadsafe(json.loads(item["data"]))
+                    except (TypeError, ValueError):
+                        logger.warning("Discarding malformed live message")
+            except Exception:
+                if self._stopping.is_set():
+                    break
+                logger.exception("Live pub/sub listener lost Redis, reconnecting in %ss", delay)
+            finally:
+                pubsub.close()
+            reconnecting = True
+            self._stopping.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    def _resync(self) -> None:
+        with self._snapshot_lock:
+            self._snapshot = None
+        if not self._subscribers:
+            return
+        try:
+            snapshot = self.snapshot()
+        except Exception:
+            logger.exception("Could not rebuild the live snapshot after reconnecting")
+            return
+        self._dispatch_threadsafe({"type": "snapshot", "summary": snapshot})
+
+    def _dispatch_threadsafe(self, message: dict) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: dict) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def publish(self, message: dict) -> None:
+        # With Redis every worker receives the delta through its single subscription,
+        # so local delivery only happens when Redis is absent or unreachable.
+        message = jsonable_encoder(message)
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.channel, json.dumps(message))
+                return
+            except redis.RedisError:
+                logger.exception("Live publish to Redis failed, delivering locally only")
+        self._dispatch_threadsafe(message)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.live_queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def snapshot(self) -> dict:
+        with self._snapshot_lock:
+            if self._snapshot is None or time.monotonic() - self._snapshot_at >= settings.live_snapshot_ttl_seconds:
+                db = SessionLocal()
+                try:
+                    summary = compute_summary(db)
+                finally:
+                    db.close()
+                self._snapshot = jsonable_encoder(summary)
+                self._snapshot_at = time.monotonic()
+            return self._snapshot
+
+    def refresh_summary(self) -> None:
+        if not self._subscribers:
+            return
+        with self._snapshot_lock:
+            self._snapshot = None
+        self._dispatch_threadsafe({"type": "summary", "summary": self.snapshot()})
+
+
+live_hub = LiveHub(settings.redis_url)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession, User
+from app.services.auth import PasswordHashingBusyError, PasswordHashingTimeoutError, hash_password_async
+from app.services.cache import TtlCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MachineRef:
+    id: int
+    hostname: str
+    campus_id: int
+    lab_id: int
+
+
+@dataclass(frozen=True)
+class LoginUser:
+    id: int
+    code: str
+    full_name: str
+    role: str
+    password_hash: str
+    allow_multi_session: bool
+    max_sessions: int
+
+
+@dataclass(frozen=True)
+class LoginGrant:
+    session_id: int
+    machine: MachineRef
+    previous_status: str
+
+
+machine_cache: TtlCache[tuple[str, str, str], MachineRef] = TtlCache(
+    settings.login_cache_ttl_seconds, settings.login_cache_size
+)
+
+hostname_cache: TtlCache[str, MachineRef] = TtlCache(settings.login_cache_ttl_seconds, settings.login_cache_size)
+
+
+def find_login_user(db: Session, user_code: str) -> LoginUser | None:
+    row = db.execute(
+        select(
+            User.id,
+            User.code,
+            User.full_name,
+            User.role,
+            User.password_hash,
+            User.allow_multi_session,
+            User.max_sessions,
+        ).where(and_(User.code == user_code, User.is_active.is_(True)))
+    ).first()
+    return LoginUser(**row._mapping) if row is not None else None
+
+
+def resolve_machine(db: Session, campus_code: str, lab_code: str, hostname: str) -> MachineRef | None:
+    key = (campus_code, lab_code, hostname)
+    cached = machine_cache.get(key)
+    if cached is not None:
+        return cached
+
+    row = db.execute(
+        select(Machine.id, Machine.hostname, Machine.campus_id, Machine.lab_id)
+        .join(Lab, Lab.id == Machine.lab_id)
+        .join(Campus, Campus.id == Machine.campus_id)
+        .where(
+            and_(
+                Machine.hostname == hostname,
+                Machine.is_active.is_(True),
+                Lab.code == lab_code,
+                Campus.code == campus_code,
+            )
+        )
+    ).first()
+    if row is None:
+        return None
+    machine = MachineRef(id=row.id, hostname=row.hostname, campus_id=row.campus_id, lab_id=row.lab_id)
+    machine_cache.set(key, machine)
+    return machine
+
+
+def resolve_machine_by_hostname(db: Session, hostname: str) -> MachineRef | None:
+    cached = hostname_cache.get(hostname)
+    if cached is not None:
+        return cached
+
+    row = db.execute(
+        select(Machine.id, Machine.hostname, Machine.campus_id, Machine.lab_id).where(Machine.hostname == hostname)
+    ).first()
+    if row is None:
+        return None
+    machine = MachineRef(id=row.id, hostname=row.hostname, campus_id=row.campus_id, lab_id=row.lab_id)
+    hostname_cache.set(hostname, machine)
+    return machine
+
+
+def lock_user_sessions(db: Session, user_id: int) -> None:
+    # Serializes concurrent logins of one user until commit, so the session limit check cannot be raced.
+    db.execute(select(func.pg_advisory_xact_lock(user_id)))
+
+
+def active_session_locations(db: Session, user_id: int, exclude_session_id: int | None = None) -> list[tuple[int, int]]:
+    conditions = [AuthSession.user_id == user_id, AuthSession.status == "active"]
+    if exclude_session_id is not None:
+        conditions.append(AuthSession.id != exclude_session_id)
+    return [
+        tuple(row)
+        for row in db.execute(
+            select(Machine.campus_id, Machine.lab_id)
+            .select_from(AuthSession)
+            .join(Machine, Machine.id == AuthSession.machine_id)
+            .where(and_(*conditions))
+        ).all()
+    ]
+
+
+def occupy_machine(db: Session, machine: MachineRef, now: datetime) -> str | None:
+    # Matching the cached location too means a machine moved or disabled by another worker is never granted.
+    previous = (
+        select(Machine.id, Machine.status)
+        .where(
+            and_(
+                Machine.id == machine.id,
+                Machine.hostname == machine.hostname,
+                Machine.campus_id == machine.campus_id,
+                Machine.lab_id == machine.lab_id,
+                Machine.is_active.is_(True),
+            )
+        )
+        .with_for_update()
+        .subquery()
+    )
+    return db.scalar(
+        update(Machine)
+        .where(Machine.id == previous.c.id)
+        .values(status="occupied", last_seen_at=now)
+        .returning(previous.c.status)
+    )
+
+
+async def rehash_password(user_id: int, plain_password: str) -> str | None:
+    try:
+        return await hash_password_async(plain_password)
+    except (PasswordHashingBusyError, PasswordHashingTimeoutError):
+        # The next login retries; the old hash stays valid meanwhile.
+        logger.info("Skipping password rehash for user %s: hashing pool saturated", user_id)
+        return None
+
+
+def save_password_hash(db: Session, user_id: int, password_hash: str, now: datetime) -> None:
+    db.execute(update(User).where(User.id == user_id).values(password_hash=password_hash, updated_at=now))
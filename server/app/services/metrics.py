@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter as FrameCounter
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core_config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "<unmatched>"
+INF_BUCKET = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            # Per-bucket counts plus sum and count in the last two slots; cumulated only when rendered.
+            slots = self._values.setdefault(label_values, [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    slots[index] += 1
+                    break
+            slots[-2] += value
+            slots[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(slots)) for key, slots in self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, slots in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, slots):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, INF_BUCKET)} {_format_value(slots[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(slots[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(slots[-1])}")
+        return lines
+
+
+def _gauge(name: str, help_text: str, samples: Iterable[tuple[dict[str, str], float]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        names = tuple(labels)
+        lines.append(f"{name}{_format_labels(names, tuple(labels[key] for key in names))} {_format_value(value)}")
+    return lines
+
+
+http_requests = Counter("loginuv_http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status"))
+http_latency = Histogram(
+    "loginuv_http_request_duration_seconds",
+    "Time from request start to the last body chunk.",
+    ("route", "method", "status"),
+)
+http_db_queries = Histogram(
+    "loginuv_http_request_db_queries",
+    "SQL statements executed per request; a route whose upper buckets fill up is issuing queries per row.",
+    ("route", "method"),
+    buckets=COUNT_BUCKETS,
+)
+http_db_seconds = Histogram(
+    "loginuv_http_request_db_seconds",
+    "Time spent executing SQL per request.",
+    ("route", "method"),
+)
+db_queries = Counter("loginuv_db_queries_total", "SQL statements executed by operation.", ("operation",))
+db_query_latency = Histogram(
+    "loginuv_db_query_duration_seconds",
+    "SQL statement execution time by operation.",
+    ("operation",),
+    buckets=QUERY_BUCKETS,
+)
+login_stages = Histogram(
+    "loginuv_login_stage_seconds",
+    "Login time per stage; verify and rehash are the Argon2 work.",
+    ("stage",),
+)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+    threads: set[int] = field(default_factory=set)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("loginuv_request_stats", default=None)
+_captures: list[list[str]] = []
+_captures_lock = threading.Lock()
+
+
+def current_request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+@contextmanager
+def capture_queries() -> Iterator[list[str]]:
+    # Process-wide, unlike RequestStats: it also sees statements run on threads the caller does not own.
+    statements: list[str] = []
+    with _captures_lock:
+        _captures.append(statements)
+    try:
+        yield statements
+    finally:
+        with _captures_lock:
+            _captures.remove(statements)
+
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip(" (\n\t").split(None, 1)
+    return keyword[0].upper() if keyword else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("loginuv_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("loginuv_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = _operation(statement)
+    db_queries.inc(operation)
+    db_query_latency.observe(elapsed, operation)
+    if _captures:
+        with _captures_lock:
+            for statements in _captures:
+                statements.append(statement)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        stats.threads.add(threading.get_ident())
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def record_login_stages(stages: list[tuple[str, float]]) -> None:
+    for name, duration_ms in stages:
+        login_stages.observe(duration_ms / 1000, name)
+
+
+class StackSampler:
+    def __init__(self, threads: Callable[[], set[int]], interval_seconds: float) -> None:
+        self._threads = threads
+        self.interval_seconds = interval_seconds
+        self.samples: FrameCounter[str] = FrameCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="loginuv-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            wanted = self._threads()
+            for ident, frame in sys._current_frames().items():
+                if ident not in wanted:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+
+def _profile_path(route: str, method: str) -> Path:
+    directory = Path(settings.profile_dir) if settings.profile_dir else Path("profiles")
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    return directory / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}_{method}_{slug}.folded"
+
+
+def dump_profile(sampler: StackSampler, route: str, method: str, duration: float) -> Path | None:
+    if not sampler.samples:
+        return None
+    path = _profile_path(route, method)
+    # Folded stacks ("frame;frame;frame count"), readable by flamegraph.pl and speedscope.
+    with open(path, "w", encoding="utf-8") as output:
+        for stack, count in sampler.samples.most_common():
+            output.write(f"{stack} {count}\n")
+    logger.warning("Slow request %s %s took %.0f ms; profile written to %s", method, route, duration * 1000, path)
+    return path
+
+
+def _should_profile() -> bool:
+    return settings.profile_slow_ms > 0 and random.random() < settings.profile_sample_rate
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(threads={threading.get_ident()})
+        token = _request_stats.set(stats)
+        sampler = None
+        if _should_profile():
+            sampler = StackSampler(lambda: set(stats.threads), settings.profile_interval_ms / 1000)
+            sampler.start()
+        status = 500
+        started = time.perf_counter()
+
+        async def _send(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            duration = time.perf_counter() - started
+            _request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            http_requests.inc(route, method, str(status))
+            http_latency.observe(duration, route, method, str(status))
+            http_db_queries.observe(stats.queries, route, method)
+            http_db_seconds.observe(stats.query_seconds, route, method)
+            if sampler is not None:
+                sampler.stop()
+                if duration * 1000 >= settings.profile_slow_ms:
+                    try:
+                        dump_profile(sampler, route, method, duration)
+                    except OSError:
+                        logger.exception("Could not write the profile for %s %s", method, route)
+
+
+def _pool_samples(pools: dict[str, object]) -> dict[str, list[tuple[dict[str, str], float]]]:
+    samples: dict[str, list[tuple[dict[str, str], float]]] = {"size": [], "checked_out": [], "overflow": [], "capacity": []}
+    for name, pool in pools.items():
+        if not hasattr(pool, "checkedout"):
+            continue
+        labels = {"engine": name}
+        samples["size"].append((labels, pool.size()))
+        samples["checked_out"].append((labels, pool.checkedout()))
+        samples["overflow"].append((labels, max(0, pool.overflow())))
+        # Each engine has its own overflow setting, so the pool's own limit is read back.
+        samples["capacity"].append((labels, pool.size() + max(0, getattr(pool, "_max_overflow", 0))))
+    return samples
+
+
+def render_metrics(pools: dict[str, object], job_depth: Callable[[], int], hash_in_flight: Callable[[], int]) -> str:
+    lines: list[str] = []
+    for metric in (http_requests, http_latency, http_db_queries, http_db_seconds, db_queries, db_query_latency, login_stages):
+        lines += metric.render()
+
+    pool_samples = _pool_samples(pools)
+    lines += _gauge("loginuv_db_pool_size", "Connections kept open by the pool.", pool_samples["size"])
+    lines += _gauge("loginuv_db_pool_checked_out", "Connections currently lent to sessions.", pool_samples["checked_out"])
+    lines += _gauge("loginuv_db_pool_overflow", "Connections opened above pool_size.", pool_samples["overflow"])
+    lines += _gauge("loginuv_db_pool_capacity", "pool_size plus max_overflow; checked_out at capacity means waits.", pool_samples["capacity"])
+
+    try:
+        depth = job_depth()
+    except Exception:
+        logger.exception("Could not read the job queue depth")
+        depth = None
+    if depth is not None:
+        lines += _gauge("loginuv_job_queue_depth", "Jobs waiting or running on the job queue.", [({}, depth)])
+    lines += _gauge("loginuv_password_hash_in_flight", "Argon2 tasks queued or running in the hashing pool.", [({}, hash_in_flight())])
+    return "\n".join(lines) + "\n"
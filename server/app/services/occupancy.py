@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Sequence
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, OccupancyCounter, Session as AuthSession
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("machines_total", "machines_occupied", "connected_users", "active_sessions")
+
+
+def _upsert(db: Session, rows: list[dict], *, increment: bool) -> None:
+    if not rows:
+        return
+    stmt = insert(OccupancyCounter).values(rows)
+    fields = [field for field in COUNTER_FIELDS if field in rows[0]]
+    if increment:
+        updates = {field: getattr(OccupancyCounter, field) + getattr(stmt.excluded, field) for field in fields}
+    else:
+        updates = {field: getattr(stmt.excluded, field) for field in fields}
+    updates["updated_at"] = stmt.excluded.updated_at
+    db.execute(stmt.on_conflict_do_update(index_elements=["scope", "scope_id"], set_=updates))
+
+
+def _apply_session_delta(
+    db: Session,
+    campus_id: int,
+    lab_id: int,
+    sign: int,
+    machine_changed: bool,
+    other_user_locations: Sequence[tuple[int, int]],
+) -> None:
+    now = datetime.now(timezone.utc)
+    scopes = (
+        ("global", 0, not other_user_locations),
+        ("campus", campus_id, all(location[0] != campus_id for location in other_user_locations)),
+        ("lab", lab_id, all(location[1] != lab_id for location in other_user_locations)),
+    )
+    _upsert(
+        db,
+        [
+            {
+                "scope": scope,
+                "scope_id": scope_id,
+                "machines_occupied": sign if machine_changed else 0,
+                "connected_users": sign if user_changed else 0,
+                "active_sessions": sign,
+                "updated_at": now,
+            }
+            for scope, scope_id, user_changed in scopes
+        ],
+        increment=True,
+    )
+
+
+def record_session_started(
+    db: Session,
+    campus_id: int,
+    lab_id: int,
+    machine_was_free: bool,
+    other_user_locations: Sequence[tuple[int, int]],
+) -> None:
+    _apply_session_delta(db, campus_id, lab_id, 1, machine_was_free, other_user_locations)
+
+
+def record_session_ended(
+    db: Session,
+    campus_id: int,
+    lab_id: int,
+    machine_freed: bool,
+    other_user_locations: Sequence[tuple[int, int]],
+) -> None:
+    _apply_session_delta(db, campus_id, lab_id, -1, machine_freed, other_user_locations)
+
+
+def read_counter(db: Session, campus: str | None = None) -> OccupancyCounter | None:
+    if not campus:
+        return db.get(OccupancyCounter, ("global", 0))
+    return db.scalar(
+        select(OccupancyCounter)
+        .join(Campus, and_(OccupancyCounter.scope == "campus", Campus.id == OccupancyCounter.scope_id))
+        .where(Campus.code == campus)
+    )
+
+
+def _expected_counters(db: Session) -> dict[tuple[str, int], dict[str, int]]:
+    expected: dict[tuple[str, int], dict[str, int]] = {("global", 0): dict.fromkeys(COUNTER_FIELDS, 0)}
+    for lab_id, campus_id in db.execute(select(Lab.id, Lab.campus_id)).all():
+        expected[("lab", lab_id)] = dict.fromkeys(COUNTER_FIELDS, 0)
+        expected.setdefault(("campus", campus_id), dict.fromkeys(COUNTER_FIELDS, 0))
+    for (campus_id,) in db.execute(select(Campus.id)).all():
+        expected.setdefault(("campus", campus_id), dict.fromkeys(COUNTER_FIELDS, 0))
+
+    def _scope_key(campus_id: int | None, lab_id: int | None, lab_grouped: int, campus_grouped: int) -> tuple[str, int]:
+        if campus_grouped:
+            return ("global", 0)
+        if lab_grouped:
+            return ("campus", campus_id)
+        return ("lab", lab_id)
+
+    grouping_sets = func.grouping_sets(
+        tuple_(Machine.campus_id, Machine.lab_id), tuple_(Machine.campus_id), tuple_()
+    )
+    machine_rows = db.execute(
+        select(
+            Machine.campus_id,
+            Machine.lab_id,
+            func.grouping(Machine.lab_id),
+            func.grouping(Machine.campus_id),
+            func.count(Machine.id),
+        )
+        .where(Machine.is_active.is_(True))
+        .group_by(grouping_sets)
+    ).all()
+    for campus_id, lab_id, lab_grouped, campus_grouped, total in machine_rows:
+        counters = expected.setdefault(_scope_key(campus_id, lab_id, lab_grouped, campus_grouped), dict.fromkeys(COUNTER_FIELDS, 0))
+        counters["machines_total"] = int(total)
+
+    session_rows = db.execute(
+        select(
+            Machine.campus_id,
+            Machine.lab_id,
+            func.grouping(Machine.lab_id),
+            func.grouping(Machine.campus_id),
+            func.count(func.distinct(AuthSession.machine_id)),
+            func.count(func.distinct(AuthSession.user_id)),
+            func.count(AuthSession.id),
+        )
+        .join(Machine, Machine.id == AuthSession.machine_id)
+        .where(and_(AuthSession.status == "active", Machine.is_active.is_(True)))
+        .group_by(grouping_sets)
+    ).all()
+    for campus_id, lab_id, lab_grouped, campus_grouped, occupied, users, sessions in session_rows:
+        counters = expected.setdefault(_scope_key(campus_id, lab_id, lab_grouped, campus_grouped), dict.fromkeys(COUNTER_FIELDS, 0))
+        counters["machines_occupied"] = int(occupied)
+        counters["connected_users"] = int(users)
+        counters["active_sessions"] = int(sessions)
+    return expected
+
+
+def reconcile_occupancy(db: Session) -> list[tuple[str, int]]:
+    # Blocks concurrent counter increments until commit, so the recount cannot lose a delta.
+    db.execute(text("LOCK TABLE occupancy_counters IN SHARE ROW EXCLUSIVE MODE"))
+    expected = _expected_counters(db)
+    stored = {
+        (row.scope, row.scope_id): {field: getattr(row, field) for field in COUNTER_FIELDS}
+        for row in db.scalars(select(OccupancyCounter)).all()
+    }
+
+    drifted = [key for key, values in expected.items() if stored.get(key) != values]
+    now = datetime.now(timezone.utc)
+    _upsert(
+        db,
+        [{"scope": scope, "scope_id": scope_id, **expected[(scope, scope_id)], "updated_at": now} for scope, scope_id in drifted],
+        increment=False,
+    )
+    return drifted
+
+
+def run_occupancy_reconcile() -> int:
+    db = SessionLocal()
+    try:
+        drifted = reconcile_occupancy(db)
+        db.commit()
+        if drifted:
+            logger.warning("Occupancy counters reconciled for %d scopes: %s", len(drifted), drifted[:20])
+        return len(drifted)
+    finally:
+        db.close()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^events_(y\d{4}m\d{2}|legacy)$")
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+LOWER_BOUND = re.compile(r"FROM \('([^']+)'\)")
+# Two-key advisory locks live in a separate key space from the per-user bigint locks taken at login.
+MAINTENANCE_LOCK = (7301, 1)
+
+
+@dataclass
+class EventPartition:
+    name: str
+    lower: datetime | None
+    upper: datetime | None
+    is_default: bool
+    estimated_rows: int
+    size_bytes: int
+
+
+def month_start(value: datetime, offset: int = 0) -> datetime:
+    month = value.year * 12 + value.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"events_y{start:%Y}m{start:%m}"
+
+
+def _bound(pattern: re.Pattern, expression: str) -> datetime | None:
+    match = pattern.search(expression)
+    return datetime.fromisoformat(match.group(1)) if match else None
+
+
+def _lock(db: Session) -> bool:
+    return bool(db.scalar(text("SELECT pg_try_advisory_xact_lock(:a, :b)"), {"a": MAINTENANCE_LOCK[0], "b": MAINTENANCE_LOCK[1]}))
+
+
+def list_event_partitions(db: Session) -> list[EventPartition]:
+    rows = db.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, pg_total_relation_size(c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'events'::regclass
+            """
+        )
+    ).all()
+    partitions = [
+        EventPartition(
+            name=name,
+            lower=_bound(LOWER_BOUND, expression),
+            upper=_bound(UPPER_BOUND, expression),
+            is_default=expression == "DEFAULT",
+            estimated_rows=max(int(tuples), 0),
+            size_bytes=int(size),
+        )
+        for name, expression, tuples, size in rows
+    ]
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    return sorted(partitions, key=lambda part: (part.is_default, part.lower or oldest))
+
+
+def _create_partition(db: Session, start: datetime, end: datetime) -> None:
+    name = partition_name(start)
+    bounds = {"start": start, "end": end}
+    stray = db.scalar(
+        text("SELECT EXISTS (SELECT 1 FROM events_default WHERE created_at >= :start AND created_at < :end)"), bounds
+    )
+    if not stray:
+        db.execute(
+            text(f"CREATE TABLE {name} PARTITION OF events FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+        )
+        return
+
+    # Rows that landed in the default partition must move out first, or the new bound would overlap them.
+    logger.warning("Moving events for %s out of events_default", name)
+    db.execute(text("LOCK TABLE events_default IN ACCESS EXCLUSIVE MODE"))
+    db.execute(text(f"CREATE TABLE {name} (LIKE events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(
+        text(f"INSERT INTO {name} SELECT * FROM events_default WHERE created_at >= :start AND created_at < :end"), bounds
+    )
+    db.execute(text("DELETE FROM events_default WHERE created_at >= :start AND created_at < :end"), bounds)
+    db.execute(
+        text(f"ALTER TABLE events ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+    )
+
+
+def ensure_event_partitions(db: Session, months_ahead: int | None = None, now: datetime | None = None) -> list[str]:
+    months_ahead = settings.events_partition_months_ahead if months_ahead is None else months_ahead
+    now = now or datetime.now(timezone.utc)
+    created = []
+    for offset in range(months_ahead + 1):
+        start, end = month_start(now, offset), month_start(now, offset + 1)
+        if not _lock(db):
+            db.rollback()
+            break
+        covered = any(
+            not part.is_default and (part.lower is None or part.lower <= start) and part.upper is not None and part.upper >= end
+            for part in list_event_partitions(db)
+        )
+        if covered:
+            db.rollback()
+            continue
+        _create_partition(db, start, end)
+        db.commit()
+        created.append(partition_name(start))
+    return created
+
+
+def expired_partitions(db: Session, retention_months: int | None = None, now: datetime | None = None) -> list[str]:
+    retention_months = settings.events_retention_months if retention_months is None else retention_months
+    if retention_months <= 0:
+        return []
+    cutoff = month_start(now or datetime.now(timezone.utc), -retention_months)
+    return [
+        part.name
+        for part in list_event_partitions(db)
+        if not part.is_default and part.upper is not None and part.upper <= cutoff and PARTITION_NAME.match(part.name)
+    ]
+
+
+def detach_expired_partitions(db: Session, retention_months: int | None = None, now: datetime | None = None) -> list[str]:
+    if not _lock(db):
+        db.rollback()
+        return []
+    expired = expired_partitions(db, retention_months, now)
+    for name in expired:
+        db.execute(text(f"ALTER TABLE events DETACH PARTITION {name}"))
+    db.commit()
+    return expired
+
+
+def detached_partitions(db: Session) -> list[str]:
+    names = db.scalars(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema()
+              AND c.relkind = 'r'
+              AND (c.relname LIKE 'events\\_y%' OR c.relname = 'events_legacy')
+              AND NOT c.relispartition
+            ORDER BY c.relname
+            """
+        )
+    ).all()
+    return [name for name in names if PARTITION_NAME.match(name)]
+
+
+def archive_partition(db: Session, name: str, archive_dir: str | Path) -> Path:
+    if not PARTITION_NAME.match(name):
+        raise ValueError(f"Not an events partition: {name}")
+    directory = Path(archive_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.csv.gz"
+    partial = path.with_suffix(".gz.partial")
+
+    raw = db.connection().connection.driver_connection
+    with gzip.open(partial, "wb") as output, raw.cursor() as cursor:
+        with cursor.copy(f"COPY {name} TO STDOUT (FORMAT csv, HEADER)") as copy:
+            for chunk in copy:
+                output.write(chunk)
+    with open(partial, "rb") as written:
+        os.fsync(written.fileno())
+    os.replace(partial, path)
+
+    # The table is only dropped once its archive is safely on disk.
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+    return path
+
+
+def apply_event_retention(
+    db: Session,
+    retention_months: int | None = None,
+    archive_dir: str | None = None,
+    now: datetime | None = None,
+) -> list[Path]:
+    archive_dir = archive_dir or settings.events_archive_dir
+    if not archive_dir:
+        logger.warning("EVENTS_ARCHIVE_DIR is not set; skipping events retention")
+        return []
+    detached = detach_expired_partitions(db, retention_months, now)
+    if detached:
+        logger.info("Detached expired events partitions: %s", ", ".join(detached))
+    archived = []
+    for name in detached_partitions(db):
+        archived.append(archive_partition(db, name, archive_dir))
+        logger.info("Archived %s to %s", name, archived[-1])
+    return archived
+
+
+def run_event_partition_maintenance() -> None:
+    db = SessionLocal()
+    try:
+        created = ensure_event_partitions(db)
+        if created:
+            logger.info("Created events partitions: %s", ", ".join(created))
+        apply_event_retention(db)
+    finally:
+        db.close()
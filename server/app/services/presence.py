@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import redis
+from sqlalchemy import BigInteger, DateTime, column, func, select, update, values
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import Machine
+from app.services.live import live_hub
+
+logger = logging.getLogger(__name__)
+
+_RECORD_SCRIPT = """
+local prev = redis.call('HMGET', KEYS[1], 'seen_at', 'session_id', 'event_at')
+local seen_at = tonumber(ARGV[2])
+local prev_seen = tonumber(prev[1])
+local keep = 0
+if prev_seen == nil or prev[2] ~= ARGV[3]
+    or seen_at - prev_seen >= tonumber(ARGV[5])
+    or seen_at - tonumber(prev[3] or '0') >= tonumber(ARGV[4]) then
+  keep = 1
+end
+if prev_seen == nil or seen_at > prev_seen then
+  redis.call('HSET', KEYS[1], 'seen_at', ARGV[2], 'session_id', ARGV[3])
+  redis.call('ZADD', KEYS[3], seen_at, ARGV[1])
+  local dirty = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+  if seen_at > dirty then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+  end
+end
+if keep == 1 then
+  redis.call('HSET', KEYS[1], 'event_at', ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return keep
+"""
+
+_DRAIN_SCRIPT = """
+local entries = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return entries
+"""
+
+_EXPIRE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if #ids > 0 then
+  redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
+_RESTORE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+  local current = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+  if tonumber(ARGV[i + 1]) > current then
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+  end
+end
+return 1
+"""
+
+
+@dataclass
+class _MachinePresence:
+    seen_at: float
+    session_id: int | None
+    event_at: float
+    lost: bool = False
+
+
+class MemoryPresenceStore:
+    def __init__(self, sample_seconds: int, stale_seconds: int) -> None:
+        self.sample_seconds = sample_seconds
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._machines: dict[int, _MachinePresence] = {}
+        self._dirty: dict[int, float] = {}
+
+    def record(self, machine_id: int, session_id: int | None, seen_at: datetime) -> bool:
+        ts = seen_at.timestamp()
+        with self._lock:
+            state = self._machines.get(machine_id)
+            keep = (
+                state is None
+                or state.session_id != session_id
+                or ts - state.seen_at >= self.stale_seconds
+                or ts - state.event_at >= self.sample_seconds
+            )
+            if state is None:
+                state = _MachinePresence(seen_at=ts, session_id=session_id, event_at=0.0)
+                self._machines[machine_id] = state
+            if ts >= state.seen_at:
+                state.seen_at = ts
+                state.session_id = session_id
+                state.lost = False
+                if ts > self._dirty.get(machine_id, 0.0):
+                    self._dirty[machine_id] = ts
+            if keep:
+                state.event_at = ts
+            return keep
+
+    def drain(self) -> dict[int, float]:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def expire_stale(self, cutoff: float) -> list[int]:
+        lost: list[int] = []
+        with self._lock:
+            for machine_id, state in self._machines.items():
+                if not state.lost and state.seen_at <= cutoff:
+                    state.lost = True
+                    lost.append(machine_id)
+        return lost
+
+    def restore(self, entries: dict[int, float]) -> None:
+        with self._lock:
+            for machine_id, ts in entries.items():
+                if ts > self._dirty.get(machine_id, 0.0):
+                    self._dirty[machine_id] = ts
+
+
+class RedisPresenceStore:
+    def __init__(self, url: str, sample_seconds: int, stale_seconds: int, prefix: str = "loginuv:presence") -> None:
+        self.sample_seconds = sample_seconds
+        self.stale_seconds = stale_seconds
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._record = self._client.register_script(_RECORD_SCRIPT)
+        self._drain = self._client.register_script(_DRAIN_SCRIPT)
+        self._expire = self._client.register_script(_EXPIRE_SCRIPT)
+        self._restore = self._client.register_script(_RESTORE_SCRIPT)
+
+    @property
+    def _dirty_key(self) -> str:
+        return f"{self.prefix}:dirty"
+
+    def record(self, machine_id: int, session_id: int | None, seen_at: datetime) -> bool:
+        keep = self._record(
+            keys=[f"{self.prefix}:machine:{machine_id}", self._dirty_key, f"{self.prefix}:seen"],
+            args=[
+                machine_id,
+                repr(seen_at.timestamp()),
+                "" if session_id is None else session_id,
+                self.sample_seconds,
+                self.stale_seconds,
+                max(self.sample_seconds, self.stale_seconds) * 4,
+            ],
+        )
+        return bool(keep)
+
+    def drain(self) -> dict[int, float]:
+        entries = self._drain(keys=[self._dirty_key])
+        return {int(entries[i]): float(entries[i + 1]) for i in range(0, len(entries), 2)}
+
+    def expire_stale(self, cutoff: float) -> list[int]:
+        return [int(machine_id) for machine_id in self._expire(keys=[f"{self.prefix}:seen"], args=[repr(cutoff)])]
+
+    def restore(self, entries: dict[int, float]) -> None:
+        if not entries:
+            return
+        args: list[str] = []
+        for machine_id, ts in entries.items():
+            args.extend([str(machine_id), repr(ts)])
+        self._restore(keys=[self._dirty_key], args=args)
+
+
+PresenceStore = MemoryPresenceStore | RedisPresenceStore
+
+
+def build_presence_store() -> PresenceStore:
+    if settings.redis_url:
+        return RedisPresenceStore(
+            settings.redis_url,
+            sample_seconds=settings.heartbeat_event_sample_seconds,
+            stale_seconds=settings.presence_stale_seconds,
+        )
+    return MemoryPresenceStore(
+        sample_seconds=settings.heartbeat_event_sample_seconds,
+        stale_seconds=settings.presence_stale_seconds,
+    )
+
+
+presence_store = build_presence_store()
+_store_down = threading.Event()
+
+
+def touch_machine(db: Session, machine_id: int, seen_at: datetime) -> None:
+    db.execute(
+        update(Machine)
+        .where(Machine.id == machine_id)
+        .values(last_seen_at=func.greatest(Machine.last_seen_at, seen_at))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def record_heartbeat(machine_id: int, session_id: int | None, seen_at: datetime) -> bool:
+    # While Redis is unreachable last_seen_at is written straight to PostgreSQL, so the reaper does not
+    # time out live sessions; heartbeat events are not sampled meanwhile.
+    try:
+        keep = presence_store.record(machine_id, session_id, seen_at)
+    except redis.RedisError:
+        if not _store_down.is_set():
+            _store_down.set()
+            logger.exception("Presence store unavailable, writing heartbeats to the database")
+        db = SessionLocal()
+        try:
+            touch_machine(db, machine_id, seen_at)
+        finally:
+            db.close()
+        return False
+    if _store_down.is_set():
+        _store_down.clear()
+        logger.warning("Presence store available again")
+    return keep
+
+
+def flush_presence(db: Session, store: PresenceStore | None = None, batch_size: int = 1000) -> int:
+    store = store or presence_store
+    entries = store.drain()
+    if not entries:
+        return 0
+
+    items = sorted(entries.items())
+    try:
+        for start in range(0, len(items), batch_size):
+            rows = [
+                (machine_id, datetime.fromtimestamp(ts, tz=timezone.utc))
+                for machine_id, ts in items[start : start + batch_size]
+            ]
+            seen = values(
+                column("id", BigInteger),
+                column("last_seen_at", DateTime(timezone=True)),
+                name="seen",
+            ).data(rows)
+            db.execute(
+                update(Machine)
+                .where(Machine.id == seen.c.id)
+                .values(last_seen_at=func.greatest(Machine.last_seen_at, seen.c.last_seen_at))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        store.restore(entries)
+        raise
+    return len(items)
+
+
+def report_lost_machines(db: Session, store: PresenceStore | None = None) -> int:
+    store = store or presence_store
+    lost_ids = store.expire_stale(time.time() - store.stale_seconds)
+    if not lost_ids:
+        return 0
+
+    rows = db.execute(
+        select(Machine.id, Machine.hostname, Machine.campus_id, Machine.lab_id, Machine.last_seen_at).where(
+            Machine.id.in_(lost_ids)
+        )
+    ).all()
+    for row in rows:
+        live_hub.publish(
+            {
+                "type": "alert_raised",
+                "alert": "HEARTBEAT_LOST",
+                "machine_id": row.id,
+                "hostname": row.hostname,
+                "campus_id": row.campus_id,
+                "lab_id": row.lab_id,
+                "last_seen_at": row.last_seen_at,
+            }
+        )
+    return len(rows)
+
+
+def run_presence_flush() -> int:
+    db = SessionLocal()
+    try:
+        return flush_presence(db)
+    finally:
+        db.close()
+
+
+def run_presence_watch() -> int:
+    db = SessionLocal()
+    try:
+        return report_lost_machines(db)
+    finally:
+        db.close()
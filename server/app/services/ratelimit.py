@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from app.core_config import settings
+
+_TAKE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(state[1] or ARGV[2])
+local at = tonumber(state[2] or ARGV[3])
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class MemoryRateLimiter:
+    def __init__(self, per_minute: float, burst: int, maxsize: int = 100000) -> None:
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, at = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisRateLimiter:
+    def __init__(self, url: str, per_minute: float, burst: int, prefix: str = "loginuv:ratelimit") -> None:
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        return float(self._take(keys=[f"{self.prefix}:{key}"], args=[self.rate, self.burst, repr(time.time())]))
+
+
+RateLimiter = MemoryRateLimiter | RedisRateLimiter
+
+
+def build_rate_limiter(name: str, per_minute: float, burst: int) -> RateLimiter:
+    if settings.redis_url:
+        return RedisRateLimiter(settings.redis_url, per_minute, burst, prefix=f"loginuv:ratelimit:{name}")
+    return MemoryRateLimiter(per_minute, burst)
+
+
+event_batch_limiter = build_rate_limiter("events-bulk", settings.events_bulk_rate_per_minute, settings.events_bulk_burst)
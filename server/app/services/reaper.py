@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import Event, Machine, Session as AuthSession
+from app.services.live import live_hub
+from app.services.occupancy import record_session_ended
+from app.services.presence import flush_presence
+from app.services.rollup import record_sessions_closed
+
+logger = logging.getLogger(__name__)
+
+# Rendered inline so prepared generic plans can still match the partial index on active sessions.
+ACTIVE = literal("active", literal_execute=True)
+
+
+@dataclass
+class ReapResult:
+    sessions: int = 0
+    machines_freed: int = 0
+    messages: list[dict] = field(default_factory=list)
+
+
+def stale_cutoff(now: datetime | None = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(seconds=settings.heartbeat_interval_seconds * settings.session_reaper_missed_heartbeats)
+
+
+def _close_stale_batch(db: Session, cutoff: datetime, batch_size: int, close_reason: str) -> list:
+    last_seen = func.coalesce(Machine.last_seen_at, AuthSession.start_at)
+    conditions = [AuthSession.status == ACTIVE, AuthSession.start_at < cutoff, last_seen < cutoff]
+    if settings.node_role == "central":
+        # Sessions replayed from a relay are closed by that relay, which receives their heartbeats.
+        conditions.append(AuthSession.auth_mode == "central")
+    # SKIP LOCKED leaves sessions that a concurrent logout is already closing to that logout.
+    stale = (
+        select(AuthSession.id, func.greatest(last_seen, AuthSession.start_at).label("end_at"))
+        .join(Machine, Machine.id == AuthSession.machine_id)
+        .where(and_(*conditions))
+        .order_by(AuthSession.id)
+        .limit(batch_size)
+        .with_for_update(of=AuthSession, skip_locked=True)
+        .cte("stale")
+    )
+    return db.execute(
+        update(AuthSession)
+        .where(and_(AuthSession.id == stale.c.id, AuthSession.status == "active"))
+        .values(status="closed", end_at=stale.c.end_at, close_reason=close_reason)
+        .returning(AuthSession.id, AuthSession.user_id, AuthSession.machine_id, AuthSession.end_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def _free_machines(db: Session, machine_ids: list[int]) -> list:
+    # Locking first makes the NOT EXISTS below run on a snapshot taken after any racing login committed.
+    db.execute(select(Machine.id).where(Machine.id.in_(machine_ids)).order_by(Machine.id).with_for_update())
+    other = aliased(AuthSession)
+    return db.execute(
+        update(Machine)
+        .where(
+            and_(
+                Machine.id.in_(machine_ids),
+                Machine.status == "occupied",
+                ~exists().where(and_(other.machine_id == Machine.id, other.status == ACTIVE)),
+            )
+        )
+        .values(status="free")
+        .returning(Machine.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+
+def reap_stale_sessions(db: Session, now: datetime | None = None, batch_size: int | None = None) -> ReapResult:
+    now = now or datetime.now(timezone.utc)
+    batch_size = batch_size or settings.session_reaper_batch_size
+    cutoff = stale_cutoff(now)
+    result = ReapResult()
+    while True:
+        closed = _close_stale_batch(db, cutoff, batch_size, settings.session_reaper_close_reason)
+        if not closed:
+            return result
+
+        machine_ids = sorted({row.machine_id for row in closed})
+        machines = {
+            row.id: row
+            for row in db.execute(
+                select(Machine.id, Machine.hostname, Machine.campus_id, Machine.lab_id, Machine.is_active).where(
+                    Machine.id.in_(machine_ids)
+                )
+            ).all()
+        }
+        freed = set(_free_machines(db, machine_ids))
+        record_sessions_closed(db, [row.id for row in closed])
+
+        # Counter deltas are applied one session at a time, so sessions of the same user reaped together
+        # still count as "other locations" until their own turn.
+        user_ids = sorted({row.user_id for row in closed})
+        locations: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        for user_id, campus_id, lab_id in db.execute(
+            select(AuthSession.user_id, Machine.campus_id, Machine.lab_id)
+            .join(Machine, Machine.id == AuthSession.machine_id)
+            .where(and_(AuthSession.user_id.in_(user_ids), AuthSession.status == "active"))
+        ).all():
+            locations[user_id].append((campus_id, lab_id))
+        pending: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        for row in closed:
+            machine = machines[row.machine_id]
+            pending[row.user_id].append((machine.campus_id, machine.lab_id))
+
+        counted_machines: set[int] = set()
+        events = []
+        for row in closed:
+            machine = machines[row.machine_id]
+            pending[row.user_id].remove((machine.campus_id, machine.lab_id))
+            machine_freed = row.machine_id in freed and row.machine_id not in counted_machines
+            counted_machines.add(row.machine_id)
+            if machine.is_active:
+                record_session_ended(
+                    db,
+                    campus_id=machine.campus_id,
+                    lab_id=machine.lab_id,
+                    machine_freed=machine_freed,
+                    other_user_locations=locations[row.user_id] + pending[row.user_id],
+                )
+            events.append(
+                {
+                    "campus_id": machine.campus_id,
+                    "lab_id": machine.lab_id,
+                    "user_id": row.user_id,
+                    "machine_id": machine.id,
+                    "session_id": row.id,
+                    "event_type": "SESSION_TIMEOUT",
+                    "payload": {"reason": settings.session_reaper_close_reason, "last_seen_at": row.end_at.isoformat()},
+                    "created_at": now,
+                }
+            )
+            result.messages.append(
+                {
+                    "type": "session_ended",
+                    "session_id": row.id,
+                    "machine_id": machine.id,
+                    "hostname": machine.hostname,
+                    "campus_id": machine.campus_id,
+                    "lab_id": machine.lab_id,
+                    "reason": settings.session_reaper_close_reason,
+                    "end_at": row.end_at,
+                }
+            )
+        db.execute(insert(Event), events)
+        for machine_id in sorted(freed):
+            machine = machines[machine_id]
+            result.messages.append(
+                {
+                    "type": "machine_status_changed",
+                    "machine_id": machine.id,
+                    "hostname": machine.hostname,
+                    "campus_id": machine.campus_id,
+                    "lab_id": machine.lab_id,
+                    "status": "free",
+                }
+            )
+        db.commit()
+        result.sessions += len(closed)
+        result.machines_freed += len(freed)
+
+
+def run_session_reaper() -> int:
+    db = SessionLocal()
+    try:
+        # Heartbeats still buffered in the presence store would otherwise make live machines look stale.
+        flush_presence(db)
+        result = reap_stale_sessions(db)
+    finally:
+        db.close()
+    for message in result.messages:
+        live_hub.publish(message)
+    if result.sessions:
+        logger.info("Closed %s stale sessions and freed %s machines", result.sessions, result.machines_freed)
+    return result.sessions
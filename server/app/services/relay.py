@@ -0,0 +1,596 @@
+from __future__ import annotations
+
+import hashlib
+import http.client
+import json
+import logging
+import ssl
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from urllib import parse
+
+from sqlalchemy import and_, case, delete, exists, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import (
+    Campus,
+    Event,
+    Lab,
+    Machine,
+    RelayOutbox,
+    RelaySession,
+    RelaySyncState,
+    Session as AuthSession,
+    User,
+)
+from app.schemas.dto import RelayReplayRequest
+from app.services.events import claim_event_batch
+from app.services.occupancy import record_session_ended, record_session_started
+from app.services.rollup import record_sessions_closed
+
+logger = logging.getLogger(__name__)
+
+CAMPUS_COLUMNS = ("id", "code", "name", "is_main")
+LAB_COLUMNS = ("id", "campus_id", "code", "name")
+# Status and last_seen_at are local operational state on the relay and are never overwritten by a sync.
+MACHINE_COLUMNS = ("id", "campus_id", "lab_id", "hostname", "asset_tag", "os_type", "glpi_external_id", "is_active", "updated_at")
+USER_COLUMNS = (
+    "id",
+    "code",
+    "full_name",
+    "email",
+    "role",
+    "academic_plan",
+    "semester",
+    "password_hash",
+    "allow_multi_session",
+    "max_sessions",
+    "is_active",
+    "source",
+    "glpi_external_id",
+    "updated_at",
+)
+SNAPSHOT_STATE = "snapshot"
+REPLAY_STATE = "replay"
+
+
+class RelayError(Exception):
+    pass
+
+
+@dataclass
+class RelayReplayResult:
+    sessions: int = 0
+    events: int = 0
+    skipped: int = 0
+    duplicate: bool = False
+
+
+@dataclass
+class RelaySyncResult:
+    full: bool
+    pages: int = 0
+    users: int = 0
+    machines: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class RelayDrainResult:
+    batches: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+
+def _columns(entity: type, names: tuple[str, ...]) -> list:
+    return [getattr(entity, name) for name in names]
+
+
+def load_snapshot(db: Session, since: datetime | None, after_id: int, limit: int) -> dict:
+    server_time = db.scalar(select(func.now()))
+    users_query = select(*_columns(User, USER_COLUMNS)).order_by(User.updated_at, User.id).limit(limit)
+    if since is not None:
+        users_query = users_query.where(tuple_(User.updated_at, User.id) > tuple_(since, after_id))
+    users = [dict(row._mapping) for row in db.execute(users_query).all()]
+    page = {"server_time": server_time, "users": users, "has_more": len(users) == limit}
+    if after_id == 0:
+        # Campuses and labs are a handful of rows without updated_at, so every sync carries them whole.
+        machines_query = select(*_columns(Machine, MACHINE_COLUMNS)).order_by(Machine.id)
+        if since is not None:
+            machines_query = machines_query.where(Machine.updated_at >= since)
+        page["campuses"] = [dict(row._mapping) for row in db.execute(select(*_columns(Campus, CAMPUS_COLUMNS))).all()]
+        page["labs"] = [dict(row._mapping) for row in db.execute(select(*_columns(Lab, LAB_COLUMNS))).all()]
+        page["machines"] = [dict(row._mapping) for row in db.execute(machines_query).all()]
+    return page
+
+
+def _refresh_machine_status(db: Session, machine_ids: set[int]) -> dict[int, str]:
+    if not machine_ids:
+        return {}
+    active = aliased(AuthSession)
+    return dict(
+        db.execute(
+            update(Machine)
+            .where(and_(Machine.id.in_(sorted(machine_ids)), Machine.status.in_(("free", "occupied"))))
+            .values(
+                status=case(
+                    (exists().where(and_(active.machine_id == Machine.id, active.status == "active")), "occupied"),
+                    else_="free",
+                )
+            )
+            .returning(Machine.id, Machine.status)
+            .execution_options(synchronize_session=False)
+        ).all()
+    )
+
+
+def _occupancy_snapshot(db: Session, machine_ids: set[int], user_ids: set[int]) -> tuple[dict, dict]:
+    # Locking the machines first, as the reaper does, keeps racing logins from changing them between before and after.
+    machines = {
+        row.id: row
+        for row in db.execute(
+            select(Machine.id, Machine.status, Machine.campus_id, Machine.lab_id, Machine.is_active)
+            .where(Machine.id.in_(sorted(machine_ids)))
+            .order_by(Machine.id)
+            .with_for_update()
+        ).all()
+    }
+    locations: dict[int, list[tuple[int, int, int]]] = defaultdict(list)
+    if user_ids:
+        for session_id, user_id, campus_id, lab_id in db.execute(
+            select(AuthSession.id, AuthSession.user_id, Machine.campus_id, Machine.lab_id)
+            .join(Machine, Machine.id == AuthSession.machine_id)
+            .where(and_(AuthSession.user_id.in_(sorted(user_ids)), AuthSession.status == "active"))
+        ).all():
+            locations[user_id].append((session_id, campus_id, lab_id))
+    return machines, locations
+
+
+def _apply_occupancy_deltas(
+    db: Session,
+    machines: dict,
+    locations: dict[int, list[tuple[int, int, int]]],
+    after: dict[int, str],
+    started: list[tuple[int, int, int]],
+    ended: list[tuple[int, int, int]],
+) -> None:
+    # Same per-session deltas as login, logout and the reaper; each (session, user, machine) is applied in turn.
+    counted: set[int] = set()
+    for session_id, user_id, machine_id in ended:
+        machine = machines[machine_id]
+        locations[user_id] = [location for location in locations[user_id] if location[0] != session_id]
+        freed = machine.status == "occupied" and after.get(machine_id) == "free" and machine_id not in counted
+        counted.add(machine_id)
+        if machine.is_active:
+            record_session_ended(
+                db,
+                campus_id=machine.campus_id,
+                lab_id=machine.lab_id,
+                machine_freed=freed,
+                other_user_locations=[location[1:] for location in locations[user_id]],
+            )
+    for session_id, user_id, machine_id in started:
+        machine = machines[machine_id]
+        was_free = machine.status == "free" and after.get(machine_id) == "occupied" and machine_id not in counted
+        counted.add(machine_id)
+        if machine.is_active:
+            record_session_started(
+                db,
+                campus_id=machine.campus_id,
+                lab_id=machine.lab_id,
+                machine_was_free=was_free,
+                other_user_locations=[location[1:] for location in locations[user_id]],
+            )
+        locations[user_id].append((session_id, machine.campus_id, machine.lab_id))
+
+
+EVENT_REFS = (("campus_id", Campus), ("lab_id", Lab), ("user_id", User), ("machine_id", Machine))
+
+
+def _known_event_refs(db: Session, events: list) -> dict[str, set[int]]:
+    known = {}
+    for field, entity in EVENT_REFS:
+        ids = {getattr(item, field) for item in events} - {None}
+        known[field] = set(db.scalars(select(entity.id).where(entity.id.in_(sorted(ids)))).all()) if ids else set()
+    return known
+
+
+def apply_replay(db: Session, payload: RelayReplayRequest) -> RelayReplayResult:
+    event_count = len(payload.sessions) + len(payload.events)
+    if not claim_event_batch(db, f"relay:{payload.relay_id}", payload.batch_id, event_count):
+        return RelayReplayResult(duplicate=True)
+
+    result = RelayReplayResult()
+    # Outbox rows are sent in capture order, so the last row of a session carries its newest state.
+    latest = {item.id: item for item in payload.sessions}
+    relay_ids = set(latest) | {item.session_id for item in payload.events if item.session_id is not None}
+    mapped: dict[int, int] = {}
+    if relay_ids:
+        mapped = dict(
+            db.execute(
+                select(RelaySession.relay_session_id, RelaySession.session_id).where(
+                    and_(RelaySession.relay_id == payload.relay_id, RelaySession.relay_session_id.in_(relay_ids))
+                )
+            ).all()
+        )
+
+    new = [item for item in latest.values() if item.id not in mapped]
+    known_users = set(db.scalars(select(User.id).where(User.id.in_({item.user_id for item in new}))).all()) if new else set()
+    known_machines = (
+        set(db.scalars(select(Machine.id).where(Machine.id.in_({item.machine_id for item in new}))).all()) if new else set()
+    )
+    valid = [item for item in new if item.user_id in known_users and item.machine_id in known_machines]
+    result.skipped += len(new) - len(valid)
+
+    ended = {mapped[item.id]: item for item in latest.values() if item.status != "active" and item.id in mapped}
+    ending = []
+    if ended:
+        ending = db.execute(
+            select(AuthSession.id, AuthSession.user_id, AuthSession.machine_id)
+            .where(and_(AuthSession.id.in_(list(ended)), AuthSession.status == "active"))
+            .order_by(AuthSession.id)
+            .with_for_update()
+        ).all()
+    starting = [item for item in valid if item.status == "active"]
+    machine_ids = {row.machine_id for row in ending} | {item.machine_id for item in starting}
+    user_ids = {row.user_id for row in ending} | {item.user_id for item in starting}
+    machines, locations = _occupancy_snapshot(db, machine_ids, user_ids) if machine_ids else ({}, defaultdict(list))
+
+    closed: list[int] = []
+    started: list[tuple[int, int, int]] = []
+    if valid:
+        session_ids = db.scalars(
+            insert(AuthSession).returning(AuthSession.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": item.user_id,
+                    "machine_id": item.machine_id,
+                    "auth_mode": "relay",
+                    "status": item.status,
+                    "start_at": item.start_at,
+                    "end_at": item.end_at,
+                    "close_reason": item.close_reason,
+                }
+                for item in valid
+            ],
+        ).all()
+        db.execute(
+            insert(RelaySession),
+            [
+                {"relay_id": payload.relay_id, "relay_session_id": item.id, "session_id": session_id}
+                for item, session_id in zip(valid, session_ids)
+            ],
+        )
+        for item, session_id in zip(valid, session_ids):
+            mapped[item.id] = session_id
+            if item.status == "active":
+                started.append((session_id, item.user_id, item.machine_id))
+            else:
+                closed.append(session_id)
+
+    if ending:
+        updates = [
+            {
+                "id": row.id,
+                "status": ended[row.id].status,
+                "end_at": ended[row.id].end_at,
+                "close_reason": ended[row.id].close_reason,
+            }
+            for row in ending
+        ]
+        db.execute(update(AuthSession), updates)
+        closed.extend(row.id for row in ending)
+        result.sessions += len(updates)
+    if closed:
+        record_sessions_closed(db, closed)
+    result.sessions += len(valid)
+
+    known_refs = _known_event_refs(db, payload.events)
+    events = []
+    for item in payload.events:
+        event = item.model_dump()
+        unknown = {}
+        for field, known in known_refs.items():
+            if event[field] is not None and event[field] not in known:
+                unknown[f"unknown_{field}"] = event[field]
+                event[field] = None
+        if unknown:
+            event["payload"] = {**item.payload, **unknown}
+        if item.session_id is not None:
+            if item.session_id in mapped:
+                event["session_id"] = mapped[item.session_id]
+            else:
+                event["payload"] = {**event["payload"], "unknown_session_id": item.session_id}
+                event["session_id"] = None
+        events.append(event)
+    if events:
+        db.execute(insert(Event), events)
+    result.events = len(events)
+
+    if machine_ids:
+        after = _refresh_machine_status(db, machine_ids)
+        _apply_occupancy_deltas(
+            db,
+            machines,
+            locations,
+            after,
+            started,
+            [(row.id, row.user_id, row.machine_id) for row in ending],
+        )
+    return result
+
+
+class CentralClient:
+    def __init__(self, base_url: str | None = None, token: str | None = None) -> None:
+        base_url = base_url or settings.relay_central_url
+        token = token or settings.relay_sync_token
+        if not base_url or not token:
+            raise RelayError("RELAY_CENTRAL_URL and RELAY_SYNC_TOKEN must be set on a relay node")
+        parts = parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or ""
+        self.port = parts.port
+        self.base_path = f"{parts.path.rstrip('/')}/api/v1/relay"
+        self.token = token
+        self._conn: http.client.HTTPConnection | None = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=settings.relay_timeout_seconds, context=ssl.create_default_context()
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=settings.relay_timeout_seconds)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method: str, endpoint: str, params: dict | None = None, body: dict | None = None) -> dict:
+        path = f"{self.base_path}/{endpoint}"
+        if params:
+            path = f"{path}?{parse.urlencode(params)}"
+        headers = {"X-Relay-Token": self.token, "Accept": "application/json"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            try:
+                if self._conn is None:
+                    self._conn = self._connect()
+                self._conn.request(method, path, body=data, headers=headers)
+                response = self._conn.getresponse()
+                content = response.read()
+                if response.will_close:
+                    self.close()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                # A kept-alive connection may have been dropped by central; retry once on a fresh one.
+                self.close()
+                if attempt == 1:
+                    raise RelayError(f"Central unreachable: {exc}") from exc
+            except (OSError, http.client.HTTPException) as exc:
+                self.close()
+                raise RelayError(f"Central unreachable: {exc}") from exc
+        if response.status >= 400:
+            raise RelayError(f"HTTP {response.status} {response.reason} for {endpoint}")
+        return json.loads(content) if content else {}
+
+
+def _parse_time(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _state(db: Session, name: str) -> RelaySyncState:
+    state = db.get(RelaySyncState, name)
+    if state is None:
+        state = RelaySyncState(name=name, summary={})
+        db.add(state)
+    return state
+
+
+def _upsert(db: Session, entity: type, rows: list[dict], columns: tuple[str, ...]) -> None:
+    if not rows:
+        return
+    stmt = pg_insert(entity)
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=["id"], set_={name: stmt.excluded[name] for name in columns if name != "id"}),
+        [{name: row.get(name) for name in columns} for row in rows],
+    )
+
+
+def apply_snapshot_page(db: Session, page: dict) -> datetime | None:
+    users = [{**row, "updated_at": _parse_time(row["updated_at"])} for row in page.get("users", [])]
+    machines = [{**row, "updated_at": _parse_time(row["updated_at"])} for row in page.get("machines", [])]
+    _upsert(db, Campus, page.get("campuses", []), CAMPUS_COLUMNS)
+    _upsert(db, Lab, page.get("labs", []), LAB_COLUMNS)
+    _upsert(db, Machine, machines, MACHINE_COLUMNS)
+    _upsert(db, User, users, USER_COLUMNS)
+    return max((row["updated_at"] for row in users + machines), default=None)
+
+
+def sync_snapshot(db: Session, client: CentralClient, now: datetime | None = None) -> RelaySyncResult:
+    now = now or datetime.now(timezone.utc)
+    state = _state(db, SNAPSHOT_STATE)
+    full = (
+        state.watermark is None
+        or state.full_synced_at is None
+        or (now - state.full_synced_at).total_seconds() >= settings.relay_full_sync_interval_seconds
+    )
+    # Rows are stamped before their transaction commits, so each pass re-reads a window behind the watermark.
+    since = None if full else state.watermark - timedelta(seconds=settings.relay_sync_overlap_seconds)
+    watermark = None if full else state.watermark
+    after_id = 0
+    server_time = None
+    result = RelaySyncResult(full=full)
+    started = time.perf_counter()
+    while True:
+        params = {"after_id": after_id, "limit": settings.relay_sync_page_size}
+        if since is not None:
+            params["since"] = since.isoformat()
+        page = client.request("GET", "snapshot", params=params)
+        server_time = server_time or _parse_time(page["server_time"])
+        latest = apply_snapshot_page(db, page)
+        if latest is not None and (watermark is None or latest > watermark):
+            watermark = latest
+        db.commit()
+        result.pages += 1
+        result.users += len(page.get("users", []))
+        result.machines += len(page.get("machines", []))
+        if not page.get("has_more"):
+            break
+        last = page["users"][-1]
+        since, after_id = _parse_time(last["updated_at"]), last["id"]
+
+    result.seconds = time.perf_counter() - started
+    state = _state(db, SNAPSHOT_STATE)
+    state.watermark = watermark or server_time
+    state.synced_at = server_time
+    if full:
+        state.full_synced_at = server_time
+    state.last_error = None
+    state.summary = {
+        "full": full,
+        "pages": result.pages,
+        "users": result.users,
+        "machines": result.machines,
+        "seconds": round(result.seconds, 3),
+    }
+    state.updated_at = now
+    db.commit()
+    return result
+
+
+def drain_outbox(
+    db: Session,
+    client: CentralClient,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+) -> RelayDrainResult:
+    batch_size = batch_size or settings.relay_replay_batch_size
+    result = RelayDrainResult()
+    started = time.perf_counter()
+    while max_batches is None or result.batches < max_batches:
+        rows = db.execute(
+            select(RelayOutbox.id, RelayOutbox.kind, RelayOutbox.payload)
+            .order_by(RelayOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.rollback()
+            break
+        ids = [row.id for row in rows]
+        body = {
+            "relay_id": settings.relay_node_id,
+            # Derived from the rows, so a batch resent after a lost response is recognised as a replay.
+            "batch_id": hashlib.sha256(",".join(map(str, ids)).encode()).hexdigest()[:32],
+            "sessions": [row.payload for row in rows if row.kind == "session"],
+            "events": [row.payload for row in rows if row.kind == "event"],
+        }
+        try:
+            client.request("POST", "replay", body=body)
+        except RelayError:
+            db.rollback()
+            raise
+        db.execute(delete(RelayOutbox).where(RelayOutbox.id.in_(ids)))
+        db.commit()
+        result.batches += 1
+        result.rows += len(rows)
+    result.seconds = time.perf_counter() - started
+
+    if result.rows:
+        state = _state(db, REPLAY_STATE)
+        now = datetime.now(timezone.utc)
+        state.synced_at = now
+        state.last_error = None
+        state.summary = {
+            "batches": result.batches,
+            "rows": result.rows,
+            "seconds": round(result.seconds, 3),
+            "rows_per_second": round(result.rows / result.seconds, 1) if result.seconds else None,
+        }
+        state.updated_at = now
+        db.commit()
+    return result
+
+
+def relay_status(db: Session, now: datetime | None = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    snapshot = db.get(RelaySyncState, SNAPSHOT_STATE)
+    replay = db.get(RelaySyncState, REPLAY_STATE)
+    pending, oldest = db.execute(select(func.count(RelayOutbox.id), func.min(RelayOutbox.created_at))).one()
+    return {
+        "node_role": settings.node_role,
+        "relay_id": settings.relay_node_id,
+        "snapshot": {
+            "synced_at": snapshot.synced_at if snapshot else None,
+            "full_synced_at": snapshot.full_synced_at if snapshot else None,
+            "lag_seconds": (now - snapshot.synced_at).total_seconds() if snapshot and snapshot.synced_at else None,
+            "last_error": snapshot.last_error if snapshot else None,
+            "last_run": snapshot.summary if snapshot else {},
+        },
+        "replay": {
+            "synced_at": replay.synced_at if replay else None,
+            "pending": int(pending or 0),
+            "oldest_pending_at": oldest,
+            "backlog_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+            "last_error": replay.last_error if replay else None,
+            "last_run": replay.summary if replay else {},
+        },
+    }
+
+
+def _record_error(name: str, exc: Exception) -> None:
+    db = SessionLocal()
+    try:
+        state = _state(db, name)
+        state.last_error = str(exc)
+        state.updated_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_relay_sync() -> None:
+    db = SessionLocal()
+    client = None
+    try:
+        client = CentralClient()
+        result = sync_snapshot(db, client)
+        if result.users or result.machines:
+            logger.info(
+                "Relay snapshot synced %s users and %s machines in %.2fs", result.users, result.machines, result.seconds
+            )
+    except RelayError as exc:
+        db.rollback()
+        logger.warning("Relay snapshot sync failed: %s", exc)
+        _record_error(SNAPSHOT_STATE, exc)
+    finally:
+        if client is not None:
+            client.close()
+        db.close()
+
+
+def run_relay_replay() -> None:
+    db = SessionLocal()
+    client = None
+    try:
+        client = CentralClient()
+        result = drain_outbox(db, client)
+        if result.rows:
+            logger.info("Relay replayed %s rows to central in %s batches (%.2fs)", result.rows, result.batches, result.seconds)
+    except RelayError as exc:
+        db.rollback()
+        logger.warning("Relay replay failed: %s", exc)
+        _record_error(REPLAY_STATE, exc)
+    finally:
+        if client is not None:
+            client.close()
+        db.close()
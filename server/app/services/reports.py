@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import ColumnElement, Row, Select, Subquery, and_, func, literal_column, select, text, true, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession, UsageHourly, User
+from app.services.timing import StageTimer
+
+
+@dataclass
+class AttendancePage:
+    rows: list[dict]
+    next_cursor: str | None
+
+
+def attendance_users_select(plan: str | None, semester: str | None, user_code: str | None) -> Select:
+    users = select(User.id, User.code, User.full_name).where(User.is_active.is_(True))
+    if plan:
+        users = users.where(User.academic_plan == plan)
+    if semester:
+        users = users.where(User.semester == semester)
+    if user_code:
+        users = users.where(User.code == user_code)
+    return users
+
+
+def attendance_report(
+    db: Session,
+    from_: datetime | None = None,
+    to: datetime | None = None,
+    plan: str | None = None,
+    semester: str | None = None,
+    user_code: str | None = None,
+    after: str | None = None,
+    limit: int = 500,
+) -> AttendancePage:
+    users = attendance_users_select(plan, semester, user_code)
+    if after:
+        users = users.where(User.code > after)
+    # Page the users first so the aggregation only touches sessions of the current page.
+    page = users.order_by(User.code).limit(limit + 1).subquery()
+
+    session_filter = [AuthSession.user_id == page.c.id]
+    if from_:
+        session_filter.append(AuthSession.start_at >= from_)
+    if to:
+        session_filter.append(AuthSession.start_at <= to)
+
+    minutes = func.extract("epoch", func.coalesce(AuthSession.end_at, func.now()) - AuthSession.start_at) / 60
+    rows = db.execute(
+        select(
+            page.c.code,
+            page.c.full_name,
+            func.count(AuthSession.id).label("sessions"),
+            func.coalesce(func.sum(minutes), 0).label("total_minutes"),
+            func.count(func.distinct(func.date(AuthSession.start_at))).label("distinct_days"),
+            func.min(AuthSession.start_at).label("first_seen"),
+            func.max(func.coalesce(AuthSession.end_at, AuthSession.start_at)).label("last_seen"),
+        )
+        .select_from(page)
+        .outerjoin(AuthSession, and_(*session_filter))
+        .group_by(page.c.id, page.c.code, page.c.full_name)
+        .order_by(page.c.code)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].code
+
+    return AttendancePage(
+        rows=[
+            {
+                "user_code": row.code,
+                "full_name": row.full_name,
+                "sessions": int(row.sessions),
+                "total_minutes": round(float(row.total_minutes), 1),
+                "distinct_days": int(row.distinct_days),
+                "first_seen": row.first_seen,
+                "last_seen": row.last_seen,
+            }
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@dataclass
+class UsageFilters:
+    from_: datetime | None = None
+    to: datetime | None = None
+    campus: str | None = None
+    lab: str | None = None
+    user_code: str | None = None
+    plan: str | None = None
+    semester: str | None = None
+
+
+def usage_sessions_select(filters: UsageFilters, *columns: ColumnElement) -> Select:
+    stmt = (
+        select(*columns)
+        .select_from(AuthSession)
+        .join(User, User.id == AuthSession.user_id)
+        .join(Machine, Machine.id == AuthSession.machine_id)
+        .join(Lab, Lab.id == Machine.lab_id)
+        .join(Campus, Campus.id == Machine.campus_id)
+    )
+    if filters.from_:
+        stmt = stmt.where(AuthSession.start_at >= filters.from_)
+    if filters.to:
+        stmt = stmt.where(AuthSession.start_at <= filters.to)
+    if filters.campus:
+        stmt = stmt.where(Campus.code == filters.campus)
+    if filters.lab:
+        stmt = stmt.where(Lab.code == filters.lab)
+    if filters.user_code:
+        stmt = stmt.where(User.code == filters.user_code)
+    if filters.plan:
+        stmt = stmt.where(User.academic_plan == filters.plan)
+    if filters.semester:
+        stmt = stmt.where(User.semester == filters.semester)
+    return stmt
+
+
+def _usage_sessions(filters: UsageFilters) -> Subquery:
+    return usage_sessions_select(
+        filters,
+        AuthSession.id,
+        AuthSession.user_id,
+        AuthSession.status,
+        AuthSession.start_at,
+        func.coalesce(AuthSession.end_at, func.now()).label("end_at"),
+        Lab.id.label("lab_id"),
+        Campus.code.label("campus_code"),
+        Lab.code.label("lab_code"),
+        User.academic_plan.label("plan"),
+        User.semester.label("semester"),
+    ).subquery("usage_sessions")
+
+
+def _hours(seconds: object) -> float:
+    return round(float(seconds or 0) / 3600, 2)
+
+
+def _collect_breakdowns(rows: Sequence[Row]) -> dict:
+    report = {
+        "total_sessions": 0,
+        "active_sessions": 0,
+        "total_hours": 0.0,
+        "distinct_users": None,
+        "by_lab": [],
+        "by_plan": [],
+        "by_semester": [],
+    }
+    for lab_grouped, plan_grouped, semester_grouped, campus_code, lab_code, plan, semester, count, active, total_seconds, users in rows:
+        metrics = {
+            "sessions": int(count or 0),
+            "hours": _hours(total_seconds),
+            "users": int(users) if users is not None else None,
+        }
+        if not lab_grouped:
+            report["by_lab"].append({"campus_code": campus_code, "lab_code": lab_code, **metrics})
+        elif not plan_grouped:
+            report["by_plan"].append({"plan": plan, **metrics})
+        elif not semester_grouped:
+            report["by_semester"].append({"semester": semester, **metrics})
+        else:
+            report["total_sessions"] = metrics["sessions"]
+            report["active_sessions"] = int(active or 0)
+            report["total_hours"] = metrics["hours"]
+            report["distinct_users"] = metrics["users"]
+    report["by_lab"].sort(key=lambda row: (row["campus_code"], row["lab_code"]))
+    report["by_plan"].sort(key=lambda row: row["plan"] or "")
+    report["by_semester"].sort(key=lambda row: row["semester"] or "")
+    return report
+
+
+def _hour_floor(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_ceil(value: datetime) -> datetime:
+    floor = _hour_floor(value)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+
+def _hour_profile(rows: Sequence[Row]) -> list[dict]:
+    by_hour = {hour: {"hour": hour, "sessions_started": 0, "hours": 0.0} for hour in range(24)}
+    for hour_value, started, total_seconds in rows:
+        by_hour[int(hour_value)] = {
+            "hour": int(hour_value),
+            "sessions_started": int(started or 0),
+            "hours": _hours(total_seconds),
+        }
+    return list(by_hour.values())
+
+
+def _query_ms(timer: StageTimer) -> dict:
+    return {**{name: round(duration, 1) for name, duration in timer.stages}, "total": round(timer.total_ms(), 1)}
+
+
+def usage_report(db: Session, filters: UsageFilters) -> dict:
+    timer = StageTimer()
+    sessions = _usage_sessions(filters)
+    seconds = func.sum(func.extract("epoch", sessions.c.end_at - sessions.c.start_at))
+
+    with timer.stage("breakdowns"):
+        rows = db.execute(
+            select(
+                func.grouping(sessions.c.lab_id),
+                func.grouping(sessions.c.plan),
+                func.grouping(sessions.c.semester),
+                sessions.c.campus_code,
+                sessions.c.lab_code,
+                sessions.c.plan,
+                sessions.c.semester,
+                func.count(sessions.c.id),
+                func.count(sessions.c.id).filter(sessions.c.status == "active"),
+                seconds,
+                func.count(func.distinct(sessions.c.user_id)),
+            ).group_by(
+                func.grouping_sets(
+                    tuple_(sessions.c.lab_id, sessions.c.campus_code, sessions.c.lab_code),
+                    tuple_(sessions.c.plan),
+                    tuple_(sessions.c.semester),
+                    tuple_(),
+                )
+            )
+        ).all()
+
+    report = _collect_breakdowns(rows)
+
+    with timer.stage("by_hour"):
+        slots = (
+            func.generate_series(func.date_trunc("hour", sessions.c.start_at), sessions.c.end_at, text("interval '1 hour'"))
+            .table_valued("slot")
+            .lateral("slots")
+        )
+        slot = slots.c.slot
+        overlap = func.least(sessions.c.end_at, slot + text("interval '1 hour'")) - func.greatest(sessions.c.start_at, slot)
+        hour = func.extract("hour", slot)
+        hour_rows = db.execute(
+            select(
+                hour,
+                func.count().filter(slot == func.date_trunc("hour", sessions.c.start_at)),
+                func.sum(func.extract("epoch", overlap)),
+            )
+            .select_from(sessions)
+            .join(slots, true())
+            .group_by(hour)
+        ).all()
+    report["by_hour"] = _hour_profile(hour_rows)
+
+    with timer.stage("peak"):
+        points = union_all(
+            select(sessions.c.start_at.label("at"), literal_column("1").label("delta")),
+            select(sessions.c.end_at.label("at"), literal_column("-1").label("delta")),
+        ).subquery("points")
+        running = select(
+            points.c.at,
+            func.sum(points.c.delta).over(order_by=(points.c.at, points.c.delta)).label("concurrent"),
+        ).subquery("running")
+        peak = db.execute(
+            select(running.c.at, running.c.concurrent).order_by(running.c.concurrent.desc(), running.c.at).limit(1)
+        ).first()
+
+    report["peak_concurrency"] = {
+        "sessions": int(peak.concurrent) if peak else 0,
+        "at": peak.at if peak else None,
+        "resolution": "exact",
+    }
+    return {**report, "source": "raw", "query_ms": _query_ms(timer)}
+
+
+def usage_report_from_rollup(db: Session, filters: UsageFilters) -> dict:
+    timer = StageTimer()
+    stmt = (
+        select(
+            UsageHourly.bucket,
+            UsageHourly.lab_id,
+            Campus.code.label("campus_code"),
+            Lab.code.label("lab_code"),
+            func.nullif(UsageHourly.plan, "").label("plan"),
+            func.nullif(UsageHourly.semester, "").label("semester"),
+            UsageHourly.session_minutes,
+            UsageHourly.logins,
+        )
+        .join(Lab, Lab.id == UsageHourly.lab_id)
+        .join(Campus, Campus.id == UsageHourly.campus_id)
+    )
+    # Only whole hours inside the range, so sessions started outside it are never counted.
+    rollup_from = _hour_ceil(filters.from_) if filters.from_ else None
+    rollup_to = _hour_floor(filters.to) if filters.to else None
+    if rollup_from:
+        stmt = stmt.where(UsageHourly.bucket >= rollup_from)
+    if rollup_to:
+        stmt = stmt.where(UsageHourly.bucket < rollup_to)
+    if filters.campus:
+        stmt = stmt.where(Campus.code == filters.campus)
+    if filters.lab:
+        stmt = stmt.where(Lab.code == filters.lab)
+    if filters.plan:
+        stmt = stmt.where(UsageHourly.plan == filters.plan)
+    if filters.semester:
+        stmt = stmt.where(UsageHourly.semester == filters.semester)
+    rollup = stmt.subquery("usage_rollup")
+    seconds = func.sum(rollup.c.session_minutes) * 60
+
+    with timer.stage("breakdowns"):
+        rows = db.execute(
+            select(
+                func.grouping(rollup.c.lab_id),
+                func.grouping(rollup.c.plan),
+                func.grouping(rollup.c.semester),
+                rollup.c.campus_code,
+                rollup.c.lab_code,
+                rollup.c.plan,
+                rollup.c.semester,
+                func.sum(rollup.c.logins),
+                literal_column("NULL"),
+                seconds,
+                literal_column("NULL"),
+            ).group_by(
+                func.grouping_sets(
+                    tuple_(rollup.c.lab_id, rollup.c.campus_code, rollup.c.lab_code),
+                    tuple_(rollup.c.plan),
+                    tuple_(rollup.c.semester),
+                    tuple_(),
+                )
+            )
+        ).all()
+    report = _collect_breakdowns(rows)
+
+    with timer.stage("active"):
+        # The rollup only holds closed sessions; open ones are counted from the raw table.
+        report["active_sessions"] = int(
+            db.scalar(usage_sessions_select(filters, func.count(AuthSession.id)).where(AuthSession.status == "active")) or 0
+        )
+
+    with timer.stage("by_hour"):
+        hour = func.extract("hour", rollup.c.bucket)
+        report["by_hour"] = _hour_profile(
+            db.execute(select(hour, func.sum(rollup.c.logins), seconds).group_by(hour)).all()
+        )
+
+    with timer.stage("peak"):
+        peak = db.execute(
+            select(rollup.c.bucket, func.sum(rollup.c.session_minutes).label("minutes"))
+            .group_by(rollup.c.bucket)
+            .order_by(func.sum(rollup.c.session_minutes).desc(), rollup.c.bucket)
+            .limit(1)
+        ).first()
+    report["peak_concurrency"] = {
+        "sessions": round(float(peak.minutes) / 60, 1) if peak else 0,
+        "at": peak.bucket if peak else None,
+        "resolution": "hour",
+    }
+    report["rollup_range"] = {"from": rollup_from, "to": rollup_to}
+    return {**report, "source": "rollup", "query_ms": _query_ms(timer)}
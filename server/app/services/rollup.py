@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import ColumnElement, Select, and_, delete, func, or_, select, text, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import Machine, Session as AuthSession, UsageHourly, User
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLUMNS = ("bucket", "lab_id", "machine_id", "plan", "semester", "campus_id", "session_minutes", "logins")
+
+
+@dataclass
+class RollupMismatch:
+    day: datetime
+    lab_id: int
+    rollup_minutes: float
+    raw_minutes: float
+    rollup_logins: int
+    raw_logins: int
+
+
+def _hour_floor(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_select(session_filter: Sequence[ColumnElement], window: tuple[datetime, datetime] | None = None) -> Select:
+    slots = (
+        func.generate_series(func.date_trunc("hour", AuthSession.start_at), AuthSession.end_at, text("interval '1 hour'"))
+        .table_valued("bucket")
+        .lateral("slots")
+    )
+    bucket = slots.c.bucket
+    is_start = bucket == func.date_trunc("hour", AuthSession.start_at)
+    overlap = func.least(AuthSession.end_at, bucket + text("interval '1 hour'")) - func.greatest(AuthSession.start_at, bucket)
+    plan = func.coalesce(User.academic_plan, "")
+    semester = func.coalesce(User.semester, "")
+
+    conditions = [
+        AuthSession.status != "active",
+        AuthSession.end_at.is_not(None),
+        # A session ending exactly on the hour would otherwise add an empty trailing bucket.
+        or_(bucket < AuthSession.end_at, is_start),
+        *session_filter,
+    ]
+    if window is not None:
+        conditions.extend([bucket >= window[0], bucket < window[1]])
+
+    return (
+        select(
+            bucket.label("bucket"),
+            Machine.lab_id,
+            AuthSession.machine_id,
+            plan.label("plan"),
+            semester.label("semester"),
+            Machine.campus_id,
+            (func.sum(func.extract("epoch", overlap)) / 60).label("session_minutes"),
+            func.count().filter(is_start).label("logins"),
+        )
+        .select_from(AuthSession)
+        .join(User, User.id == AuthSession.user_id)
+        .join(Machine, Machine.id == AuthSession.machine_id)
+        .join(slots, true())
+        .where(and_(*conditions))
+        .group_by(bucket, Machine.lab_id, AuthSession.machine_id, plan, semester, Machine.campus_id)
+    )
+
+
+def record_sessions_closed(db: Session, session_ids: Sequence[int]) -> None:
+    # Runs in the same transaction that closes the sessions, so each one is counted exactly once.
+    if not session_ids:
+        return
+    stmt = insert(UsageHourly).from_select(ROLLUP_COLUMNS, _rollup_select([AuthSession.id.in_(list(session_ids))]))
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["bucket", "lab_id", "machine_id", "plan", "semester"],
+            set_={
+                "session_minutes": UsageHourly.session_minutes + stmt.excluded.session_minutes,
+                "logins": UsageHourly.logins + stmt.excluded.logins,
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+def rebuild_usage_rollup(db: Session, start: datetime, end: datetime) -> int:
+    start, end = _hour_floor(start), _hour_floor(end)
+    # Blocks concurrent close increments so they cannot be lost or double counted by the rebuild.
+    db.execute(text("LOCK TABLE usage_hourly IN SHARE ROW EXCLUSIVE MODE"))
+    db.execute(delete(UsageHourly).where(and_(UsageHourly.bucket >= start, UsageHourly.bucket < end)))
+    result = db.execute(
+        insert(UsageHourly).from_select(
+            ROLLUP_COLUMNS,
+            _rollup_select([AuthSession.start_at < end, AuthSession.end_at >= start], window=(start, end)),
+        )
+    )
+    return int(result.rowcount or 0)
+
+
+def backfill_usage_rollup(db: Session, start: datetime, end: datetime, chunk: timedelta = timedelta(days=7)) -> int:
+    rows = 0
+    cursor = _hour_floor(start)
+    end = _hour_floor(end) + (timedelta(hours=1) if end != _hour_floor(end) else timedelta())
+    while cursor < end:
+        chunk_end = min(cursor + chunk, end)
+        rows += rebuild_usage_rollup(db, cursor, chunk_end)
+        db.commit()
+        logger.info("Rebuilt usage rollup %s - %s", cursor, chunk_end)
+        cursor = chunk_end
+    return rows
+
+
+def check_usage_rollup(db: Session, start: datetime, end: datetime, tolerance_minutes: float = 0.1) -> list[RollupMismatch]:
+    start, end = _hour_floor(start), _hour_floor(end)
+    raw = _rollup_select([AuthSession.start_at < end, AuthSession.end_at >= start], window=(start, end)).subquery()
+    raw_day = func.date_trunc("day", raw.c.bucket)
+    raw_totals = {
+        (day, lab_id): (float(minutes or 0), int(logins or 0))
+        for day, lab_id, minutes, logins in db.execute(
+            select(raw_day, raw.c.lab_id, func.sum(raw.c.session_minutes), func.sum(raw.c.logins)).group_by(
+                raw_day, raw.c.lab_id
+            )
+        ).all()
+    }
+    rollup_day = func.date_trunc("day", UsageHourly.bucket)
+    rollup_totals = {
+        (day, lab_id): (float(minutes or 0), int(logins or 0))
+        for day, lab_id, minutes, logins in db.execute(
+            select(rollup_day, UsageHourly.lab_id, func.sum(UsageHourly.session_minutes), func.sum(UsageHourly.logins))
+            .where(and_(UsageHourly.bucket >= start, UsageHourly.bucket < end))
+            .group_by(rollup_day, UsageHourly.lab_id)
+        ).all()
+    }
+
+    mismatches = []
+    for key in sorted(raw_totals.keys() | rollup_totals.keys()):
+        raw_minutes, raw_logins = raw_totals.get(key, (0.0, 0))
+        rollup_minutes, rollup_logins = rollup_totals.get(key, (0.0, 0))
+        if abs(raw_minutes - rollup_minutes) > tolerance_minutes or raw_logins != rollup_logins:
+            mismatches.append(
+                RollupMismatch(
+                    day=key[0],
+                    lab_id=key[1],
+                    rollup_minutes=round(rollup_minutes, 2),
+                    raw_minutes=round(raw_minutes, 2),
+                    rollup_logins=rollup_logins,
+                    raw_logins=raw_logins,
+                )
+            )
+    return mismatches
+
+
+def run_usage_rollup_check() -> int:
+    end = _hour_floor(datetime.now(timezone.utc))
+    start = end - timedelta(hours=settings.usage_rollup_check_hours)
+    db = SessionLocal()
+    try:
+        mismatches = check_usage_rollup(db, start, end)
+        db.rollback()
+        if mismatches:
+            logger.warning("Usage rollup drifted on %d day/lab pairs since %s; rebuilding", len(mismatches), start)
+            rebuild_usage_rollup(db, start, end)
+            db.commit()
+        return len(mismatches)
+    finally:
+        db.close()
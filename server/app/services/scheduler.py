@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    def __init__(
+        self,
+        name: str,
+        interval_seconds: float,
+        func: Callable[[], object],
+        run_on_start: bool = False,
+        run_on_stop: bool = False,
+    ) -> None:
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.run_on_start = run_on_start
+        self.run_on_stop = run_on_stop
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run_once(self) -> None:
+        try:
+            self.func()
+        except Exception:
+            logger.exception("Periodic task %s failed", self.name)
+
+    def _loop(self) -> None:
+        if self.run_on_start:
+            self._run_once()
+        while not self._stop.wait(self.interval_seconds):
+            self._run_once()
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"loginuv-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval_seconds + 5)
+        self._thread = None
+        if self.run_on_stop:
+            self._run_once()
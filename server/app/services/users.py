@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+from sqlalchemy import ColumnElement, Select, and_, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import User
+
+# Exactly the UserResponse fields; password_hash and the GLPI bookkeeping columns are never loaded.
+USER_LIST_COLUMNS = (
+    User.id,
+    User.code,
+    User.full_name,
+    User.email,
+    User.role,
+    User.academic_plan,
+    User.semester,
+    User.allow_multi_session,
+    User.max_sessions,
+    User.is_active,
+    User.source,
+    User.created_at,
+    User.updated_at,
+)
+
+
+@dataclass
+class UserFilters:
+    active: bool | None = None
+    role: str | None = None
+    plan: str | None = None
+    semester: str | None = None
+    source: str | None = None
+    q: str | None = None
+
+
+@dataclass
+class UserPage:
+    rows: list[dict]
+    next_cursor: str | None
+    etag: str
+
+
+def _prefix(column: ColumnElement, value: str) -> ColumnElement:
+    escaped = value.lower().replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    # Inlined so even a prepared generic plan sees a constant prefix and can use the text_pattern_ops index.
+    return func.lower(column).like(literal(f"{escaped}%", literal_execute=True), escape="!")
+
+
+def users_select(filters: UserFilters) -> Select:
+    conditions = []
+    if filters.active is not None:
+        conditions.append(User.is_active.is_(filters.active))
+    if filters.role:
+        conditions.append(User.role == filters.role)
+    if filters.plan:
+        conditions.append(User.academic_plan == filters.plan)
+    if filters.semester:
+        conditions.append(User.semester == filters.semester)
+    if filters.source:
+        conditions.append(User.source == filters.source)
+    if filters.q:
+        conditions.append(_prefix(User.code, filters.q) | _prefix(User.full_name, filters.q))
+    return select(*USER_LIST_COLUMNS).where(and_(*conditions))
+
+
+def list_users(db: Session, filters: UserFilters, after: int | None, limit: int) -> UserPage:
+    stmt = users_select(filters)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    rows = [dict(row._mapping) for row in db.execute(stmt.order_by(User.id).limit(limit + 1)).all()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1]["id"])
+
+    # Every write to a user bumps updated_at, so ids and timestamps identify the page without serializing it.
+    digest = hashlib.sha1(usedforsecurity=False)
+    for row in rows:
+        digest.update(f"{row['id']}:{row['updated_at'].isoformat()};".encode())
+    digest.update((next_cursor or "").encode())
+    return UserPage(rows=rows, next_cursor=next_cursor, etag=f'W/"{digest.hexdigest()}"')
@@ -0,0 +1,350 @@
+import argparse
+import contextlib
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from urllib import parse
+
+from sqlalchemy import and_, select
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession, User
+from scripts.bench_common import Api, Call, drive, local_api, percentiles, wait_ready
+from scripts.seed import SYNTHETIC_CAMPUS_PREFIX, SYNTHETIC_PASSWORD, SYNTHETIC_USER_PREFIX
+
+SCENARIOS = ("login", "heartbeat", "events", "dashboard", "reports")
+
+
+@dataclass
+class Targets:
+    labs: list[tuple[str, str]]
+    machines: list[tuple[str, str, str]]
+    users: list[str]
+    heartbeats: list[tuple[str, int]]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.wall: dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, label: str, latencies: list[float], errors: int) -> None:
+        with self._lock:
+            self.latencies[label].extend(latencies)
+            self.errors[label] += errors
+
+    def summary(self) -> dict[str, dict]:
+        rows = {}
+        for label, latencies in sorted(self.latencies.items()):
+            if not latencies:
+                continue
+            wall = self.wall[label.split(" ", 1)[0]] or 1.0
+            rows[label] = {
+                "requests": len(latencies),
+                "errors": self.errors[label],
+                "rps": round(len(latencies) / wall, 1),
+                **percentiles(latencies),
+            }
+        return rows
+
+
+def _targets(users: int) -> Targets:
+    db = SessionLocal()
+    try:
+        labs = [
+            tuple(row)
+            for row in db.execute(
+                select(Campus.code, Lab.code)
+                .join(Campus, Campus.id == Lab.campus_id)
+                .where(Campus.code.like(f"{SYNTHETIC_CAMPUS_PREFIX}%"))
+            ).all()
+        ]
+        machines = [
+            tuple(row)
+            for row in db.execute(
+                select(Campus.code, Lab.code, Machine.hostname)
+                .join(Lab, Lab.id == Machine.lab_id)
+                .join(Campus, Campus.id == Machine.campus_id)
+                .where(and_(Campus.code.like(f"{SYNTHETIC_CAMPUS_PREFIX}%"), Machine.is_active.is_(True)))
+                .order_by(Machine.id)
+            ).all()
+        ]
+        active = select(AuthSession.user_id).where(AuthSession.status == "active")
+        idle_users = db.scalars(
+            select(User.code)
+            .where(and_(User.code.like(f"{SYNTHETIC_USER_PREFIX}%"), User.is_active.is_(True), User.id.not_in(active)))
+            .order_by(User.id)
+            .limit(users)
+        ).all()
+        heartbeats = [
+            tuple(row)
+            for row in db.execute(
+                select(Machine.hostname, AuthSession.id)
+                .join(AuthSession, AuthSession.machine_id == Machine.id)
+                .where(and_(AuthSession.status == "active", Machine.hostname.like(f"{SYNTHETIC_CAMPUS_PREFIX}%")))
+            ).all()
+        ]
+    finally:
+        db.close()
+    return Targets(labs=labs, machines=machines, users=list(idle_users), heartbeats=heartbeats)
+
+
+def _drive(api: Api, recorder: Recorder, scenario: str, concurrency: int, seconds: float, next_call: Callable[[], Call]) -> None:
+    latencies, errors, wall = drive(api, concurrency, seconds, next_call)
+    for label, values in latencies.items():
+        recorder.add(label, values, errors[label])
+    recorder.wall[scenario] += wall
+
+
+def login_storm(api: Api, recorder: Recorder, targets: Targets, clients: int, rounds: int) -> int:
+    # Every round releases all clients at once, like a class starting, then logs them all out again.
+    slow = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+    users = targets.users
+
+    def _client(index: int) -> None:
+        nonlocal slow
+        conn = api.connect()
+        logins: list[float] = []
+        logouts: list[float] = []
+        errors = {"login": 0, "logout": 0}
+        for round_ in range(rounds):
+            campus_code, lab_code, hostname = targets.machines[(round_ * clients + index) % len(targets.machines)]
+            body = {
+                "user_code": users[(round_ * clients + index) % len(users)],
+                "password": SYNTHETIC_PASSWORD,
+                "hostname": hostname,
+                "campus_code": campus_code,
+                "lab_code": lab_code,
+            }
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                status, content = api.call(conn, "POST", "/auth/login", json.dumps(body).encode())
+            except (OSError, http.client.HTTPException):
+                status, content = 599, b""
+                conn.close()
+                conn = api.connect()
+            logins.append(time.perf_counter() - started)
+            if logins[-1] > settings.auth_timeout_seconds:
+                with lock:
+                    slow += 1
+            if status != 200:
+                errors["login"] += 1
+                continue
+            session_id = json.loads(content)["session"]["id"]
+            started = time.perf_counter()
+            try:
+                status, _ = api.call(conn, "POST", "/auth/logout", json.dumps({"session_id": session_id}).encode())
+            except (OSError, http.client.HTTPException):
+                status = 599
+                conn.close()
+                conn = api.connect()
+            logouts.append(time.perf_counter() - started)
+            errors["logout"] += status != 204
+        conn.close()
+        recorder.add("login POST /auth/login", logins, errors["login"])
+        recorder.add("login POST /auth/logout", logouts, errors["logout"])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.wall["login"] += time.perf_counter() - started
+    return slow
+
+
+def heartbeat_calls(targets: Targets) -> Callable[[], Call]:
+    def _next() -> Call:
+        hostname, session_id = random.choice(targets.heartbeats)
+        body = {
+            "hostname": hostname,
+            "session_id": session_id,
+            "os_type": "windows",
+            "uptime_seconds": 600,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        return "heartbeat POST /client/heartbeat", "POST", "/client/heartbeat", json.dumps(body).encode()
+
+    return _next
+
+
+def event_calls(targets: Targets, batch_events: int, replay_ratio: float) -> Callable[[], Call]:
+    sent: list[bytes] = []
+    lock = threading.Lock()
+
+    def _next() -> Call:
+        with lock:
+            if sent and random.random() < replay_ratio:
+                return "events POST /client/events/bulk (replay)", "POST", "/client/events/bulk", random.choice(sent)
+        hostname, session_id = random.choice(targets.heartbeats)
+        now = datetime.now(timezone.utc)
+        body = json.dumps(
+            {
+                "hostname": hostname,
+                "batch_id": uuid.uuid4().hex,
+                "events": [
+                    {
+                        "type": "APP_USAGE",
+                        "session_id": session_id,
+                        "timestamp": (now - timedelta(seconds=index)).isoformat(),
+                        "payload": {"app": "bench", "seq": index},
+                    }
+                    for index in range(batch_events)
+                ],
+            }
+        ).encode()
+        with lock:
+            sent.append(body)
+            del sent[:-1000]
+        return "events POST /client/events/bulk", "POST", "/client/events/bulk", body
+
+    return _next
+
+
+def dashboard_calls(targets: Targets) -> Callable[[], Call]:
+    def _next() -> Call:
+        if random.random() < 0.5:
+            campus_code, lab_code = random.choice(targets.labs)
+            return (
+                "dashboard GET /dashboard/labs/{campus_code}/{lab_code}",
+                "GET",
+                f"/dashboard/labs/{campus_code}/{lab_code}",
+                None,
+            )
+        return "dashboard GET /dashboard/summary", "GET", "/dashboard/summary", None
+
+    return _next
+
+
+def report_calls(targets: Targets, days: int) -> Callable[[], Call]:
+    def _next() -> Call:
+        to = datetime.now(timezone.utc)
+        window = {"from": (to - timedelta(days=days)).isoformat(), "to": to.isoformat()}
+        if random.random() < 0.5:
+            campus_code, _ = random.choice(targets.labs)
+            query = parse.urlencode({**window, "campus": campus_code})
+            return "reports GET /reports/usage", "GET", f"/reports/usage?{query}", None
+        query = parse.urlencode({**window, "limit": 500})
+        return "reports GET /reports/attendance", "GET", f"/reports/attendance?{query}", None
+
+    return _next
+
+
+def _print(results: dict[str, dict]) -> None:
+    print(f"{'endpoint':<62} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, row in results.items():
+        print(
+            f"{label:<62} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+        )
+
+
+def _regressions(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    found = []
+    for label, row in results.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        if before["p95_ms"] > 0 and row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{label}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+        if before["rps"] > 0 and row["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{label}: throughput {before['rps']} -> {row['rps']} req/s")
+        if row["errors"] > before["errors"]:
+            found.append(f"{label}: errors {before['errors']} -> {row['errors']}")
+    return found
+
+
+def run(args: argparse.Namespace) -> int:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    targets = _targets(users=args.login_clients * 2)
+    if not targets.machines or not targets.users or not targets.heartbeats:
+        raise SystemExit("No synthetic data found; seed it first (python -m scripts.seed --synthetic).")
+    print(
+        f"{len(targets.machines)} machines, {len(targets.users)} idle users, "
+        f"{len(targets.heartbeats)} active sessions; scenarios: {', '.join(scenarios)}"
+    )
+
+    if args.base_url:
+        server = contextlib.nullcontext(Api(args.base_url))
+    else:
+        # Rate limiting is disabled so the event scenario measures ingest, not the token bucket.
+        server = local_api(args.port, {"JOB_WORKERS_ENABLED": "false", "EVENTS_BULK_RATE_PER_MINUTE": "0"})
+    recorder = Recorder()
+    slow_logins = 0
+    with server as api:
+        wait_ready(api)
+        for scenario in scenarios:
+            print(f"running {scenario} ...")
+            if scenario == "login":
+                slow_logins = login_storm(api, recorder, targets, args.login_clients, args.login_rounds)
+            elif scenario == "heartbeat":
+                _drive(api, recorder, scenario, args.concurrency, args.seconds, heartbeat_calls(targets))
+            elif scenario == "events":
+                _drive(
+                    api, recorder, scenario, args.concurrency, args.seconds, event_calls(targets, args.batch_events, args.replay_ratio)
+                )
+            elif scenario == "dashboard":
+                _drive(api, recorder, scenario, args.concurrency, args.seconds, dashboard_calls(targets))
+            elif scenario == "reports":
+                _drive(api, recorder, scenario, args.report_concurrency, args.seconds, report_calls(targets, args.report_days))
+            else:
+                raise SystemExit(f"Unknown scenario {scenario}; choose from {', '.join(SCENARIOS)}")
+
+    results = recorder.summary()
+    _print(results)
+    if "login" in scenarios:
+        print(f"logins over AUTH_TIMEOUT_SECONDS ({settings.auth_timeout_seconds}s): {slow_logins}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "generated_at": datetime.now(timezone.utc).isoformat(),
+                    "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+                    "slow_logins": slow_logins,
+                    "endpoints": results,
+                },
+                handle,
+                indent=2,
+            )
+    failed = slow_logins > 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = _regressions(results, json.load(handle)["endpoints"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API against the synthetic university from scripts.seed.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--base-url", default="", help="benchmark a running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seconds", type=float, default=30, help="duration of each timed scenario")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--login-clients", type=int, default=160, help="simultaneous logins per class-start burst")
+    parser.add_argument("--login-rounds", type=int, default=5)
+    parser.add_argument("--batch-events", type=int, default=200)
+    parser.add_argument("--replay-ratio", type=float, default=0.2, help="share of event batches that are resends")
+    parser.add_argument("--report-concurrency", type=int, default=4)
+    parser.add_argument("--report-days", type=int, default=30)
+    parser.add_argument("--output", default="", help="write results as JSON, usable later as --baseline")
+    parser.add_argument("--baseline", default="", help="fail when p95, throughput or errors regress against this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    sys.exit(run(parser.parse_args()))
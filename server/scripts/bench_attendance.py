@@ -0,0 +1,138 @@
+import argparse
+import time
+
+from sqlalchemy import delete, select, text
+
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession, User
+from app.services.auth import hash_password
+from app.services.reports import attendance_report
+
+BENCH_CAMPUS = "BENCH-ATT"
+USER_PREFIX = "bench-att-"
+
+
+def _seed(db, users: int, sessions: int, machines: int) -> None:
+    campus = Campus(code=BENCH_CAMPUS, name="Attendance benchmark campus", is_main=False)
+    db.add(campus)
+    db.flush()
+    lab = Lab(campus_id=campus.id, code="BENCH-ATT-LAB", name="Attendance benchmark lab")
+    db.add(lab)
+    db.flush()
+
+    params = {"campus_id": campus.id, "lab_id": lab.id, "password_hash": hash_password("bench-password")}
+    db.execute(
+        text(
+            "INSERT INTO machines (campus_id, lab_id, hostname, os_type, status, updated_at) "
+            "SELECT :campus_id, :lab_id, 'BENCH-ATT-' || lpad(g::text, 5, '0'), 'debian', 'free', now() "
+            "FROM generate_series(1, :machines) AS g"
+        ),
+        {**params, "machines": machines},
+    )
+    db.execute(
+        text(
+            "INSERT INTO users (code, full_name, role, academic_plan, semester, password_hash, source, updated_at) "
+            "SELECT :prefix || lpad(g::text, 6, '0'), 'Bench user ' || g, 'student', "
+            "'PLAN-' || (g % 8), (1 + g % 10)::text, :password_hash, 'local', now() "
+            "FROM generate_series(1, :users) AS g"
+        ),
+        {**params, "prefix": USER_PREFIX, "users": users},
+    )
+    # Sessions spread over the last 120 days, 30-150 minutes long, a few still open.
+    db.execute(
+        text(
+            "WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE code LIKE :prefix || '%'), "
+            "m AS (SELECT array_agg(id ORDER BY id) AS ids FROM machines WHERE campus_id = :campus_id) "
+            "INSERT INTO sessions (user_id, machine_id, auth_mode, status, start_at, end_at, close_reason) "
+            "SELECT u.ids[1 + g % cardinality(u.ids)], m.ids[1 + g % cardinality(m.ids)], 'central', "
+            "CASE WHEN g % 5000 = 0 THEN 'active' ELSE 'closed' END, "
+            "now() - make_interval(mins => ((g::bigint * 7919) % 172800)::int), "
+            "CASE WHEN g % 5000 = 0 THEN NULL "
+            "ELSE now() - make_interval(mins => ((g::bigint * 7919) % 172800)::int) + make_interval(mins => 30 + g % 120) END, "
+            "CASE WHEN g % 5000 = 0 THEN NULL ELSE 'logout' END "
+            "FROM generate_series(1, :sessions) AS g, u, m"
+        ),
+        {**params, "prefix": USER_PREFIX, "sessions": sessions},
+    )
+    db.commit()
+    db.execute(text("ANALYZE users"))
+    db.execute(text("ANALYZE sessions"))
+    db.commit()
+
+
+def _cleanup(db) -> None:
+    campus_id = db.scalar(select(Campus.id).where(Campus.code == BENCH_CAMPUS))
+    if campus_id is None:
+        return
+    machine_ids = select(Machine.id).where(Machine.campus_id == campus_id)
+    db.execute(delete(AuthSession).where(AuthSession.machine_id.in_(machine_ids)))
+    db.execute(delete(Machine).where(Machine.campus_id == campus_id))
+    db.execute(delete(User).where(User.code.like(f"{USER_PREFIX}%")))
+    db.execute(delete(Lab).where(Lab.campus_id == campus_id))
+    db.execute(delete(Campus).where(Campus.id == campus_id))
+    db.commit()
+
+
+def _legacy_attendance(db, user_ids: list[int]) -> None:
+    for user_id in user_ids:
+        len(db.scalars(select(AuthSession).where(AuthSession.user_id == user_id)).all())
+
+
+def run(users: int, sessions: int, machines: int, page_size: int, legacy_sample: int, keep: bool) -> None:
+    db = SessionLocal()
+    try:
+        _cleanup(db)
+        started = time.perf_counter()
+        _seed(db, users, sessions, machines)
+        print(f"seeded {users} users / {sessions} sessions in {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        pages = rows = 0
+        cursor = None
+        first_page_ms = None
+        while True:
+            page_started = time.perf_counter()
+            page = attendance_report(db, after=cursor, limit=page_size)
+            if first_page_ms is None:
+                first_page_ms = (time.perf_counter() - page_started) * 1000
+            pages += 1
+            rows += len(page.rows)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        elapsed = time.perf_counter() - started
+        print(f"set-based: first page {first_page_ms:.1f} ms, {rows} rows in {pages} pages, {elapsed:.2f} s total")
+
+        if legacy_sample > 0:
+            sample = db.scalars(
+                select(User.id).where(User.code.like(f"{USER_PREFIX}%")).order_by(User.code).limit(legacy_sample)
+            ).all()
+            started = time.perf_counter()
+            _legacy_attendance(db, sample)
+            elapsed = time.perf_counter() - started
+            estimate = elapsed / max(1, len(sample)) * rows
+            print(f"per-user loop: {len(sample)} users in {elapsed:.2f} s (~{estimate:.1f} s for {rows} users)")
+    finally:
+        db.rollback()
+        if not keep:
+            _cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GET /reports/attendance over a synthetic dataset.")
+    parser.add_argument("--users", type=int, default=15000)
+    parser.add_argument("--sessions", type=int, default=2000000)
+    parser.add_argument("--machines", type=int, default=400)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--legacy-sample", type=int, default=300, help="users timed with the old per-user loop")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic benchmark rows after running")
+    args = parser.parse_args()
+    run(
+        users=args.users,
+        sessions=args.sessions,
+        machines=args.machines,
+        page_size=args.page_size,
+        legacy_sample=args.legacy_sample,
+        keep=args.keep,
+    )
@@ -0,0 +1,109 @@
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from urllib import parse
+
+# (label, method, path, body)
+Call = tuple[str, str, str, bytes | None]
+
+
+class Api:
+    def __init__(self, base_url: str) -> None:
+        parts = parse.urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.prefix = f"{parts.path.rstrip('/')}/api/v1"
+
+    def connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def call(self, conn: http.client.HTTPConnection, method: str, path: str, body: bytes | None) -> tuple[int, bytes]:
+        conn.request(method, f"{self.prefix}{path}", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, response.read()
+
+
+@contextmanager
+def local_api(port: int, env: dict[str, str]) -> Iterator[Api]:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    try:
+        yield Api(f"http://127.0.0.1:{port}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def wait_ready(api: Api, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = api.connect()
+            if api.call(conn, "GET", "/health", None)[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API at {api.host}:{api.port} did not become ready")
+
+
+def drive(
+    api: Api, concurrency: int, seconds: float, next_call: Callable[[], Call]
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    deadline = time.monotonic() + seconds
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def _worker() -> None:
+        conn = api.connect()
+        local: dict[str, list[float]] = defaultdict(list)
+        failures: dict[str, int] = defaultdict(int)
+        while time.monotonic() < deadline:
+            label, method, path, body = next_call()
+            started = time.perf_counter()
+            try:
+                status, _ = api.call(conn, method, path, body)
+                failed = status >= 400
+            except (OSError, http.client.HTTPException):
+                failed = True
+                conn.close()
+                conn = api.connect()
+            local[label].append(time.perf_counter() - started)
+            failures[label] += failed
+        conn.close()
+        with lock:
+            for label, values in local.items():
+                latencies[label].extend(values)
+                errors[label] += failures[label]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    if not latencies:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    latencies = sorted(latencies)
+    quantiles = latencies * 99
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 1),
+        "p95_ms": round(quantiles[94] * 1000, 1),
+        "p99_ms": round(quantiles[98] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
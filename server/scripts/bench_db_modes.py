@@ -0,0 +1,74 @@
+import argparse
+import json
+import random
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession
+from scripts.bench_common import Call, drive, local_api, percentiles, wait_ready
+
+
+def _targets(limit: int) -> tuple[list[tuple[str, str]], list[tuple[str, int]]]:
+    db = SessionLocal()
+    try:
+        labs = [tuple(row) for row in db.execute(select(Campus.code, Lab.code).join(Campus, Campus.id == Lab.campus_id)).all()]
+        heartbeats = [
+            tuple(row)
+            for row in db.execute(
+                select(Machine.hostname, AuthSession.id)
+                .join(AuthSession, AuthSession.machine_id == Machine.id)
+                .where(AuthSession.status == "active")
+                .limit(limit)
+            ).all()
+        ]
+    finally:
+        db.close()
+    return labs, heartbeats
+
+
+def _request(labs: list[tuple[str, str]], heartbeats: list[tuple[str, int]]) -> Call:
+    roll = random.random()
+    if heartbeats and roll < 0.6:
+        hostname, session_id = random.choice(heartbeats)
+        body = {
+            "hostname": hostname,
+            "session_id": session_id,
+            "os_type": "windows",
+            "uptime_seconds": 60,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        return "mixed", "POST", "/client/heartbeat", json.dumps(body).encode()
+    if labs and roll < 0.8:
+        campus_code, lab_code = random.choice(labs)
+        return "mixed", "GET", f"/dashboard/labs/{campus_code}/{lab_code}", None
+    return "mixed", "GET", "/dashboard/summary", None
+
+
+def run(modes: list[str], port: int, concurrency: int, seconds: float) -> None:
+    labs, heartbeats = _targets(limit=5000)
+    if not labs:
+        raise SystemExit("No labs found; seed the database first (python -m scripts.seed).")
+    print(f"{len(labs)} labs, {len(heartbeats)} active sessions for heartbeats, {concurrency} clients, {seconds:.0f}s per mode")
+    for mode in modes:
+        env = {"DB_ASYNC_ENABLED": "true" if mode == "async" else "false", "JOB_WORKERS_ENABLED": "false"}
+        with local_api(port, env) as api:
+            wait_ready(api)
+            latencies, errors, _ = drive(api, concurrency, seconds, lambda: _request(labs, heartbeats))
+        requests = sum(len(values) for values in latencies.values())
+        stats = percentiles([value for values in latencies.values() for value in values])
+        print(
+            f"{mode:<6} {requests / seconds:>8.0f} req/s  errors={sum(errors.values()):<6} "
+            f"p50={stats['p50_ms']:>7.1f} ms  p95={stats['p95_ms']:>7.1f} ms  p99={stats['p99_ms']:>7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare API throughput with the sync and the async database engine.")
+    parser.add_argument("--modes", default="sync,async", help="comma separated: sync, async")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+    run([mode.strip() for mode in args.modes.split(",") if mode.strip()], args.port, args.concurrency, args.seconds)
@@ -0,0 +1,30 @@
+import argparse
+import time
+
+from app.services.glpi import GlpiClient
+from scripts.fake_glpi import FakeGlpiServer
+
+
+def run(users: int, computers: int) -> None:
+    with FakeGlpiServer(users=users, computers=computers) as fake:
+        client = GlpiClient(base_url=fake.url, app_token="bench", user_token="bench")
+        try:
+            token = client.init_session()
+            for itemtype, expected in (("User", users), ("Computer", computers)):
+                started = time.perf_counter()
+                count = sum(1 for _ in client.iter_items(token, itemtype))
+                elapsed = time.perf_counter() - started
+                assert count == expected, f"{itemtype}: fetched {count} of {expected}"
+                print(f"{itemtype:<10} {count:>8} items {elapsed * 1000:>9.1f} ms {count / elapsed:>10.0f} items/s")
+            client.kill_session(token)
+        finally:
+            client.close()
+        print(f"HTTP requests served: {fake.requests}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark paginated GLPI fetching against the fake GLPI server.")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--computers", type=int, default=2000)
+    args = parser.parse_args()
+    run(users=args.users, computers=args.computers)
@@ -0,0 +1,129 @@
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from app.api.v1.routes import _lab_status
+from app.db import SessionLocal
+from app.models.entities import Campus, Lab, Machine, Session as AuthSession, User
+from app.services.auth import hash_password
+
+BENCH_CAMPUS = "BENCH"
+LAB_SIZES = (40, 200, 2000)
+
+
+def _seed(db, sizes: tuple[int, ...]) -> None:
+    campus = Campus(code=BENCH_CAMPUS, name="Benchmark campus", is_main=False)
+    db.add(campus)
+    db.flush()
+
+    password_hash = hash_password("bench-password")
+    now = datetime.now(timezone.utc)
+    for size in sizes:
+        lab = Lab(campus_id=campus.id, code=f"BENCH-{size}", name=f"Benchmark lab {size}")
+        db.add(lab)
+        db.flush()
+
+        machine_ids = db.scalars(
+            insert(Machine).returning(Machine.id),
+            [
+                {
+                    "campus_id": campus.id,
+                    "lab_id": lab.id,
+                    "hostname": f"BENCH-{size}-{index:05d}",
+                    "os_type": "debian",
+                    "status": "occupied" if index % 2 == 0 else "free",
+                    "updated_at": now,
+                }
+                for index in range(size)
+            ],
+        ).all()
+        user_ids = db.scalars(
+            insert(User).returning(User.id),
+            [
+                {
+                    "code": f"bench-{size}-{index:05d}",
+                    "full_name": f"Bench user {index}",
+                    "role": "student",
+                    "password_hash": password_hash,
+                    "source": "local",
+                    "updated_at": now,
+                }
+                for index in range(0, size, 2)
+            ],
+        ).all()
+        sessions = []
+        for index, machine_id in enumerate(machine_ids):
+            # Closed history rows make the active-session lookup realistic.
+            for day in range(1, 6):
+                sessions.append(
+                    {
+                        "user_id": user_ids[(index // 2) % len(user_ids)],
+                        "machine_id": machine_id,
+                        "auth_mode": "central",
+                        "status": "closed",
+                        "start_at": now - timedelta(days=day),
+                        "end_at": now - timedelta(days=day) + timedelta(hours=2),
+                        "close_reason": "logout",
+                    }
+                )
+            if index % 2 == 0:
+                sessions.append(
+                    {
+                        "user_id": user_ids[index // 2],
+                        "machine_id": machine_id,
+                        "auth_mode": "central",
+                        "status": "active",
+                        "start_at": now - timedelta(minutes=index % 90),
+                    }
+                )
+        db.execute(insert(AuthSession), sessions)
+    db.commit()
+
+
+def _cleanup(db) -> None:
+    campus_id = db.scalar(select(Campus.id).where(Campus.code == BENCH_CAMPUS))
+    if campus_id is None:
+        return
+    machine_ids = select(Machine.id).where(Machine.campus_id == campus_id)
+    db.execute(delete(AuthSession).where(AuthSession.machine_id.in_(machine_ids)))
+    db.execute(delete(Machine).where(Machine.campus_id == campus_id))
+    db.execute(delete(User).where(User.code.like("bench-%")))
+    db.execute(delete(Lab).where(Lab.campus_id == campus_id))
+    db.execute(delete(Campus).where(Campus.id == campus_id))
+    db.commit()
+
+
+def run(iterations: int, keep: bool) -> None:
+    db = SessionLocal()
+    try:
+        _cleanup(db)
+        _seed(db, LAB_SIZES)
+        print(f"{'machines':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for size in LAB_SIZES:
+            lab_code = f"BENCH-{size}"
+            _lab_status(db, BENCH_CAMPUS, lab_code)
+            timings: list[float] = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                result = _lab_status(db, BENCH_CAMPUS, lab_code)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.rollback()
+            assert len(result["machines"]) == size
+            timings.sort()
+            p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+            print(f"{size:>8} {statistics.median(timings):>10.2f} {p95:>10.2f} {timings[-1]:>10.2f}")
+    finally:
+        if not keep:
+            _cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GET /dashboard/labs/{campus}/{lab} at several lab sizes.")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic benchmark rows after running")
+    args = parser.parse_args()
+    run(iterations=args.iterations, keep=args.keep)
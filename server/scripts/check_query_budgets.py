@@ -0,0 +1,257 @@
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+from collections import Counter
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import and_, delete, select
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.main import app
+from app.models.entities import CsvImport, GlpiFingerprint, GlpiSyncRun, Machine, User
+from app.services.jobs import job_queue, run_job
+from app.services.metrics import capture_queries
+from scripts.fake_glpi import FakeGlpiServer
+from scripts.seed import (
+    SYNTHETIC_CAMPUS_PREFIX,
+    SYNTHETIC_PASSWORD,
+    SYNTHETIC_USER_PREFIX,
+    reset_synthetic,
+    seed_synthetic,
+)
+
+IMPORT_USER_PREFIX = f"{SYNTHETIC_USER_PREFIX}I"
+GLPI_USER_PREFIX = f"{SYNTHETIC_USER_PREFIX}G"
+# Machine hostnames share the synthetic campus prefix so reset_synthetic removes them too.
+GLPI_COMPUTER_PREFIX = f"{SYNTHETIC_CAMPUS_PREFIX}-GLPI-"
+
+# A check may return a callback that runs after the measurement, for assertions and cleanup.
+CheckRun = Callable[[TestClient, int], Callable[[], None] | None]
+
+
+@dataclass
+class Check:
+    name: str
+    budget: int
+    run: CheckRun
+
+
+def _get(path: str, **params: object) -> CheckRun:
+    def _run(client: TestClient, _: int) -> None:
+        response = client.get(path, params=params)
+        if response.status_code != 200:
+            raise SystemExit(f"GET {path} returned {response.status_code}: {response.text[:200]}")
+
+    return _run
+
+
+def _report_range() -> dict:
+    now = datetime.now(timezone.utc)
+    return {"from": (now - timedelta(days=30)).isoformat(), "to": now.isoformat()}
+
+
+@contextlib.contextmanager
+def _settings(**values: object) -> Iterator[None]:
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def _post_job(client: TestClient, path: str, **request: object) -> dict:
+    # The route's enqueue is recorded and the job then runs inline, so both sides of the request are measured.
+    queued: list[tuple[str, dict]] = []
+    job_queue.enqueue = lambda name, payload: queued.append((name, payload))
+    try:
+        response = client.post(path, **request)
+    finally:
+        del job_queue.enqueue
+    if response.status_code != 202 or len(queued) != 1:
+        raise SystemExit(f"POST {path} returned {response.status_code} and queued {len(queued)} jobs: {response.text[:200]}")
+    run_job(*queued[0])
+    return response.json()
+
+
+def _import_csv(client: TestClient, rows: int) -> Callable[[], None]:
+    lines = ["code,full_name,role,password,academic_plan,semester"]
+    for index in range(rows):
+        # Every tenth row fails validation, so the error path is measured too.
+        role = "nobody" if index % 10 == 9 else "student"
+        lines.append(f"{IMPORT_USER_PREFIX}{index:06d},Import user {index},{role},{SYNTHETIC_PASSWORD},SYS,{index % 10 + 1}")
+    # A single chunk: any statement beyond the per-chunk ones is per-row work.
+    with _settings(csv_import_chunk_size=rows, csv_import_archive_dir=""):
+        started = _post_job(
+            client, "/api/v1/users/import-csv", files={"file": ("query-budget.csv", "\n".join(lines).encode(), "text/csv")}
+        )
+
+    def _after() -> None:
+        db = SessionLocal()
+        try:
+            status = db.scalar(select(CsvImport.status).where(CsvImport.id == started["import_id"]))
+            db.execute(delete(CsvImport).where(CsvImport.id == started["import_id"]))
+            db.commit()
+        finally:
+            db.close()
+        if status != "partial":
+            raise SystemExit(f"CSV import job finished as {status}, expected partial")
+
+    return _after
+
+
+def _check_glpi_database() -> None:
+    # A full sync disables every GLPI record it does not see, so real GLPI data must not be present.
+    db = SessionLocal()
+    try:
+        real = db.scalar(
+            select(User.id)
+            .where(and_(User.glpi_external_id.is_not(None), User.code.not_like(f"{SYNTHETIC_USER_PREFIX}%")))
+            .limit(1)
+        ) or db.scalar(
+            select(Machine.id)
+            .where(and_(Machine.glpi_external_id.is_not(None), Machine.hostname.not_like(f"{SYNTHETIC_CAMPUS_PREFIX}%")))
+            .limit(1)
+        )
+    finally:
+        db.close()
+    if real is not None:
+        raise SystemExit("The glpi_sync check needs a database without GLPI-synced data; leave it out with --checks")
+
+
+def _glpi_sync(client: TestClient, rows: int) -> Callable[[], None]:
+    with FakeGlpiServer(
+        users=rows, computers=rows, user_prefix=GLPI_USER_PREFIX, computer_prefix=GLPI_COMPUTER_PREFIX
+    ) as fake:
+        # One page per item type, so page-level statements stay constant and only per-row work can grow.
+        with _settings(glpi_base_url=fake.url, glpi_app_token="budget", glpi_user_token="budget", glpi_page_size=rows):
+            started = _post_job(client, "/api/v1/integrations/glpi/sync", json={"mode": "manual", "full": True})
+
+    def _after() -> None:
+        external_ids = [str(index) for index in range(1, rows + 1)]
+        db = SessionLocal()
+        try:
+            run = db.get(GlpiSyncRun, started["run_id"])
+            status, summary = run.status, run.summary
+            db.execute(delete(GlpiSyncRun).where(GlpiSyncRun.id == run.id))
+            # The next size starts from an empty fingerprint table, as a first full sync would.
+            db.execute(delete(GlpiFingerprint).where(GlpiFingerprint.external_id.in_(external_ids)))
+            db.commit()
+        finally:
+            db.close()
+        if status != "success":
+            raise SystemExit(f"GLPI sync job finished as {status}: {summary}")
+
+    return _after
+
+
+CHECKS = (
+    Check("dashboard_summary", 4, _get("/api/v1/dashboard/summary")),
+    Check("dashboard_lab_status", 1, _get(f"/api/v1/dashboard/labs/{SYNTHETIC_CAMPUS_PREFIX}01/LAB-01")),
+    Check("users_list", 1, _get("/api/v1/users", limit=1000)),
+    Check("report_usage_raw", 3, _get("/api/v1/reports/usage", source="raw", **_report_range())),
+    Check("report_usage_rollup", 5, _get("/api/v1/reports/usage", source="rollup", **_report_range())),
+    Check("report_attendance", 2, _get("/api/v1/reports/attendance", limit=5000, **_report_range())),
+    Check("users_import_csv", 8, _import_csv),
+    Check("glpi_sync", 32, _glpi_sync),
+)
+
+
+def _shape(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()[:160]
+
+
+def measure(client: TestClient, checks: list[Check], job_rows: int) -> dict[str, list[str]]:
+    statements = {}
+    for check in checks:
+        with capture_queries() as captured:
+            after = check.run(client, job_rows)
+        statements[check.name] = list(captured)
+        if after is not None:
+            after()
+    return statements
+
+
+def run(args: argparse.Namespace) -> int:
+    names = set(args.checks.split(",")) if args.checks else None
+    checks = [check for check in CHECKS if names is None or check.name in names]
+    sizes = sorted({int(size) for size in args.sizes.split(",")})
+    if any(check.name == "glpi_sync" for check in checks):
+        _check_glpi_database()
+    client = TestClient(app)
+
+    results: dict[int, dict[str, list[str]]] = {}
+    for size in sizes:
+        print(f"Seeding size x{size}...", flush=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_synthetic(
+                campuses=1,
+                labs_per_campus=2,
+                machines_per_lab=args.machines_per_lab * size,
+                users=args.users * size,
+                days=args.days,
+                sessions_per_machine_day=2,
+                active_percent=60,
+                heartbeat_event_seconds=0,
+                reset=True,
+            )
+        results[size] = measure(client, checks, args.job_rows * size)
+
+    failures = []
+    print(f"\n{'check':<24} {'budget':>6} " + " ".join(f"{'x' + str(size):>6}" for size in sizes))
+    for check in checks:
+        counts = [len(results[size][check.name]) for size in sizes]
+        print(f"{check.name:<24} {check.budget:>6} " + " ".join(f"{count:>6}" for count in counts))
+        if max(counts) > check.budget:
+            failures.append((check.name, f"{max(counts)} queries, budget {check.budget}", results[sizes[-1]][check.name]))
+        elif counts[-1] > counts[0]:
+            failures.append((check.name, f"query count grows with data: {counts}", results[sizes[-1]][check.name]))
+
+    for name, reason, statements in failures:
+        print(f"\nFAIL {name}: {reason}")
+        for shape, count in Counter(_shape(statement) for statement in statements).most_common(3):
+            print(f"  {count:>5}x {shape}")
+
+    if args.output:
+        report = {
+            "sizes": sizes,
+            "checks": {
+                check.name: {"budget": check.budget, "counts": [len(results[size][check.name]) for size in sizes]}
+                for check in checks
+            },
+        }
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+
+    if not args.keep:
+        db = SessionLocal()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                reset_synthetic(db)
+        finally:
+            db.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fail when an endpoint exceeds its SQL query budget or its query count grows with the data."
+    )
+    parser.add_argument("--checks", default="", help=f"comma separated: {', '.join(check.name for check in CHECKS)}")
+    parser.add_argument("--sizes", default="1,2,4", help="data scale factors to compare")
+    parser.add_argument("--machines-per-lab", type=int, default=10)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--job-rows", type=int, default=20, help="CSV rows and GLPI users/computers at scale x1")
+    parser.add_argument("--output", default="", help="write the counts as JSON")
+    parser.add_argument("--keep", action="store_true", help="leave the largest synthetic dataset in place")
+    sys.exit(run(parser.parse_args()))
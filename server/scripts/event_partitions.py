@@ -0,0 +1,58 @@
+import argparse
+
+from app.core_config import settings
+from app.db import SessionLocal
+from app.services.partitions import apply_event_retention, ensure_event_partitions, expired_partitions, list_event_partitions
+
+
+def show() -> None:
+    db = SessionLocal()
+    try:
+        partitions = list_event_partitions(db)
+    finally:
+        db.close()
+    for part in partitions:
+        bounds = "DEFAULT" if part.is_default else f"{part.lower or 'MINVALUE'} .. {part.upper}"
+        print(f"{part.name:<20} {bounds:<54} ~{part.estimated_rows:>12} rows {part.size_bytes / 1048576:>10.1f} MiB")
+
+
+def ensure(months_ahead: int) -> None:
+    db = SessionLocal()
+    try:
+        created = ensure_event_partitions(db, months_ahead)
+    finally:
+        db.close()
+    print(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+
+
+def retention(months: int, archive_dir: str, dry_run: bool) -> None:
+    db = SessionLocal()
+    try:
+        if dry_run:
+            print("Would archive:", ", ".join(expired_partitions(db, months)) or "-")
+            return
+        archived = apply_event_retention(db, months, archive_dir)
+    finally:
+        db.close()
+    for path in archived:
+        print(f"Archived {path}")
+    print(f"{len(archived)} partitions archived and dropped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the monthly events partitions.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="show attached partitions with bounds and size")
+    ensure_parser = subparsers.add_parser("ensure", help="create partitions for this month and the next ones")
+    ensure_parser.add_argument("--months-ahead", type=int, default=settings.events_partition_months_ahead)
+    retention_parser = subparsers.add_parser("retention", help="detach, archive and drop expired partitions")
+    retention_parser.add_argument("--months", type=int, default=settings.events_retention_months)
+    retention_parser.add_argument("--archive-dir", default=settings.events_archive_dir)
+    retention_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.command == "list":
+        show()
+    elif args.command == "ensure":
+        ensure(args.months_ahead)
+    else:
+        retention(args.months, args.archive_dir, args.dry_run)
@@ -0,0 +1,142 @@
+import argparse
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+SESSION_TOKEN = "fake-session-token"
+
+
+def build_users(count: int, prefix: str = "u") -> list[dict]:
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": index,
+            "name": f"{prefix}{index:06d}",
+            "firstname": "Estudiante",
+            "realname": f"Prueba {index}",
+            "email": f"{prefix}{index:06d}@example.edu",
+            "is_active": 1,
+            "profile": "teacher" if index % 50 == 0 else "student",
+            "date_mod": (base + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def build_computers(count: int, prefix: str = "PC-") -> list[dict]:
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": index,
+            "name": f"{prefix}{index:04d}",
+            "serial": f"SN{index:08d}",
+            "operatingsystem": "Windows 11" if index % 3 else "Debian 12",
+            "date_mod": (base + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+class FakeGlpiServer:
+    """Minimal GLPI REST stand-in serving User/Computer listings with Range/Content-Range paging."""
+
+    def __init__(
+        self,
+        users: int = 1000,
+        computers: int = 200,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        user_prefix: str = "u",
+        computer_prefix: str = "PC-",
+    ) -> None:
+        self.items = {"User": build_users(users, user_prefix), "Computer": build_computers(computers, computer_prefix)}
+        self.requests = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args) -> None:  # noqa: A002
+                return
+
+            def _send(self, status: int, body: object, headers: dict[str, str] | None = None) -> None:
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self) -> None:  # noqa: N802
+                server.requests += 1
+                url = parse.urlsplit(self.path)
+                endpoint = url.path.rsplit("/", 1)[-1]
+                params = dict(parse.parse_qsl(url.query))
+                if endpoint == "initSession":
+                    self._send(200, {"session_token": SESSION_TOKEN})
+                    return
+                if self.headers.get("Session-Token") != SESSION_TOKEN:
+                    self._send(401, ["ERROR_SESSION_TOKEN_INVALID", ""])
+                    return
+                if endpoint == "killSession":
+                    self._send(200, {})
+                    return
+                if endpoint not in server.items:
+                    self._send(404, ["ERROR_ITEM_NOT_FOUND", ""])
+                    return
+
+                items = server.items[endpoint]
+                if params.get("sort") == "date_mod":
+                    items = sorted(items, key=lambda item: item["date_mod"], reverse=params.get("order") == "DESC")
+                start, _, end = params.get("range", "0-49").partition("-")
+                start, end = int(start), int(end)
+                total = len(items)
+                if start >= total and total > 0:
+                    self._send(400, ["ERROR_RANGE_EXCEED_TOTAL", ""])
+                    return
+                page = items[start : end + 1]
+                last = start + len(page) - 1
+                status = 206 if last < total - 1 else 200
+                self._send(status, page, {"Content-Range": f"{start}-{max(last, start)}/{total}"})
+
+        return Handler
+
+    def start(self) -> "FakeGlpiServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-glpi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeGlpiServer":
+        return self.start()
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake GLPI REST API for local syncs and benchmarks.")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--computers", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    fake = FakeGlpiServer(users=args.users, computers=args.computers, port=args.port)
+    print(f"Fake GLPI listening on {fake.url} (app/user tokens: any non-empty value)")
+    fake._httpd.serve_forever()  # noqa: SLF001
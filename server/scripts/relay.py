@@ -0,0 +1,56 @@
+import argparse
+import json
+
+from app.db import SessionLocal
+from app.services.relay import CentralClient, drain_outbox, relay_status, sync_snapshot
+
+
+def status() -> None:
+    db = SessionLocal()
+    try:
+        print(json.dumps(relay_status(db), indent=2, default=str))
+    finally:
+        db.close()
+
+
+def sync() -> None:
+    db = SessionLocal()
+    client = CentralClient()
+    try:
+        result = sync_snapshot(db, client)
+    finally:
+        client.close()
+        db.close()
+    mode = "full" if result.full else "incremental"
+    print(
+        f"{mode} sync: {result.pages} pages, {result.users} users, {result.machines} machines in {result.seconds:.2f}s"
+    )
+
+
+def replay(batch_size: int | None, max_batches: int | None) -> None:
+    db = SessionLocal()
+    client = CentralClient()
+    try:
+        result = drain_outbox(db, client, batch_size, max_batches)
+    finally:
+        client.close()
+        db.close()
+    rate = result.rows / result.seconds if result.seconds else 0.0
+    print(f"Replayed {result.rows} rows in {result.batches} batches, {result.seconds:.2f}s ({rate:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and drive the relay snapshot sync and outbox replay.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="show snapshot lag and outbox backlog")
+    subparsers.add_parser("sync", help="pull the credential snapshot from central once")
+    replay_parser = subparsers.add_parser("replay", help="forward queued sessions and events to central")
+    replay_parser.add_argument("--batch-size", type=int, default=None)
+    replay_parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+    if args.command == "status":
+        status()
+    elif args.command == "sync":
+        sync()
+    else:
+        replay(args.batch_size, args.max_batches)
@@ -1,8 +1,20 @@
-﻿from sqlalchemy import select
+﻿import argparse
+import time
+from datetime import datetime, timedelta, timezone
 
+from sqlalchemy import select, text
+
+from app.core_config import settings
 from app.db import SessionLocal
 from app.models.entities import Campus, Lab, Machine, User
 from app.services.auth import hash_password
+from app.services.occupancy import reconcile_occupancy
+from app.services.partitions import ensure_event_partitions
+from app.services.rollup import backfill_usage_rollup
+
+SYNTHETIC_CAMPUS_PREFIX = "SYN-C"
+SYNTHETIC_USER_PREFIX = "SYN-U"
+SYNTHETIC_PASSWORD = "Bench123*"
 
 
 def seed() -> None:
@@ -53,5 +65,197 @@ def seed() -> None:
         db.close()
 
 
+def _step(db, label: str, sql: str, params: dict | None = None) -> int:
+    started = time.perf_counter()
+    result = db.execute(text(sql), params or {})
+    db.commit()
+    rows = int(result.rowcount or 0)
+    print(f"{label:<24} {rows:>10} rows {time.perf_counter() - started:>8.1f}s")
+    return rows
+
+
+def reset_synthetic(db) -> None:
+    params = {"campus": f"{SYNTHETIC_CAMPUS_PREFIX}%", "user": f"{SYNTHETIC_USER_PREFIX}%"}
+    machines = "SELECT id FROM machines WHERE hostname LIKE :campus"
+    users = "SELECT id FROM users WHERE code LIKE :user"
+    _step(db, "delete events", f"DELETE FROM events WHERE machine_id IN ({machines}) OR user_id IN ({users})", params)
+    _step(db, "delete usage_hourly", f"DELETE FROM usage_hourly WHERE machine_id IN ({machines})", params)
+    _step(db, "delete sessions", f"DELETE FROM sessions WHERE machine_id IN ({machines}) OR user_id IN ({users})", params)
+    _step(db, "delete machines", "DELETE FROM machines WHERE hostname LIKE :campus", params)
+    _step(db, "delete labs", "DELETE FROM labs WHERE campus_id IN (SELECT id FROM campuses WHERE code LIKE :campus)", params)
+    _step(db, "delete campuses", "DELETE FROM campuses WHERE code LIKE :campus", params)
+    _step(db, "delete users", "DELETE FROM users WHERE code LIKE :user", params)
+    reconcile_occupancy(db)
+    db.commit()
+
+
+def seed_synthetic(
+    campuses: int,
+    labs_per_campus: int,
+    machines_per_lab: int,
+    users: int,
+    days: int,
+    sessions_per_machine_day: int,
+    active_percent: int,
+    heartbeat_event_seconds: int,
+    reset: bool,
+) -> None:
+    db = SessionLocal()
+    try:
+        if reset:
+            reset_synthetic(db)
+        elif db.scalar(select(Campus.id).where(Campus.code.like(f"{SYNTHETIC_CAMPUS_PREFIX}%")).limit(1)) is not None:
+            raise SystemExit("Synthetic data already present; pass --reset to rebuild it.")
+
+        params = {
+            "campus": f"{SYNTHETIC_CAMPUS_PREFIX}%",
+            "campus_prefix": SYNTHETIC_CAMPUS_PREFIX,
+            "user": f"{SYNTHETIC_USER_PREFIX}%",
+            "user_prefix": SYNTHETIC_USER_PREFIX,
+        }
+        ensure_event_partitions(db)
+        _step(
+            db,
+            "campuses",
+            "INSERT INTO campuses (code, name, is_main) "
+            "SELECT :campus_prefix || lpad(c::text, 2, '0'), 'Synthetic campus ' || c, false "
+            "FROM generate_series(1, :campuses) AS c",
+            {**params, "campuses": campuses},
+        )
+        _step(
+            db,
+            "labs",
+            "INSERT INTO labs (campus_id, code, name) "
+            "SELECT ca.id, 'LAB-' || lpad(l::text, 2, '0'), 'Synthetic lab ' || l "
+            "FROM campuses ca, generate_series(1, :labs) AS l WHERE ca.code LIKE :campus",
+            {**params, "labs": labs_per_campus},
+        )
+        _step(
+            db,
+            "machines",
+            "INSERT INTO machines (campus_id, lab_id, hostname, os_type, status, updated_at) "
+            "SELECT la.campus_id, la.id, ca.code || '-' || la.code || '-PC' || lpad(m::text, 3, '0'), "
+            "CASE WHEN m % 4 = 0 THEN 'debian' ELSE 'windows' END, 'free', now() "
+            "FROM labs la JOIN campuses ca ON ca.id = la.campus_id, generate_series(1, :machines) AS m "
+            "WHERE ca.code LIKE :campus",
+            {**params, "machines": machines_per_lab},
+        )
+        # One shared hash keeps seeding fast; every synthetic user logs in with SYNTHETIC_PASSWORD.
+        _step(
+            db,
+            "users",
+            "INSERT INTO users (code, full_name, email, role, academic_plan, semester, password_hash, "
+            "allow_multi_session, max_sessions, source, updated_at) "
+            "SELECT :user_prefix || lpad(g::text, 6, '0'), 'Synthetic user ' || g, 'syn' || g || '@example.edu', "
+            "CASE WHEN g % 20 = 0 THEN 'teacher' ELSE 'student' END, 'PLAN-' || lpad((g % 12)::text, 2, '0'), "
+            "(1 + g % 10)::text, :password_hash, g % 20 = 0, CASE WHEN g % 20 = 0 THEN 3 ELSE 1 END, 'local', now() "
+            "FROM generate_series(1, :users) AS g",
+            {**params, "users": users, "password_hash": hash_password(SYNTHETIC_PASSWORD)},
+        )
+        # Closed sessions in class slots from 07:00, every day of the window, 30-150 minutes long.
+        _step(
+            db,
+            "sessions (history)",
+            "WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE code LIKE :user), "
+            "m AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM machines WHERE hostname LIKE :campus), "
+            "slots AS ("
+            "  SELECT m.id AS machine_id, m.n, d, s, "
+            "  date_trunc('day', now()) - make_interval(days => d) "
+            "    + make_interval(hours => 7 + s * 3, mins => ((m.n * 37 + d * 11 + s * 7) % 50)::int) AS start_at, "
+            "  30 + ((m.n * 13 + d * 7 + s * 29) % 120)::int AS minutes "
+            "  FROM m, generate_series(1, :days) AS d, generate_series(0, :slots - 1) AS s"
+            ") "
+            "INSERT INTO sessions (user_id, machine_id, auth_mode, status, start_at, end_at, close_reason) "
+            "SELECT u.ids[1 + ((slots.n * 7919 + d * 104729 + s * 31) % cardinality(u.ids))], machine_id, 'central', "
+            "'closed', start_at, start_at + make_interval(mins => minutes), "
+            "CASE WHEN (n + d + s) % 25 = 0 THEN 'timeout' ELSE 'logout' END "
+            "FROM slots, u",
+            {**params, "days": days, "slots": sessions_per_machine_day},
+        )
+        # Students on a share of the machines are logged in right now, for heartbeat and dashboard load.
+        _step(
+            db,
+            "sessions (active)",
+            "WITH m AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM machines WHERE hostname LIKE :campus), "
+            "u AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM users WHERE code LIKE :user AND role = 'student') "
+            "INSERT INTO sessions (user_id, machine_id, auth_mode, status, start_at) "
+            "SELECT u.id, m.id, 'central', 'active', now() - make_interval(mins => (m.n * 17 % 90)::int) "
+            "FROM m JOIN u ON u.n = m.n WHERE m.n % 100 < :active_percent",
+            {**params, "active_percent": active_percent},
+        )
+        _step(
+            db,
+            "machines occupied",
+            "UPDATE machines SET status = 'occupied', last_seen_at = now() "
+            "WHERE id IN (SELECT machine_id FROM sessions WHERE status = 'active') AND hostname LIKE :campus",
+            params,
+        )
+        heartbeats = (
+            "UNION ALL SELECT 'HEARTBEAT', jsonb_build_object('os_type', ma.os_type, "
+            "'uptime_seconds', extract(epoch FROM h - s.start_at)::int), h "
+            "FROM generate_series(s.start_at + make_interval(secs => :heartbeat), coalesce(s.end_at, now()), "
+            "make_interval(secs => :heartbeat)) AS h "
+            if heartbeat_event_seconds > 0
+            else ""
+        )
+        _step(
+            db,
+            "events",
+            "INSERT INTO events (campus_id, lab_id, user_id, machine_id, session_id, event_type, payload, created_at) "
+            "SELECT ma.campus_id, ma.lab_id, s.user_id, s.machine_id, s.id, e.event_type, e.payload, e.created_at "
+            "FROM sessions s JOIN machines ma ON ma.id = s.machine_id "
+            "CROSS JOIN LATERAL ("
+            "  SELECT 'LOGIN_OK', jsonb_build_object('hostname', ma.hostname), s.start_at "
+            "  UNION ALL SELECT CASE WHEN s.close_reason = 'timeout' THEN 'SESSION_TIMEOUT' ELSE 'LOGOUT' END, "
+            "  jsonb_build_object('reason', s.close_reason), s.end_at WHERE s.end_at IS NOT NULL "
+            f"  {heartbeats}"
+            ") AS e(event_type, payload, created_at) "
+            "WHERE ma.hostname LIKE :campus",
+            {**params, "heartbeat": heartbeat_event_seconds},
+        )
+
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        rows = backfill_usage_rollup(db, now - timedelta(days=days + 1), now)
+        print(f"{'usage rollup':<24} {rows:>10} rows {time.perf_counter() - started:>8.1f}s")
+        reconcile_occupancy(db)
+        db.commit()
+        for table in ("users", "machines", "sessions", "events", "usage_hourly"):
+            db.execute(text(f"ANALYZE {table}"))
+        db.commit()
+        print(f"Synthetic seed completed. Users {SYNTHETIC_USER_PREFIX}000001.. log in with password={SYNTHETIC_PASSWORD}")
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
-    seed()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the admin user, or a synthetic university for benchmarks.")
+    parser.add_argument("--synthetic", action="store_true", help="seed campuses, labs, machines, users and history")
+    parser.add_argument("--campuses", type=int, default=2)
+    parser.add_argument("--labs-per-campus", type=int, default=4)
+    parser.add_argument("--machines-per-lab", type=int, default=40)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=180, help="days of session and event history")
+    parser.add_argument("--sessions-per-machine-day", type=int, default=4, choices=range(1, 6))
+    parser.add_argument("--active-percent", type=int, default=60, help="share of machines with an open session")
+    parser.add_argument(
+        "--heartbeat-event-seconds",
+        type=int,
+        default=settings.heartbeat_event_sample_seconds,
+        help="one HEARTBEAT event per session every N seconds (0 disables)",
+    )
+    parser.add_argument("--reset", action="store_true", help="delete previous synthetic rows first")
+    args = parser.parse_args()
+    seed()
+    if args.synthetic:
+        seed_synthetic(
+            args.campuses,
+            args.labs_per_campus,
+            args.machines_per_lab,
+            args.users,
+            args.days,
+            args.sessions_per_machine_day,
+            args.active_percent,
+            args.heartbeat_event_seconds,
+            args.reset,
+        )
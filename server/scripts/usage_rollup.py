@@ -0,0 +1,62 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app.db import SessionLocal
+from app.models.entities import Session as AuthSession
+from app.services.rollup import backfill_usage_rollup, check_usage_rollup
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def backfill(start: datetime | None, end: datetime | None, chunk_days: int) -> None:
+    db = SessionLocal()
+    try:
+        start = start or db.scalar(select(func.min(AuthSession.start_at)))
+        end = end or datetime.now(timezone.utc)
+        if start is None:
+            print("No sessions to roll up.")
+            return
+        rows = backfill_usage_rollup(db, start, end, chunk=timedelta(days=chunk_days))
+        print(f"Rebuilt {rows} usage_hourly rows between {start} and {end}.")
+    finally:
+        db.close()
+
+
+def check(start: datetime | None, end: datetime | None) -> int:
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=7)
+    db = SessionLocal()
+    try:
+        mismatches = check_usage_rollup(db, start, end)
+    finally:
+        db.close()
+    for mismatch in mismatches:
+        print(
+            f"{mismatch.day:%Y-%m-%d} lab={mismatch.lab_id} "
+            f"minutes rollup={mismatch.rollup_minutes} raw={mismatch.raw_minutes} "
+            f"logins rollup={mismatch.rollup_logins} raw={mismatch.raw_logins}"
+        )
+    print(f"{len(mismatches)} mismatching day/lab pairs between {start} and {end}.")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the usage_hourly rollup.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="rebuild the rollup from raw sessions (idempotent)")
+    backfill_parser.add_argument("--from", dest="start", type=_parse_time, help="defaults to the oldest session")
+    backfill_parser.add_argument("--to", dest="end", type=_parse_time, help="defaults to now")
+    backfill_parser.add_argument("--chunk-days", type=int, default=7, help="days rebuilt per transaction")
+    check_parser = subparsers.add_parser("check", help="compare the rollup with raw sessions per day and lab")
+    check_parser.add_argument("--from", dest="start", type=_parse_time, help="defaults to 7 days before --to")
+    check_parser.add_argument("--to", dest="end", type=_parse_time, help="defaults to now")
+    args = parser.parse_args()
+    if args.command == "backfill":
+        backfill(args.start, args.end, args.chunk_days)
+    else:
+        raise SystemExit(check(args.start, args.end))
@@ -0,0 +1,21 @@
+import signal
+import threading
+
+from app.services.jobs import job_queue
+
+
+def main() -> None:
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    job_queue.start()
+    print(f"Job worker started with concurrency={job_queue.concurrency}")
+    try:
+        stop.wait()
+    finally:
+        job_queue.stop()
+
+
+if __name__ == "__main__":
+    main()